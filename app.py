@@ -4,17 +4,68 @@ from models.database import DatabaseManager
 from scrapers.seo_scraper import SeoScraper
 from scrapers.product_scraper import ProductScraper
 from scrapers.site_crawler import SiteCrawler
+from scrapers.crawl_pipeline import CrawlPipeline
+from scrapers.crawl_checkpoint import CrawlCheckpoint
+from scrapers.link_checker import LinkChecker
 from utils.helpers import (
     is_valid_url, clean_url, export_to_csv, export_to_json,
     calculate_seo_score, truncate_text, format_number
 )
 from utils.seo_analyzer import SeoIssueAnalyzer
+from utils.robots_cache import get_robots_cache
+from utils.http_cache import get_http_cache
+from utils.circuit_breaker import get_circuit_breaker
+from utils.dns_cache import get_dns_cache
+from utils.parsing import get_parse_pool
+from utils.keywords import KeywordEngine
+from utils.link_graph import LinkGraph
 import json
+import threading
+import time
 from datetime import datetime
 
 app = Flask(__name__)
 app.config.from_object(Config)
 
+# Keep fetched robots.txt files across restarts
+get_robots_cache().attach_store(DatabaseManager)
+
+# Crawl sessions being run by this process, so one is never crawled twice at once
+_running_sessions = set()
+_running_lock = threading.Lock()
+
+def claim_crawl_session(session_id):
+    """Mark a session as being run by this process; False if it already is"""
+    with _running_lock:
+        if session_id in _running_sessions:
+            return False
+        _running_sessions.add(session_id)
+        return True
+
+def release_crawl_session(session_id):
+    with _running_lock:
+        _running_sessions.discard(session_id)
+
+def crawl_session_is_stale(session):
+    """
+    True if a running or pending session has made no progress for CRAWL_STALE_AFTER seconds
+
+    Progress is the session's heartbeat (see run_crawl_session) or its
+    checkpoint being saved. A stale session's crawl has died with the
+    process that ran it, so it may be resumed.
+    """
+    if session.get('status') not in ('running', 'pending'):
+        return False
+    with _running_lock:
+        if session['id'] in _running_sessions:
+            return False
+
+    times = [datetime.fromisoformat(value) for value in (session.get('heartbeat_at'), session.get('started_at')) if value]
+    saved_at = CrawlCheckpoint.for_session(session['id']).saved_at()
+    if saved_at:
+        times.append(saved_at)
+    return not times or (datetime.now() - max(times)).total_seconds() > app.config['CRAWL_STALE_AFTER']
+
 @app.route('/')
 def index():
     """Dashboard page"""
@@ -54,7 +105,8 @@ def test_page():
 def site_crawler():
     """Site crawler page"""
     sessions = DatabaseManager.get_all_crawl_sessions()
-    return render_template('site_crawler.html', sessions=sessions)
+    stale_sessions = {session['id'] for session in sessions if crawl_session_is_stale(session)}
+    return render_template('site_crawler.html', sessions=sessions, stale_sessions=stale_sessions)
 
 @app.route('/crawl-results/<session_id>')
 def crawl_results(session_id):
@@ -200,7 +252,10 @@ def crawl_site():
         base_url = data.get('url')
         max_urls = data.get('max_urls', 50)
         max_depth = data.get('max_depth', 2)
+        max_workers = data.get('max_workers', app.config['CRAWL_MAX_WORKERS'])
+        engine = data.get('engine', app.config['CRAWL_ENGINE'])
         respect_robots = data.get('respect_robots', app.config.get('RESPECT_ROBOTS_TXT', True))
+        incremental = bool(data.get('incremental', False))
 
         if not base_url:
             return jsonify({'error': 'URL is required'}), 400
@@ -210,90 +265,83 @@ def crawl_site():
             return jsonify({'error': 'Invalid URL format'}), 400
 
         # Validate limits
-        max_urls = min(max(int(max_urls), 1), 200)  # Limit between 1-200
+        max_urls = min(max(int(max_urls), 1), app.config['CRAWL_MAX_URLS_LIMIT'])  # Limit between 1-CRAWL_MAX_URLS_LIMIT
         max_depth = min(max(int(max_depth), 1), 5)   # Limit between 1-5
+        max_workers = min(max(int(max_workers), 1), app.config['CRAWL_WORKERS_LIMIT'])
+
+        if engine not in SiteCrawler.ENGINES:
+            return jsonify({'error': f"Invalid crawl engine - expected one of {', '.join(SiteCrawler.ENGINES)}"}), 400
+
+        # An incremental crawl builds on the last completed crawl of the same site
+        previous_session = DatabaseManager.get_latest_completed_crawl_session(base_url) if incremental else None
 
         # Create crawl session
         session = DatabaseManager.create_crawl_session(
             base_url=base_url,
             max_urls=max_urls,
             max_depth=max_depth,
-            respect_robots=respect_robots
+            respect_robots=respect_robots,
+            max_workers=max_workers,
+            engine=engine,
+            incremental=incremental,
+            previous_session_id=previous_session['id'] if previous_session else None
         )
+        claim_crawl_session(session['id'])
 
         try:
-            # Update session status
-            DatabaseManager.update_crawl_session(session['id'], {'status': 'running'})
-
-            # Initialize crawler
-            crawler = SiteCrawler(
-                user_agent=app.config['USER_AGENT'],
-                timeout=app.config['REQUEST_TIMEOUT'],
-                respect_robots=respect_robots
-            )
-
-            # Crawl the site
-            print(f"Starting crawl for {base_url}")
-            discovered_urls = crawler.crawl_site(base_url, max_urls, max_depth)
-
-            # Analyze each URL
-            seo_scraper = SeoScraper(
-                user_agent=app.config['USER_AGENT'],
-                timeout=app.config['REQUEST_TIMEOUT'],
-                respect_robots=respect_robots
-            )
-
-            total_issues = 0
-            analyzed_count = 0
-
-            for url in discovered_urls:
-                try:
-                    print(f"Analyzing URL: {url}")
-                    seo_data = seo_scraper.analyze_url(url)
-
-                    # Analyze issues
-                    issues = SeoIssueAnalyzer.analyze_issues(seo_data)
-                    total_issues += len(issues)
-
-                    # Save result
-                    DatabaseManager.create_crawl_result(
-                        session_id=session['id'],
-                        url=url,
-                        seo_data=seo_data,
-                        issues=issues
-                    )
-
-                    analyzed_count += 1
-
-                except Exception as e:
-                    print(f"Error analyzing {url}: {e}")
-                    # Save error result
-                    DatabaseManager.create_crawl_result(
-                        session_id=session['id'],
-                        url=url,
-                        seo_data={'url': url, 'error': str(e)},
-                        issues=[f"Analysis failed: {str(e)}"]
-                    )
-
-            # Update session with completion
+            summary = run_crawl_session(session)
+
+            return jsonify({
+                'success': True,
+                'session_id': session['id'],
+                **summary
+            })
+
+        except Exception as e:
+            # Update session with error; its checkpoint is kept for resuming
             DatabaseManager.update_crawl_session(session['id'], {
-                'status': 'completed',
-                'total_urls_found': len(discovered_urls),
-                'total_urls_analyzed': analyzed_count,
-                'issues_found': total_issues,
+                'status': 'failed',
+                'error_message': str(e),
                 'completed_at': datetime.now().isoformat()
             })
 
+            return jsonify({'error': str(e)}), 500
+
+        finally:
+            release_crawl_session(session['id'])
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/crawl-site/<session_id>/resume', methods=['POST'])
+def resume_crawl_site(session_id):
+    """API endpoint to resume an interrupted crawl session"""
+    try:
+        session = DatabaseManager.get_crawl_session(session_id)
+        if not session:
+            return jsonify({'error': 'Session not found'}), 404
+
+        if session.get('status') == 'completed':
+            return jsonify({'error': 'Crawl session already completed'}), 409
+
+        # A running session is only taken over once its crawl has stopped making progress
+        if session.get('status') in ('running', 'pending') and not crawl_session_is_stale(session):
+            return jsonify({'error': 'Crawl session is still running'}), 409
+
+        if not claim_crawl_session(session['id']):
+            return jsonify({'error': 'Crawl session is still running'}), 409
+
+        try:
+            summary = run_crawl_session(session, resume=True)
+
             return jsonify({
                 'success': True,
                 'session_id': session['id'],
-                'urls_found': len(discovered_urls),
-                'urls_analyzed': analyzed_count,
-                'total_issues': total_issues
+                'resumed': True,
+                **summary
             })
 
         except Exception as e:
-            # Update session with error
             DatabaseManager.update_crawl_session(session['id'], {
                 'status': 'failed',
                 'error_message': str(e),
@@ -302,9 +350,348 @@ def crawl_site():
 
             return jsonify({'error': str(e)}), 500
 
+        finally:
+            release_crawl_session(session['id'])
+
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
+def run_crawl_session(session, resume=False):
+    """
+    Crawl and analyze a crawl session, saving results as pages are analyzed
+
+    The crawl is checkpointed to disk while it runs. With resume=True it
+    continues from the session's checkpoint and skips pages that already
+    have results. Incremental sessions carry forward the previous session's
+    results for pages that have not changed.
+
+    While it runs the session's heartbeat_at is kept fresh (see
+    crawl_session_is_stale), so the session is not resumed elsewhere.
+    """
+    last_heartbeat = [0.0]
+
+    def heartbeat(updates=None, force=False):
+        if force or updates or time.monotonic() - last_heartbeat[0] >= 60:
+            last_heartbeat[0] = time.monotonic()
+            DatabaseManager.update_crawl_session(session['id'], {**(updates or {}),
+                                                                 'heartbeat_at': datetime.now().isoformat()})
+
+    heartbeat({'status': 'running', 'error_message': None})
+
+    respect_robots = session.get('respect_robots', True)
+    max_workers = session.get('max_workers', app.config['CRAWL_MAX_WORKERS'])
+    engine = session.get('engine', app.config['CRAWL_ENGINE'])
+
+    # Initialize crawler
+    crawler = SiteCrawler(
+        user_agent=app.config['USER_AGENT'],
+        timeout=app.config['REQUEST_TIMEOUT'],
+        respect_robots=respect_robots,
+        max_workers=max_workers,
+        engine=engine,
+        seen_set=app.config['CRAWL_SEEN_SET'],
+        seen_set_error_rate=app.config['CRAWL_SEEN_SET_ERROR_RATE'],
+        skip_duplicate_links=app.config['CRAWL_SKIP_DUPLICATE_LINKS'],
+        detect_traps=app.config['CRAWL_TRAP_DETECTION'],
+        parse_pool=get_parse_pool()
+    )
+
+    # Pages fetched for analysis after the crawl count towards the session's bytes too
+    seo_scraper = SeoScraper(
+        user_agent=app.config['USER_AGENT'],
+        timeout=app.config['REQUEST_TIMEOUT'],
+        respect_robots=respect_robots,
+        download_stats=crawler.download_stats
+    )
+
+    def save_result(url, seo_data, issues):
+        DatabaseManager.create_crawl_result(
+            session_id=session['id'],
+            url=url,
+            seo_data=seo_data,
+            issues=issues
+        )
+        heartbeat()
+
+    keyword_engine = KeywordEngine() if app.config['KEYWORD_ENGINE_ENABLED'] else None
+    link_graph = LinkGraph() if app.config['LINK_GRAPH_ENABLED'] else None
+    pipeline = CrawlPipeline(crawler, seo_scraper, result_callback=save_result, keyword_engine=keyword_engine,
+                             link_graph=link_graph)
+    checkpoint = CrawlCheckpoint.for_session(session['id'])
+
+    previous_results = None
+    if session.get('previous_session_id'):
+        previous_results = DatabaseManager.get_crawl_results(session['previous_session_id'])
+        print(f"Incremental crawl against session {session['previous_session_id']} ({len(previous_results)} results)")
+
+    if resume:
+        pipeline.restore(DatabaseManager.get_crawl_results(session['id']))
+        print(f"Resuming crawl for {session['base_url']} ({len(pipeline.analyzed_urls)} pages already analyzed)")
+    else:
+        print(f"Starting crawl for {session['base_url']}")
+
+    # Crawl the site, analyzing each page from the crawl's own download
+    discovered_urls = pipeline.run(session['base_url'], session['max_urls'], session['max_depth'],
+                                   checkpoint=checkpoint, previous_results=previous_results)
+
+    # Broken links, duplicate titles, descriptions and content can only be judged once every page is in
+    heartbeat(force=True)
+    link_check_stats = record_link_checks(session['id']) if app.config['LINK_CHECK_ENABLED'] else None
+    total_issues = record_duplicate_issues(session['id'])
+    keyword_stats = record_keyword_scores(session['id'], keyword_engine) if keyword_engine else None
+    heartbeat(force=True)
+    link_stats = record_link_metrics(session, link_graph, crawler) if link_graph else None
+
+    trap_detector = crawler.trap_detector
+    urls_blocked = trap_detector.blocked_count if trap_detector else 0
+
+    # Update session with completion
+    DatabaseManager.update_crawl_session(session['id'], {
+        'status': 'completed',
+        'total_urls_found': len(discovered_urls),
+        'total_urls_analyzed': pipeline.analyzed_count,
+        'total_urls_unchanged': pipeline.unchanged_count,
+        'total_urls_blocked': urls_blocked,
+        'blocked_patterns': trap_detector.report()[:50] if trap_detector else [],
+        **crawler.download_stats.to_dict(),
+        'keyword_stats': keyword_stats,
+        'link_stats': link_stats,
+        'link_check_stats': link_check_stats,
+        'issues_found': total_issues,
+        'completed_at': datetime.now().isoformat()
+    })
+    checkpoint.delete()
+
+    return {
+        'urls_found': len(discovered_urls),
+        'urls_analyzed': pipeline.analyzed_count,
+        'urls_unchanged': pipeline.unchanged_count,
+        'urls_blocked': urls_blocked,
+        **crawler.download_stats.to_dict(),
+        'total_issues': total_issues,
+        'max_workers': max_workers,
+        'engine': engine
+    }
+
+def record_duplicate_issues(session_id):
+    """
+    Add cross-page duplicate issues to a session's results
+
+    Returns:
+        Total issues across the session's analyzed pages
+    """
+    results = DatabaseManager.get_crawl_results(session_id)
+    findings = SeoIssueAnalyzer.analyze_duplicates(results)
+
+    total_issues = 0
+    for result in results:
+        if result.get('error'):
+            continue
+
+        # Results carried forward from an earlier crawl bring that crawl's duplicate issues
+        issues = [issue for issue in result.get('issues', [])
+                  if not issue.startswith(SeoIssueAnalyzer.DUPLICATE_ISSUE_PREFIXES)]
+        finding = findings.get(result['url'], {'issues': [], 'near_duplicates': []})
+        issues.extend(finding['issues'])
+        total_issues += len(issues)
+
+        if issues != result.get('issues', []) or finding['near_duplicates'] != result.get('near_duplicates', []):
+            DatabaseManager.update_crawl_result(result['id'], {
+                'issues': issues,
+                'issue_count': len(issues),
+                'near_duplicates': finding['near_duplicates']
+            })
+
+    return total_issues
+
+def record_keyword_scores(session_id, keyword_engine):
+    """
+    Save each page's TF-IDF keywords, scored against every page of the session
+
+    Returns:
+        Site-wide term stats for the session (see KeywordEngine.compute)
+    """
+    scores = keyword_engine.compute()
+    for result in DatabaseManager.get_crawl_results(session_id):
+        keywords = scores['pages'].get(result['url'])
+        if keywords is not None and keywords != result.get('tfidf_keywords'):
+            DatabaseManager.update_crawl_result(result['id'], {'tfidf_keywords': keywords})
+
+    return scores['site']
+
+def record_link_metrics(session, link_graph, crawler):
+    """
+    Store a session's link graph and save each page's in-links, PageRank and click depth
+
+    Returns:
+        Site-wide link stats for the session, with its orphan pages (see LinkGraph.compute)
+    """
+    start_url = SiteCrawler.normalize_url(session['base_url'], session['base_url'])
+    sitemap_urls = [url for url in crawler.sitemap_entries if SiteCrawler.is_same_domain(url, start_url)]
+    metrics = link_graph.compute(start_url, sitemap_urls)
+    link_graph.save(LinkGraph.session_path(session['id']))
+
+    for result in DatabaseManager.get_crawl_results(session['id']):
+        page = metrics['pages'].get(result['url'])
+        if page is None:
+            continue
+        updates = {name: page[name] for name in ('inlinks', 'pagerank', 'click_depth')}
+        if any(result.get(name) != value for name, value in updates.items()):
+            DatabaseManager.update_crawl_result(result['id'], updates)
+
+    return metrics['site']
+
+def record_link_checks(session_id, recheck=False):
+    """
+    Check every link of a session's pages, and save broken and redirected links on the pages linking to them
+
+    Each distinct target is requested once, however many pages link to it.
+    Pages the crawl itself requested are not requested again: their
+    status is the crawl's, unless recheck is set.
+
+    Returns:
+        Link check stats for the session, with the broken targets linked from the most pages
+    """
+    all_results = DatabaseManager.get_crawl_results(session_id)
+    results = [result for result in all_results if not result.get('error')]
+    page_targets = {}
+    for result in results:
+        targets = list(result.get('links') or [])
+        if app.config['LINK_CHECK_EXTERNAL']:
+            targets.extend(result.get('outbound_links') or [])
+        page_targets[result['id']] = targets
+
+    all_targets = dict.fromkeys(target for targets in page_targets.values() for target in targets)
+    crawled = {} if recheck else {
+        url: check for url, check in crawl_link_checks(all_results).items() if url in all_targets
+    }
+    checker = LinkChecker(user_agent=app.config['USER_AGENT'])
+    checks = checker.check(target for target in all_targets if target not in crawled)
+    print(f"Checked {len(checks)} distinct links from {len(results)} pages "
+          f"({len(crawled)} crawled pages not requested again)")
+    checks.update(crawled)
+
+    referrers = {}
+    for result in results:
+        finding = SeoIssueAnalyzer.analyze_links(page_targets[result['id']], checks)
+        for link in finding['broken_links']:
+            referrers[link['url']] = referrers.get(link['url'], 0) + 1
+
+        # Results carried forward from an earlier crawl bring that crawl's link issues
+        issues = [issue for issue in result.get('issues', [])
+                  if not issue.startswith(SeoIssueAnalyzer.LINK_ISSUE_PREFIXES)]
+        issues.extend(finding['issues'])
+        updates = {
+            'issues': issues,
+            'issue_count': len(issues),
+            'broken_links': finding['broken_links'],
+            'redirected_links': finding['redirected_links']
+        }
+        if any(result.get(name) != value for name, value in updates.items()):
+            DatabaseManager.update_crawl_result(result['id'], updates)
+
+    redirected = sum(1 for check in checks.values()
+                     if check['redirects'] and not check['error'] and check['status'] < 400)
+    return {
+        'links_checked': len(checks),
+        'broken_links': len(referrers),
+        'redirected_links': redirected,
+        'top_broken_links': [
+            {'url': url, 'status': checks[url]['status'], 'error': checks[url]['error'], 'pages': pages}
+            for url, pages in sorted(referrers.items(), key=lambda item: (-item[1], item[0]))[:50]
+        ],
+        'checked_at': datetime.now().isoformat()
+    }
+
+def crawl_link_checks(results):
+    """Link check results (see LinkChecker.check_url) for the pages a crawl requested, by URL"""
+    checks = {}
+    for result in results:
+        fetched = result.get('fetched')
+        if fetched:
+            # A 304 revalidated the previous crawl's copy of a working page
+            status = 200 if fetched['status'] == 304 else fetched['status']
+            checks[result['url']] = {'status': status, 'redirects': fetched['redirects'], 'error': None}
+    return checks
+
+@app.route('/api/crawl-site/<session_id>/check-links', methods=['POST'])
+def check_crawl_session_links(session_id):
+    """API endpoint to check the links of a completed crawl session again, requesting every target"""
+    try:
+        session = DatabaseManager.get_crawl_session(session_id)
+        if not session:
+            return jsonify({'error': 'Session not found'}), 404
+
+        if session.get('status') != 'completed':
+            return jsonify({'error': 'Crawl session has not completed'}), 409
+
+        link_check_stats = record_link_checks(session_id, recheck=True)
+        total_issues = record_duplicate_issues(session_id)
+        DatabaseManager.update_crawl_session(session_id, {
+            'link_check_stats': link_check_stats,
+            'issues_found': total_issues
+        })
+
+        return jsonify({
+            'success': True,
+            'session_id': session_id,
+            'total_issues': total_issues,
+            **link_check_stats
+        })
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@app.route('/api/crawl-site/<session_id>/links')
+def crawl_session_links(session_id):
+    """Links to and from a page of a crawl session (?url=), from the session's stored link graph"""
+    url = request.args.get('url')
+    if not url:
+        return jsonify({'error': 'URL is required'}), 400
+
+    link_graph = LinkGraph.load(LinkGraph.session_path(session_id))
+    if link_graph is None:
+        return jsonify({'error': 'No link graph stored for this session'}), 404
+    if url not in link_graph:
+        return jsonify({'error': 'URL not found in the link graph'}), 404
+
+    return jsonify({
+        'url': url,
+        'links_from': link_graph.links_from(url),
+        'links_to': link_graph.links_to(url)
+    })
+
+@app.route('/api/http-cache')
+def http_cache_stats():
+    """Hit ratios and size of the shared HTTP response cache"""
+    cache = get_http_cache()
+    if not cache:
+        return jsonify({'enabled': False})
+
+    stats = cache.stats()
+    stats['enabled'] = True
+    return jsonify(stats)
+
+@app.route('/api/circuit-breaker')
+def circuit_breaker_stats():
+    """Hosts whose requests have been failing, and whether their circuit is open"""
+    breaker = get_circuit_breaker()
+    if not breaker:
+        return jsonify({'enabled': False})
+
+    return jsonify({'enabled': True, 'hosts': breaker.stats()})
+
+@app.route('/api/dns-cache')
+def dns_cache_stats():
+    """Hit/miss counters of the in-process DNS cache"""
+    dns_cache = get_dns_cache()
+    if not dns_cache:
+        return jsonify({'enabled': False})
+
+    stats = dns_cache.stats()
+    stats['enabled'] = True
+    return jsonify(stats)
+
 @app.route('/api/export/crawl-results/<session_id>')
 def export_crawl_results(session_id):
     """Export crawl results as CSV or JSON"""
@@ -329,6 +716,10 @@ def export_crawl_results(session_id):
                 'word_count': result.get('word_count'),
                 'load_time': result.get('load_time'),
                 'mobile_friendly': result.get('mobile_friendly'),
+                'inlinks': result.get('inlinks'),
+                'pagerank': result.get('pagerank'),
+                'click_depth': result.get('click_depth'),
+                'broken_links': '; '.join(link['url'] for link in result.get('broken_links', [])),
                 'issue_count': result.get('issue_count', 0),
                 'issues': '; '.join(result.get('issues', [])),
                 'analyzed_at': result.get('analyzed_at')
@@ -0,0 +1,61 @@
+#!/usr/bin/env python3
+"""
+Crawl engine benchmark
+Compares pages/second of the SiteCrawler engines against a local test server.
+
+Usage:
+    python -m benchmarks.crawl_engines [--pages 50] [--latency 0.05]
+"""
+
+import argparse
+import time
+
+from benchmarks.local_site import LocalSite
+from scrapers.site_crawler import SiteCrawler
+from utils.rate_limiter import HostRateLimiter
+
+
+def run_engine(site, engine, max_urls, max_depth, max_workers, per_host_limit, rate):
+    """Crawl the local site with one engine and return (pages, seconds)"""
+    crawler = SiteCrawler(respect_robots=False, engine=engine,
+                          max_workers=max_workers, per_host_limit=per_host_limit,
+                          rate_limiter=HostRateLimiter(rate=rate, burst=max_workers),
+                          http_cache=False)
+
+    start = time.perf_counter()
+    crawler.crawl_site(site.base_url, max_urls=max_urls, max_depth=max_depth)
+    elapsed = time.perf_counter() - start
+
+    return len(crawler.crawled_order), elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark SiteCrawler engines')
+    parser.add_argument('--pages', type=int, default=50, help='pages on the test site and crawl budget')
+    parser.add_argument('--links', type=int, default=5, help='links per page')
+    parser.add_argument('--latency', type=float, default=0.05, help='server latency per request (seconds)')
+    parser.add_argument('--depth', type=int, default=5, help='max crawl depth')
+    parser.add_argument('--workers', type=int, default=16, help='max_workers for concurrent engines')
+    parser.add_argument('--per-host', type=int, default=16, help='per-host concurrency limit')
+    parser.add_argument('--rate', type=float, default=1000, help='per-host requests/second allowed by the rate limiter')
+    parser.add_argument('--engines', default=','.join(SiteCrawler.ENGINES), help='comma-separated engines to run')
+    args = parser.parse_args()
+
+    print("🕷️ Crawl Engine Benchmark")
+    print("=" * 50)
+
+    with LocalSite(pages=args.pages, links_per_page=args.links, latency=args.latency) as site:
+        print(f"Test site: {site.base_url} ({args.pages} pages, {args.latency * 1000:.0f}ms latency)\n")
+
+        results = []
+        for engine in args.engines.split(','):
+            pages, elapsed = run_engine(site, engine, args.pages, args.depth, args.workers, args.per_host, args.rate)
+            results.append((engine, pages, elapsed))
+
+    print(f"\n{'engine':<12}{'pages':>8}{'seconds':>10}{'pages/s':>10}")
+    for engine, pages, elapsed in results:
+        print(f"{engine:<12}{pages:>8}{elapsed:>10.2f}{pages / elapsed:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+HTML parser benchmark
+Checks that every installed parser backend extracts the same SEO, product and
+link data as html.parser from the fixture pages, and that the streaming SEO
+extraction used for oversized pages agrees with it too, then compares parse speed.
+
+Usage:
+    python -m benchmarks.html_parsers [--repeat 20]
+"""
+
+import argparse
+import os
+import sys
+import time
+
+from scrapers.product_scraper import ProductScraper
+from scrapers.seo_scraper import SeoScraper
+from scrapers.seo_stream import stream_document
+from scrapers.site_crawler import SiteCrawler
+from utils.near_duplicates import simhash, visible_text
+from utils.parsing import available_parsers, parse_html
+
+FIXTURES_DIR = os.path.join(os.path.dirname(__file__), 'fixtures')
+FIXTURE_URL = 'https://www.example.com/section/page.html'
+
+
+def load_fixtures():
+    """(name, bytes) of every fixture page, plus a large page built from them"""
+    fixtures = []
+    for name in sorted(os.listdir(FIXTURES_DIR)):
+        if name.endswith('.html'):
+            with open(os.path.join(FIXTURES_DIR, name), 'rb') as f:
+                fixtures.append((name, f.read()))
+
+    # A long page, closer to the size of a real catalog or article listing
+    with open(os.path.join(FIXTURES_DIR, 'article.html'), 'rb') as f:
+        article = f.read()
+    head, _, rest = article.partition(b'<body>')
+    body, _, tail = rest.partition(b'</body>')
+    fixtures.append(('large (article x 40)', head + b'<body>' + body * 40 + b'</body>' + tail))
+    return fixtures
+
+
+def extract(markup, parser, seo_scraper, product_scraper, crawler):
+    """Everything the scrapers take from a page, as parsed by one backend"""
+    seo = seo_scraper.analyze_document(FIXTURE_URL, parse_html(markup, parser), 0, None)
+    for volatile in ('load_time', 'robots_txt_status', 'respect_robots'):
+        seo.pop(volatile)
+
+    return {
+        'seo': seo,
+        'product': product_scraper._scrape_generic(parse_html(markup, parser), FIXTURE_URL),
+        'links': sorted(crawler.extract_links(parse_html(markup, parser), FIXTURE_URL)),
+        'simhash': simhash(visible_text(parse_html(markup, parser)))
+    }
+
+
+def extract_streaming(markup, seo_scraper, crawler):
+    """SEO, link and simhash data from the streaming extractor, shaped like extract()'s"""
+    extractor = stream_document(markup, FIXTURE_URL)
+    fields = extractor.fields()
+    seo = seo_scraper.analyze_fields(FIXTURE_URL, fields, 0, None)
+    for volatile in ('load_time', 'robots_txt_status', 'respect_robots'):
+        seo.pop(volatile)
+    return {
+        'seo': seo,
+        'links': sorted(crawler.links_from_hrefs(extractor.hrefs, FIXTURE_URL)),
+        'simhash': fields['simhash']
+    }
+
+
+def differences(expected, actual, path=''):
+    """Paths (and values) where two extraction results differ"""
+    if isinstance(expected, dict) and isinstance(actual, dict):
+        found = []
+        for key in sorted(set(expected) | set(actual)):
+            found += differences(expected.get(key), actual.get(key), f'{path}.{key}' if path else key)
+        return found
+    return [] if expected == actual else [(path, expected, actual)]
+
+
+def time_parse(markup, parser, repeat):
+    """Average seconds to parse a page"""
+    start = time.perf_counter()
+    for _ in range(repeat):
+        parse_html(markup, parser)
+    return (time.perf_counter() - start) / repeat
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare HTML parser backends')
+    parser.add_argument('--repeat', type=int, default=20, help='parses per page and backend when timing')
+    args = parser.parse_args()
+
+    backends = available_parsers()
+    fixtures = load_fixtures()
+    seo_scraper = SeoScraper(respect_robots=False, http_cache=False)
+    product_scraper = ProductScraper(respect_robots=False, http_cache=False)
+    crawler = SiteCrawler(respect_robots=False, http_cache=False)
+
+    print("🧪 HTML Parser Benchmark")
+    print("=" * 50)
+    print(f"Backends installed: {', '.join(backends)}\n")
+
+    mismatches = 0
+    for name, markup in fixtures:
+        expected = extract(markup, 'html.parser', seo_scraper, product_scraper, crawler)
+        for backend in backends:
+            if backend == 'html.parser':
+                continue
+            for path, want, got in differences(expected, extract(markup, backend, seo_scraper,
+                                                                 product_scraper, crawler)):
+                mismatches += 1
+                print(f"❌ {name} [{backend}] {path}: html.parser={want!r} {backend}={got!r}")
+        streamed = {key: expected[key] for key in ('seo', 'links', 'simhash')}
+        for path, want, got in differences(streamed, extract_streaming(markup, seo_scraper, crawler)):
+            mismatches += 1
+            print(f"❌ {name} [streaming] {path}: html.parser={want!r} streaming={got!r}")
+
+    if mismatches:
+        print(f"\n{mismatches} extracted values differ from html.parser\n")
+    elif len(backends) == 1:
+        print(f"✅ Streaming extraction matches html.parser on {len(fixtures)} pages "
+              f"(no other backend installed to compare, pip install lxml)\n")
+    else:
+        print(f"✅ All backends and streaming extraction extract the same data from {len(fixtures)} pages\n")
+
+    header = f"{'page':<24}{'KB':>7}" + ''.join(f"{backend + ' ms':>16}" for backend in backends)
+    if len(backends) > 1:
+        header += f"{'speedup':>10}"
+    print(header)
+
+    totals = dict.fromkeys(backends, 0.0)
+    for name, markup in fixtures:
+        times = {backend: time_parse(markup, backend, args.repeat) for backend in backends}
+        row = f"{name:<24}{len(markup) / 1024:>7.1f}" + ''.join(f"{times[backend] * 1000:>16.2f}" for backend in backends)
+        if len(backends) > 1:
+            row += f"{times['html.parser'] / times[backends[0]]:>9.1f}x"
+        print(row)
+        for backend in backends:
+            totals[backend] += times[backend]
+
+    if len(backends) > 1:
+        print(f"\nOverall {backends[0]} parses {totals['html.parser'] / totals[backends[0]]:.1f}x faster than html.parser")
+
+    return 1 if mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,119 @@
+"""
+Local test site for benchmarks
+Serves a synthetic, deterministic website from a background HTTP server
+"""
+
+import threading
+import time
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+PAGE_TEMPLATE = """<!DOCTYPE html>
+<html>
+<head>
+<title>Benchmark page {page} | Local Site</title>
+<meta name="description" content="Synthetic page {page} used to benchmark the crawler.">
+<meta name="viewport" content="width=device-width, initial-scale=1">
+</head>
+<body>
+<h1>Benchmark page number {page}</h1>
+<h2>Section one</h2>
+<p>{text}</p>
+<h2>Section two</h2>
+<img src="/img/{page}.png">
+{links}
+</body>
+</html>
+"""
+
+
+class _Server(ThreadingHTTPServer):
+    # The default backlog of 5 drops connections from concurrent crawlers
+    request_queue_size = 128
+    daemon_threads = True
+
+
+class LocalSite:
+    """A synthetic site of `pages` pages, each linking to `links_per_page` others"""
+
+    def __init__(self, pages=100, links_per_page=5, latency=0.02, words_per_page=400):
+        self.pages = pages
+        self.links_per_page = links_per_page
+        self.latency = latency
+        self.words_per_page = words_per_page
+        self.requests_served = 0
+        self._lock = threading.Lock()
+        self._server = None
+        self._thread = None
+
+    @property
+    def base_url(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/"
+
+    def page_path(self, page):
+        return '/' if page == 0 else f'/page/{page}'
+
+    def render_page(self, page):
+        """Render the HTML for a page number"""
+        links = '\n'.join(
+            f'<a href="{self.page_path((page * self.links_per_page + i + 1) % self.pages)}">Link {i}</a>'
+            for i in range(self.links_per_page)
+        )
+        text = ' '.join(f'word{(page + i) % 97}' for i in range(self.words_per_page))
+        return PAGE_TEMPLATE.format(page=page, text=text, links=links).encode('utf-8')
+
+    def _handler(self):
+        site = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                with site._lock:
+                    site.requests_served += 1
+
+                if site.latency:
+                    time.sleep(site.latency)
+
+                page = None
+                if self.path == '/':
+                    page = 0
+                elif self.path.startswith('/page/'):
+                    try:
+                        page = int(self.path.rsplit('/', 1)[1])
+                    except ValueError:
+                        page = None
+
+                if page is None or page >= site.pages:
+                    self.send_response(404)
+                    self.send_header('Content-Length', '0')
+                    self.end_headers()
+                    return
+
+                body = site.render_page(page)
+                self.send_response(200)
+                self.send_header('Content-Type', 'text/html; charset=utf-8')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._server = _Server(('127.0.0.1', 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Seen-set memory benchmark
+Compares memory and speed of the crawler's seen-URL set implementations.
+
+Usage:
+    python -m benchmarks.seen_set_memory [--urls 1000000]
+"""
+
+import argparse
+import gc
+import time
+import tracemalloc
+
+from utils.url_set import FingerprintSet, BloomFilter
+
+
+def synthetic_url(i):
+    """A realistic-looking URL, unique per index"""
+    return f"https://www.example-store.com/category/{i % 997}/products/item-{i}?ref=nav&page={i % 50}"
+
+
+def fill(factory, urls):
+    url_set = factory()
+    for url in urls():
+        url_set.add(url)
+    return url_set
+
+
+def measure(name, factory, urls, probes):
+    """Fill a set and return (name, bytes, add seconds, lookup seconds, false positives)"""
+    # Memory is traced in a separate pass, as tracing slows every allocation
+    gc.collect()
+    tracemalloc.start()
+    url_set = fill(factory, urls)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del url_set
+
+    gc.collect()
+    start = time.perf_counter()
+    url_set = fill(factory, urls)
+    add_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    false_positives = sum(1 for url in probes if url in url_set)
+    lookup_time = time.perf_counter() - start
+
+    return name, size, add_time, lookup_time, false_positives
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark seen-URL set memory usage')
+    parser.add_argument('--urls', type=int, default=1000000, help='URLs to insert')
+    parser.add_argument('--probes', type=int, default=100000, help='unseen URLs looked up')
+    args = parser.parse_args()
+
+    def urls():
+        return (synthetic_url(i) for i in range(args.urls))
+
+    probes = [synthetic_url(i) for i in range(args.urls, args.urls + args.probes)]
+
+    print("🧮 Seen-Set Memory Benchmark")
+    print("=" * 50)
+    print(f"{args.urls:,} URLs inserted, {args.probes:,} unseen URLs probed\n")
+
+    # The plain set is charged for its strings, since the crawler keeps them alive
+    candidates = [
+        ('set(str)', set),
+        ('fingerprint', lambda: FingerprintSet()),
+        ('bloom 0.1%', lambda: BloomFilter(capacity=args.urls, error_rate=0.001)),
+        ('bloom 1%', lambda: BloomFilter(capacity=args.urls, error_rate=0.01)),
+    ]
+
+    results = [measure(name, factory, urls, probes) for name, factory in candidates]
+
+    print(f"{'set':<14}{'MB':>9}{'B/url':>8}{'add s':>8}{'probe s':>9}{'false +':>9}")
+    for name, size, add_time, lookup_time, false_positives in results:
+        print(f"{name:<14}{size / 1e6:>9.1f}{size / args.urls:>8.1f}{add_time:>8.2f}"
+              f"{lookup_time:>9.2f}{false_positives / args.probes:>9.4%}")
+
+
+if __name__ == '__main__':
+    main()
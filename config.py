@@ -10,14 +10,72 @@ class Config:
     
     # Scraping settings
     REQUEST_TIMEOUT = 30
-    MAX_RETRIES = 3
+    MAX_RETRIES = int(os.environ.get('MAX_RETRIES', 3))  # retries on connection errors, 429 and 5xx
+    RETRY_BACKOFF_FACTOR = float(os.environ.get('RETRY_BACKOFF_FACTOR', 0.5))  # backoff of 0.5s, 1s, 2s, ... with jitter
+    RETRY_AFTER_MAX = int(os.environ.get('RETRY_AFTER_MAX', 60))  # longest Retry-After honored, in seconds
+    HTTP_POOL_CONNECTIONS = int(os.environ.get('HTTP_POOL_CONNECTIONS', 10))  # hosts with pooled connections
+    CIRCUIT_BREAKER_ENABLED = os.environ.get('CIRCUIT_BREAKER_ENABLED', 'true').lower() == 'true'
+    CIRCUIT_BREAKER_FAILURES = int(os.environ.get('CIRCUIT_BREAKER_FAILURES', 5))  # consecutive failures that open a host's circuit
+    CIRCUIT_BREAKER_COOLDOWN = int(os.environ.get('CIRCUIT_BREAKER_COOLDOWN', 60))  # seconds before a probe request is let through
+    DNS_CACHE_ENABLED = os.environ.get('DNS_CACHE_ENABLED', 'true').lower() == 'true'
+    DNS_CACHE_TTL = int(os.environ.get('DNS_CACHE_TTL', 300))  # seconds; also caps TTLs a resolver reports
+    DNS_CACHE_NEGATIVE_TTL = int(os.environ.get('DNS_CACHE_NEGATIVE_TTL', 60))  # seconds to remember non-existent hosts
+    HTTP_POOL_MAXSIZE = int(os.environ.get('HTTP_POOL_MAXSIZE', 10))  # connections kept per host (at least one per crawl worker)
+    MAX_RESPONSE_BYTES = int(os.environ.get('MAX_RESPONSE_BYTES', 10 * 1024 * 1024))  # larger pages are skipped
+    HTML_PARSER = os.environ.get('HTML_PARSER', 'auto')  # auto (fastest installed), lxml or html.parser
+    STREAMING_EXTRACTION_BYTES = int(os.environ.get('STREAMING_EXTRACTION_BYTES', 2 * 1024 * 1024))  # larger pages are analyzed without building a document tree; 0 never streams (see README)
+    PARSE_WORKERS = int(os.environ.get('PARSE_WORKERS', 0))  # processes that parse and analyze crawled pages; 0 parses on the crawl threads
     USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36'
     
-    # Rate limiting
-    REQUESTS_PER_SECOND = 1
+    # Rate limiting (per host; robots.txt Crawl-delay/Request-rate can lower it)
+    REQUESTS_PER_SECOND = float(os.environ.get('REQUESTS_PER_SECOND', 5))
+    RATE_LIMIT_BURST = int(os.environ.get('RATE_LIMIT_BURST', 5))
+
+    # Site crawler settings
+    CRAWL_ENGINE = os.environ.get('CRAWL_ENGINE', 'async')
+    CRAWL_MAX_WORKERS = 5
+    CRAWL_WORKERS_LIMIT = 16
+    CRAWL_MAX_URLS_LIMIT = int(os.environ.get('CRAWL_MAX_URLS_LIMIT', 200))
+    CRAWL_SEEN_SET = os.environ.get('CRAWL_SEEN_SET', 'exact')  # exact, fingerprint or bloom
+    CRAWL_SEEN_SET_ERROR_RATE = float(os.environ.get('CRAWL_SEEN_SET_ERROR_RATE', 0.001))  # bloom only
+    # Skip the links of near-duplicate pages: saves fetches on mirrored or parameterized pages, but
+    # nav and footer boilerplate can make distinct template pages look alike and cut discovery short
+    CRAWL_SKIP_DUPLICATE_LINKS = os.environ.get('CRAWL_SKIP_DUPLICATE_LINKS', 'false').lower() == 'true'
+    CRAWL_TRAP_DETECTION = os.environ.get('CRAWL_TRAP_DETECTION', 'true').lower() == 'true'
+
+    # Crawl checkpoints, for resuming interrupted crawl sessions
+    CRAWL_CHECKPOINT_DIR = os.environ.get('CRAWL_CHECKPOINT_DIR') or os.path.join(os.getcwd(), 'crawl_checkpoints')
+    CRAWL_CHECKPOINT_INTERVAL = int(os.environ.get('CRAWL_CHECKPOINT_INTERVAL', 10))  # pages between saves
+    CRAWL_STALE_AFTER = int(os.environ.get('CRAWL_STALE_AFTER', 15 * 60))  # seconds without progress before a running crawl may be resumed
+
+    # Session-wide TF-IDF keywords
+    KEYWORD_ENGINE_ENABLED = os.environ.get('KEYWORD_ENGINE_ENABLED', 'true').lower() == 'true'
+    KEYWORD_MAX_NGRAM = int(os.environ.get('KEYWORD_MAX_NGRAM', 2))  # longest phrase counted, in words
+    KEYWORD_TOP_TERMS = int(os.environ.get('KEYWORD_TOP_TERMS', 10))  # TF-IDF terms kept per page
+    KEYWORD_STOPWORDS = frozenset(
+        word.strip().lower() for word in os.environ.get('KEYWORD_STOPWORDS', '').split(',') if word.strip()
+    )  # comma-separated, added to the built-in English list
+
+    # Internal link graph, PageRank and orphan pages
+    LINK_GRAPH_ENABLED = os.environ.get('LINK_GRAPH_ENABLED', 'true').lower() == 'true'
+    LINK_GRAPH_DIR = os.environ.get('LINK_GRAPH_DIR') or os.path.join(os.getcwd(), 'link_graphs')
+
+    # Broken-link checks once a crawl is done
+    LINK_CHECK_ENABLED = os.environ.get('LINK_CHECK_ENABLED', 'true').lower() == 'true'
+    LINK_CHECK_EXTERNAL = os.environ.get('LINK_CHECK_EXTERNAL', 'true').lower() == 'true'  # also check links to other sites
+    LINK_CHECK_WORKERS = int(os.environ.get('LINK_CHECK_WORKERS', 16))  # concurrent checks across all hosts
+    LINK_CHECK_PER_HOST = int(os.environ.get('LINK_CHECK_PER_HOST', 2))  # concurrent checks per host
+    LINK_CHECK_TIMEOUT = int(os.environ.get('LINK_CHECK_TIMEOUT', 10))  # seconds per request
 
     # Robots.txt settings
     RESPECT_ROBOTS_TXT = os.environ.get('RESPECT_ROBOTS_TXT', 'true').lower() == 'true'
+    ROBOTS_CACHE_TTL = int(os.environ.get('ROBOTS_CACHE_TTL', 24 * 60 * 60))  # 24 hours
+    ROBOTS_CACHE_ERROR_TTL = int(os.environ.get('ROBOTS_CACHE_ERROR_TTL', 10 * 60))  # 10 minutes for 5xx/network errors
+
+    # HTTP response cache (shared by all scrapers)
+    HTTP_CACHE_ENABLED = os.environ.get('HTTP_CACHE_ENABLED', 'true').lower() == 'true'
+    HTTP_CACHE_DIR = os.environ.get('HTTP_CACHE_DIR') or os.path.join(os.getcwd(), 'http_cache')
+    HTTP_CACHE_MAX_BYTES = int(os.environ.get('HTTP_CACHE_MAX_BYTES', 256 * 1024 * 1024))  # 256MB
 
     # File upload settings
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB max file size
@@ -1,8 +1,10 @@
 from tinydb import TinyDB, Query
+from tinydb.table import Table
 from datetime import datetime
 import os
 import uuid
 import json
+import threading
 
 # Custom datetime serializer for TinyDB
 class DateTimeEncoder(json.JSONEncoder):
@@ -11,9 +13,39 @@ class DateTimeEncoder(json.JSONEncoder):
             return obj.isoformat()
         return super().default(obj)
 
+# TinyDB rewrites the whole file on every change, so concurrent writers
+# (e.g. crawl worker threads) must not interleave read-modify-write cycles
+_db_lock = threading.RLock()
+
+class LockedTable(Table):
+    """TinyDB table whose reads and writes are serialized across threads"""
+
+    def _read_table(self):
+        with _db_lock:
+            return super()._read_table()
+
+    def _update_table(self, updater):
+        with _db_lock:
+            return super()._update_table(updater)
+
+    def insert(self, document):
+        with _db_lock:
+            return super().insert(document)
+
+    def insert_multiple(self, documents):
+        with _db_lock:
+            return super().insert_multiple(documents)
+
+    def upsert(self, document, cond=None):
+        with _db_lock:
+            return super().upsert(document, cond)
+
+class LockedTinyDB(TinyDB):
+    table_class = LockedTable
+
 # Initialize TinyDB with custom serialization
 db_path = os.path.join(os.getcwd(), 'scraper_data.json')
-db = TinyDB(db_path)
+db = LockedTinyDB(db_path)
 
 # Define tables
 seo_table = db.table('seo_analysis')
@@ -21,6 +53,7 @@ product_table = db.table('product_data')
 job_table = db.table('scrape_jobs')
 crawl_session_table = db.table('crawl_sessions')
 crawl_result_table = db.table('crawl_results')
+robots_table = db.table('robots_cache')
 
 class DatabaseManager:
     """Database manager for TinyDB operations"""
@@ -152,7 +185,8 @@ class DatabaseManager:
 
     # Crawl Session methods
     @staticmethod
-    def create_crawl_session(base_url, max_urls=100, max_depth=3, respect_robots=True):
+    def create_crawl_session(base_url, max_urls=100, max_depth=3, respect_robots=True,
+                             max_workers=5, engine='async', incremental=False, previous_session_id=None):
         """Create a new crawl session"""
         record = {
             'id': DatabaseManager.generate_id(),
@@ -160,11 +194,25 @@ class DatabaseManager:
             'max_urls': max_urls,
             'max_depth': max_depth,
             'respect_robots': respect_robots,
+            'max_workers': max_workers,
+            'engine': engine,
+            'incremental': incremental,
+            'previous_session_id': previous_session_id,
             'status': 'pending',
             'total_urls_found': 0,
             'total_urls_analyzed': 0,
+            'total_urls_unchanged': 0,
+            'total_urls_blocked': 0,
+            'blocked_patterns': [],
+            'bytes_downloaded': 0,
+            'bytes_skipped': 0,
+            'responses_skipped': 0,
+            'keyword_stats': None,
+            'link_stats': None,
+            'link_check_stats': None,
             'issues_found': 0,
             'started_at': datetime.now().isoformat(),
+            'heartbeat_at': None,  # refreshed while the crawl runs
             'completed_at': None,
             'error_message': None
         }
@@ -189,6 +237,15 @@ class DatabaseManager:
         sessions = crawl_session_table.all()
         return sorted(sessions, key=lambda x: x.get('started_at', ''), reverse=True)
 
+    @staticmethod
+    def get_latest_completed_crawl_session(base_url):
+        """Get the most recent completed crawl session for a base URL, or None"""
+        Session = Query()
+        sessions = crawl_session_table.search((Session.base_url == base_url) & (Session.status == 'completed'))
+        if not sessions:
+            return None
+        return max(sessions, key=lambda x: x.get('started_at', ''))
+
     @staticmethod
     def create_crawl_result(session_id, url, seo_data, issues):
         """Create a crawl result for a specific URL"""
@@ -204,6 +261,29 @@ class DatabaseManager:
             'load_time': seo_data.get('load_time'),
             'mobile_friendly': seo_data.get('mobile_friendly', False),
             'robots_txt_status': seo_data.get('robots_txt_status'),
+            'error': seo_data.get('error'),
+            # Validators and links for incremental recrawls
+            'etag': seo_data.get('etag'),
+            'last_modified': seo_data.get('last_modified'),
+            'content_hash': seo_data.get('content_hash'),
+            'sitemap_lastmod': seo_data.get('sitemap_lastmod'),
+            'links': seo_data.get('links'),
+            'outbound_links': seo_data.get('outbound_links'),
+            'carried_forward_from': seo_data.get('carried_forward_from'),
+            # {'status', 'redirects'} of the crawl's request for the page, reused by the link checks
+            'fetched': seo_data.get('fetched'),
+            'simhash': seo_data.get('simhash'),
+            'near_duplicates': seo_data.get('near_duplicates', []),
+            # Site-relative keywords, filled in once the whole session is analyzed
+            'term_counts': seo_data.get('term_counts'),
+            'tfidf_keywords': seo_data.get('tfidf_keywords', {}),
+            # Internal link metrics, filled in once the whole session is crawled
+            'inlinks': seo_data.get('inlinks'),
+            'pagerank': seo_data.get('pagerank'),
+            'click_depth': seo_data.get('click_depth'),
+            # Links whose targets failed or redirected when the session's links were checked
+            'broken_links': seo_data.get('broken_links', []),
+            'redirected_links': seo_data.get('redirected_links', []),
             'issues': issues,  # List of issue descriptions
             'issue_count': len(issues),
             'analyzed_at': datetime.now().isoformat()
@@ -211,6 +291,12 @@ class DatabaseManager:
         crawl_result_table.insert(record)
         return record
 
+    @staticmethod
+    def update_crawl_result(result_id, updates):
+        """Update a crawl result"""
+        Result = Query()
+        crawl_result_table.update(updates, Result.id == result_id)
+
     @staticmethod
     def get_crawl_results(session_id):
         """Get all crawl results for a session"""
@@ -218,6 +304,19 @@ class DatabaseManager:
         results = crawl_result_table.search(Result.session_id == session_id)
         return sorted(results, key=lambda x: x.get('analyzed_at', ''))
 
+    # Robots.txt cache methods
+    @staticmethod
+    def save_robots_entry(entry):
+        """Store a robots.txt cache entry, replacing any entry for the same domain"""
+        Robots = Query()
+        robots_table.upsert(dict(entry), Robots.domain == entry['domain'])
+
+    @staticmethod
+    def get_robots_entry(domain):
+        """Get the stored robots.txt cache entry for a scheme://host domain"""
+        Robots = Query()
+        return robots_table.get(Robots.domain == domain)
+
     @staticmethod
     def count_crawl_sessions():
         """Count total crawl sessions"""
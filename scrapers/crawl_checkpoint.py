@@ -0,0 +1,72 @@
+"""
+Crawl Checkpoints
+Persists a crawl's frontier and visited set so an interrupted crawl can resume
+"""
+
+import json
+import os
+import tempfile
+from datetime import datetime
+
+from config import Config
+
+
+class CrawlCheckpoint:
+    """Crawl state saved to a JSON file, replaced atomically on every save"""
+
+    def __init__(self, path, interval=None):
+        """
+        Args:
+            path: File the checkpoint is written to
+            interval: Save after this many crawled pages
+        """
+        self.path = path
+        self.interval = interval or Config.CRAWL_CHECKPOINT_INTERVAL
+
+    @classmethod
+    def for_session(cls, session_id, interval=None):
+        """Checkpoint for a crawl session, stored under CRAWL_CHECKPOINT_DIR"""
+        return cls(os.path.join(Config.CRAWL_CHECKPOINT_DIR, f'{session_id}.json'), interval)
+
+    def exists(self):
+        return os.path.exists(self.path)
+
+    def saved_at(self):
+        """When the checkpoint was last written, or None if there is none"""
+        try:
+            return datetime.fromtimestamp(os.path.getmtime(self.path))
+        except OSError:
+            return None
+
+    def load(self):
+        """Return the saved crawl state, or None if there is no usable checkpoint"""
+        try:
+            with open(self.path, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"Error reading crawl checkpoint {self.path}: {e}")
+            return None
+
+    def save(self, state):
+        """Write crawl state, never leaving a half-written file behind"""
+        state = dict(state, saved_at=datetime.now().isoformat())
+        directory = os.path.dirname(self.path) or '.'
+        os.makedirs(directory, exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump(state, f)
+            os.replace(tmp_path, self.path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    def delete(self):
+        try:
+            os.remove(self.path)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,147 @@
+"""
+Crawl Frontier
+Priority queue of URLs waiting to be crawled, most valuable pages first
+"""
+
+import heapq
+import math
+from datetime import datetime, timezone
+
+
+def _parse_lastmod(value):
+    """Parse a sitemap <lastmod> (W3C datetime) into an aware datetime, or None"""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.strip().replace('Z', '+00:00'))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+
+class CrawlFrontier:
+    """
+    Max-heap of pending URLs keyed by a page value score
+
+    A URL's score rises with its sitemap <priority>, how recently its
+    sitemap <lastmod> was, and how many crawled pages link to it, and falls
+    with its click depth and any penalty (in depth units) it was queued
+    with, e.g. by trap detection. Equal scores are broken by URL, so the crawl and
+    ranked() order only depend on what has been discovered.
+
+    Score changes push a fresh heap entry; outdated entries are skipped
+    when popped and cleared out once they outnumber the live ones.
+    """
+
+    DEPTH_WEIGHT = 1.0
+    PRIORITY_WEIGHT = 1.0
+    INLINK_WEIGHT = 0.5
+    FRESHNESS_WEIGHT = 0.5
+    FRESHNESS_HALF_LIFE_DAYS = 90
+    DEFAULT_PRIORITY = 0.5
+
+    def __init__(self, sitemap_entries=None, now=None):
+        """
+        Args:
+            sitemap_entries: url -> {lastmod, priority, changefreq} from the
+                site's sitemaps
+            now: Reference time for lastmod freshness (defaults to now)
+        """
+        self.sitemap_entries = sitemap_entries if sitemap_entries is not None else {}
+        self.now = now or datetime.now(timezone.utc)
+        self._entries = {}  # url -> [depth, inlinks, score, penalty]
+        self._heap = []
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, url):
+        return url in self._entries
+
+    def score(self, url, depth, inlinks=0, penalty=0):
+        """Value of crawling a URL; higher is crawled first"""
+        entry = self.sitemap_entries.get(url) or {}
+
+        priority = entry.get('priority')
+        if priority is None:
+            priority = self.DEFAULT_PRIORITY
+
+        freshness = 0.0
+        lastmod = _parse_lastmod(entry.get('lastmod'))
+        if lastmod:
+            age_days = max((self.now - lastmod).total_seconds() / 86400, 0)
+            freshness = 0.5 ** (age_days / self.FRESHNESS_HALF_LIFE_DAYS)
+
+        return (self.PRIORITY_WEIGHT * priority
+                + self.FRESHNESS_WEIGHT * freshness
+                + self.INLINK_WEIGHT * math.log1p(inlinks)
+                - self.DEPTH_WEIGHT * (depth + penalty))
+
+    def push(self, url, depth, inlinks=0, penalty=0):
+        """
+        Add a URL, or move it to a shallower depth if it is already queued
+
+        Returns:
+            True if the URL was added or its depth changed
+        """
+        entry = self._entries.get(url)
+        if entry is None:
+            self._entries[url] = [depth, inlinks, None, penalty]
+        elif depth < entry[0]:
+            entry[0] = depth
+        else:
+            return False
+
+        self._rescore(url)
+        return True
+
+    def add_inlink(self, url):
+        """Count another crawled page linking to a queued URL"""
+        entry = self._entries.get(url)
+        if entry is not None:
+            entry[1] += 1
+            self._rescore(url)
+
+    def pop(self):
+        """
+        Remove and return the highest-scoring URL
+
+        Returns:
+            (url, depth, inlinks, score), or None if the frontier is empty
+        """
+        while self._heap:
+            negative_score, url = heapq.heappop(self._heap)
+            entry = self._entries.get(url)
+            if entry is not None and entry[2] == -negative_score:
+                del self._entries[url]
+                return url, entry[0], entry[1], entry[2]
+        return None
+
+    def remove(self, url):
+        self._entries.pop(url, None)
+
+    def ranked(self, limit=None):
+        """Queued URLs in the order they would be popped (the first `limit` of them)"""
+        def key(item):
+            return -item[1][2], item[0]
+
+        if limit is None:
+            items = sorted(self._entries.items(), key=key)
+        else:
+            items = heapq.nsmallest(limit, self._entries.items(), key=key)
+        return [url for url, _ in items]
+
+    def items(self):
+        """(url, depth, inlinks, penalty) of every queued URL"""
+        return [(url, entry[0], entry[1], entry[3]) for url, entry in self._entries.items()]
+
+    def _rescore(self, url):
+        entry = self._entries[url]
+        entry[2] = self.score(url, entry[0], entry[1], entry[3])
+        heapq.heappush(self._heap, (-entry[2], url))
+
+        if len(self._heap) > 2 * len(self._entries) + 64:
+            self._heap = [(-entry[2], url) for url, entry in self._entries.items()]
+            heapq.heapify(self._heap)
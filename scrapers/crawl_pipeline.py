@@ -0,0 +1,253 @@
+"""
+Crawl Pipeline
+Crawls a site and runs SEO analysis on each page from a single download
+"""
+
+from functools import partial
+
+from scrapers.seo_scraper import SeoScraper
+from utils.seo_analyzer import SeoIssueAnalyzer
+
+_worker_scrapers = {}  # respect_robots -> SeoScraper, per parser process
+
+# Term counts kept with each result, so resumed and incremental crawls can
+# score pages they do not download again
+STORED_TERMS = 100
+
+
+def analyze_page(soup, page, respect_robots=True, term_counter=None, fields=None):
+    """
+    SEO analysis and issues for a freshly parsed page, as (seo_data, issues)
+
+    Runs in a parser process when the crawler has a parse_pool (see
+    SiteCrawler.page_analyzer). Pages the crawler found unchanged are not
+    analyzed, since their previous result is carried forward. A streamed
+    page has no soup and is analyzed from its SEO fields instead.
+    """
+    if page.get('unchanged'):
+        return None
+
+    scraper = _worker_scrapers.get(respect_robots)
+    if scraper is None:
+        scraper = _worker_scrapers[respect_robots] = SeoScraper(respect_robots=respect_robots, http_cache=False)
+    scraper.term_counter = term_counter
+    if fields is not None:
+        seo_data = scraper.analyze_fields(page['url'], fields, page['load_time'], page['robots_status'])
+    else:
+        seo_data = scraper.analyze_document(page['url'], soup, page['load_time'], page['robots_status'])
+    return seo_data, SeoIssueAnalyzer.analyze_issues(seo_data)
+
+
+class CrawlPipeline:
+    """Feeds every page the crawler fetches straight into SeoScraper analysis"""
+
+    def __init__(self, crawler, seo_scraper, result_callback=None, keyword_engine=None, link_graph=None):
+        """
+        Args:
+            crawler: SiteCrawler used for discovery and fetching
+            seo_scraper: SeoScraper used for analysis
+            result_callback: Called as result_callback(url, seo_data, issues)
+                for every analyzed or failed URL
+            keyword_engine: KeywordEngine that every page's terms are added
+                to, for TF-IDF scoring once the crawl is done; the top
+                STORED_TERMS term counts are also saved as 'term_counts'
+            link_graph: LinkGraph that the links of every crawled page are
+                added to, including pages restored or carried forward
+        """
+        self.crawler = crawler
+        self.seo_scraper = seo_scraper
+        self.result_callback = result_callback
+        self.keyword_engine = keyword_engine
+        self.link_graph = link_graph
+        self.analyzed_urls = set()
+        self.analyzed_count = 0
+        self.unchanged_count = 0
+        self.total_issues = 0
+        self.previous_results = {}
+
+    def restore(self, results):
+        """
+        Take over results saved by an earlier, interrupted run
+
+        Their URLs are not analyzed (or saved) again, and they count towards
+        analyzed_count and total_issues.
+        """
+        for result in results:
+            self.analyzed_urls.add(result['url'])
+            self._add_links(result['url'], result.get('links'))
+            if not result.get('error'):
+                self.analyzed_count += 1
+                self.total_issues += result.get('issue_count', 0)
+                self._add_stored_terms(result)
+            if result.get('carried_forward_from'):
+                self.unchanged_count += 1
+
+    def run(self, base_url, max_urls, max_depth, checkpoint=None, previous_results=None):
+        """
+        Crawl base_url and analyze up to max_urls pages
+
+        Pages fetched during the crawl are analyzed from the crawler's own
+        response and parsed document, on this thread while the crawl carries
+        on in the background (see SiteCrawler.iter_crawl). Discovered URLs that were never fetched
+        (e.g. sitemap entries beyond the crawl depth) are fetched once by
+        SeoScraper afterwards. With a checkpoint the crawl can be resumed
+        after an interruption (see SiteCrawler.crawl_site).
+
+        If the crawler has a parse_pool, pages are parsed and analyzed in
+        its worker processes instead, so analysis runs on as many cores as
+        the pool has while the crawl threads only download.
+
+        With previous_results (the rows of an earlier crawl of the site) the
+        crawl is incremental: pages the crawler finds unchanged are not
+        analyzed again, and their previous result is carried forward.
+
+        Returns:
+            List of URLs covered by the crawl
+        """
+        self.previous_results = {
+            result['url']: result for result in previous_results or [] if not result.get('error')
+        }
+
+        term_counter = self.keyword_engine.counter_factory() if self.keyword_engine else None
+        self.seo_scraper.term_counter = term_counter
+        self.crawler.term_counter = term_counter
+        if self.crawler.parse_pool:
+            self.crawler.page_analyzer = partial(analyze_page, respect_robots=self.seo_scraper.respect_robots,
+                                                 term_counter=term_counter)
+        try:
+            pages = self.crawler.iter_crawl(base_url, max_urls, max_depth, checkpoint=checkpoint,
+                                            previous_pages=self.previous_results)
+            while True:
+                try:
+                    page = next(pages)
+                except StopIteration as finished:
+                    discovered_urls = finished.value
+                    break
+                self._handle_page(page)
+
+            for url in discovered_urls:
+                if url in self.analyzed_urls:
+                    continue
+
+                if self.crawler.sitemap_unchanged(url):
+                    self._carry_forward(url, {'sitemap_lastmod': self.previous_results[url].get('sitemap_lastmod')})
+                    continue
+
+                try:
+                    print(f"Analyzing URL: {url}")
+                    seo_data = self.seo_scraper.analyze_url(url)
+                    self._record(url, seo_data)
+                except Exception as e:
+                    print(f"Error analyzing {url}: {e}")
+                    self._record_error(url, e)
+        finally:
+            self.crawler.page_analyzer = None
+            self.crawler.term_counter = None
+            self.seo_scraper.term_counter = None
+
+        return discovered_urls
+
+    def _handle_page(self, page):
+        """Analyze a page the crawler has just fetched"""
+        url = page['url']
+        if not page['error']:
+            self._add_links(url, page['links'])
+        if url in self.analyzed_urls:
+            # Saved before an interruption; the crawl only needs its links
+            return
+
+        try:
+            if page['error']:
+                raise Exception(page['error'])
+
+            if page.get('unchanged') and url in self.previous_results:
+                self._carry_forward(url, page)
+                return
+
+            if page.get('analysis'):
+                # Done in a parser process
+                seo_data, issues = page['analysis']
+            elif page.get('seo_fields'):
+                # Streamed without building a tree
+                seo_data = self.seo_scraper.analyze_fields(
+                    url, page['seo_fields'], page['load_time'], page['robots_status']
+                )
+                issues = None
+            else:
+                seo_data = self.seo_scraper.analyze_document(
+                    url, page['soup'], page['load_time'], page['robots_status']
+                )
+                issues = None
+            seo_data.update(self._page_validators(page))
+            self._record(url, seo_data, issues)
+        except Exception as e:
+            error = Exception(f"Error analyzing {url}: {str(e)}")
+            print(error)
+            self._record_error(url, error, page.get('fetched'))
+
+    @staticmethod
+    def _page_validators(page):
+        """Fields an incremental crawl compares against, plus the page's links and how its request went"""
+        validators = {
+            name: page.get(name) for name in ('etag', 'last_modified', 'content_hash', 'sitemap_lastmod', 'fetched')
+        }
+        if 'links' in page:
+            validators['links'] = sorted(page['links'])
+        if 'outbound_links' in page:
+            validators['outbound_links'] = sorted(page['outbound_links'])
+        return validators
+
+    def _carry_forward(self, url, page):
+        """Record the previous crawl's result for a page that has not changed"""
+        previous = self.previous_results[url]
+        seo_data = dict(previous)
+        seo_data.update({name: value for name, value in self._page_validators(page).items() if value is not None})
+        seo_data['carried_forward_from'] = previous.get('session_id')
+        # Only what this crawl requested; a page unchanged in the sitemap was not
+        seo_data['fetched'] = page.get('fetched')
+
+        issues = list(previous.get('issues', []))
+        self._add_links(url, seo_data.get('links'))
+
+        # Count the page only once it is saved, so a failing callback is recorded as an error instead
+        if self.result_callback:
+            self.result_callback(url, seo_data, issues)
+        self._add_stored_terms(previous)
+        self.total_issues += len(issues)
+        self.analyzed_count += 1
+        self.unchanged_count += 1
+        self.analyzed_urls.add(url)
+
+    def _add_stored_terms(self, result):
+        """Add a saved result's term counts to the keyword engine, if it has any"""
+        if self.keyword_engine and result.get('term_counts') is not None:
+            self.keyword_engine.add_document(result['url'], result['term_counts'])
+
+    def _add_links(self, url, links):
+        """Add a crawled page's links to the link graph, if they are known"""
+        if self.link_graph and links is not None:
+            self.link_graph.add_page(url, links)
+
+    def _record(self, url, seo_data, issues=None):
+        terms = seo_data.pop('terms', None)
+        if terms is not None and self.keyword_engine:
+            seo_data['term_counts'] = dict(terms.most_common(STORED_TERMS))
+
+        if issues is None:
+            issues = SeoIssueAnalyzer.analyze_issues(seo_data)
+
+        # As in _carry_forward, nothing is counted until the result is saved
+        if self.result_callback:
+            self.result_callback(url, seo_data, issues)
+        if terms is not None and self.keyword_engine:
+            self.keyword_engine.add_document(url, terms)
+        self.total_issues += len(issues)
+        self.analyzed_count += 1
+        self.analyzed_urls.add(url)
+
+    def _record_error(self, url, error, fetched=None):
+        self.analyzed_urls.add(url)
+
+        if self.result_callback:
+            self.result_callback(url, {'url': url, 'error': str(error), 'fetched': fetched},
+                                 [f"Analysis failed: {str(error)}"])
@@ -0,0 +1,191 @@
+"""
+Crawler Trap Detection
+Spots URL spaces that explode (calendars, facets, session ids) and keeps them from eating the crawl budget
+"""
+
+import math
+import re
+from collections import Counter
+from urllib.parse import urlparse, parse_qsl
+
+from utils.url_set import FingerprintSet
+
+DATE_SEGMENT = re.compile(r'^\d{4}-\d{1,2}(-\d{1,2})?$')
+ID_SEGMENT = re.compile(r'^(?=.*\d)[0-9a-f-]{8,}$', re.IGNORECASE)
+SESSION_PARAMS = ('sid', 'sessid', 'sessionid', 'session_id', 'phpsessid', 'jsessionid', 'aspsessionid')
+
+
+def _segment_pattern(segment):
+    if segment.isdigit():
+        return '{n}'
+    if DATE_SEGMENT.match(segment):
+        return '{date}'
+    if ID_SEGMENT.match(segment):
+        return '{id}'
+    return segment
+
+
+def url_pattern(url):
+    """
+    Shape of a URL with variable parts generalized
+
+    http://shop.com/events/2024/05?page=3&sort=asc -> shop.com/events/{n}/{n}?page&sort
+    """
+    parsed = urlparse(url)
+    segments = [_segment_pattern(segment) for segment in parsed.path.split('/') if segment]
+    pattern = parsed.netloc + '/' + '/'.join(segments)
+
+    params = sorted({name for name, _ in parse_qsl(parsed.query, keep_blank_values=True)})
+    if params:
+        pattern += '?' + '&'.join(params)
+    return pattern
+
+
+class TrapDetector:
+    """
+    Decides whether a newly discovered URL is worth queueing
+
+    Counts the distinct URLs seen per URL pattern and the distinct values
+    seen per query parameter. Once a pattern or parameter passes its soft
+    limit, further URLs are throttled: they are queued with a priority
+    penalty that grows with the count. Past the hard limit they are dropped.
+    URLs with a path segment repeated max_repeats times, paths deeper than
+    max_path_depth and session-id parameters are dropped outright.
+    """
+
+    PATTERN_SOFT_LIMIT = 50
+    PATTERN_HARD_LIMIT = 500
+    PARAM_SOFT_LIMIT = 20
+    PARAM_HARD_LIMIT = 200
+    MAX_REPEATS = 3
+    MAX_PATH_DEPTH = 15
+
+    def __init__(self, pattern_limits=None, param_limits=None, max_repeats=None, max_path_depth=None):
+        self.pattern_soft_limit, self.pattern_hard_limit = pattern_limits or (self.PATTERN_SOFT_LIMIT,
+                                                                              self.PATTERN_HARD_LIMIT)
+        self.param_soft_limit, self.param_hard_limit = param_limits or (self.PARAM_SOFT_LIMIT,
+                                                                        self.PARAM_HARD_LIMIT)
+        self.max_repeats = max_repeats or self.MAX_REPEATS
+        self.max_path_depth = max_path_depth or self.MAX_PATH_DEPTH
+        self._pattern_counts = Counter()
+        self._param_values = {}  # host?param -> FingerprintSet of values
+        self._blocked_urls = FingerprintSet()
+        self._blocked = Counter()  # (reason, pattern) -> distinct URLs dropped
+        self._throttled = Counter()  # (reason, pattern) -> URLs queued with a penalty
+
+    def check(self, url):
+        """
+        Judge a URL the crawl has not seen before
+
+        Returns:
+            None if the URL should be dropped, otherwise the priority penalty
+            to queue it with (0 for URLs that look fine)
+        """
+        parsed = urlparse(url)
+        segments = [segment for segment in parsed.path.split('/') if segment]
+
+        reason = None
+        if len(segments) > self.max_path_depth:
+            reason, pattern = 'path too deep', url_pattern(url)
+        else:
+            repeated = [segment for segment, count in Counter(segments).items() if count >= self.max_repeats]
+            if repeated:
+                reason, pattern = 'repeating path segment', f"{parsed.netloc} /{repeated[0]}/ x{self.max_repeats}"
+
+        params = parse_qsl(parsed.query, keep_blank_values=True)
+        if reason is None:
+            for name, _ in params:
+                if name.lower() in SESSION_PARAMS:
+                    reason, pattern = 'session id parameter', f"{parsed.netloc} ?{name}="
+                    break
+
+        if reason:
+            return self._block(url, reason, pattern)
+
+        penalties = []
+        # Counts and parameter values are recorded only once the URL is known to be queued
+        throttled = []
+        new_values = {}  # key -> values of the parameter not seen before
+
+        # Cardinality of each query parameter's values on this host
+        for name, value in params:
+            key = f"{parsed.netloc} ?{name}="
+            values = self._param_values.get(key, ())
+            added = new_values.setdefault(key, set())
+            count = len(values) + len(added)
+            if value not in values and value not in added:
+                if count >= self.param_hard_limit:
+                    return self._block(url, 'parameter cardinality', key)
+                added.add(value)
+                count += 1
+            penalty = self._penalty(count, self.param_soft_limit)
+            if penalty:
+                throttled.append(('parameter cardinality', key))
+                penalties.append(penalty)
+
+        # Cardinality of the URL's pattern
+        pattern = url_pattern(url)
+        if self._pattern_counts[pattern] >= self.pattern_hard_limit:
+            return self._block(url, 'pattern cardinality', pattern)
+        self._pattern_counts[pattern] += 1
+        penalty = self._penalty(self._pattern_counts[pattern], self.pattern_soft_limit)
+        if penalty:
+            throttled.append(('pattern cardinality', pattern))
+            penalties.append(penalty)
+
+        for key, added in new_values.items():
+            values = self._param_values.setdefault(key, FingerprintSet(capacity=16))
+            for value in added:
+                values.add(value)
+        self._throttled.update(throttled)
+        return max(penalties, default=0)
+
+    @staticmethod
+    def _penalty(count, soft_limit):
+        """Priority penalty (in crawl-depth units) for the count-th URL of a pattern"""
+        if count <= soft_limit:
+            return 0
+        return 1 + math.log2(count / soft_limit)
+
+    def _block(self, url, reason, pattern):
+        if url not in self._blocked_urls:
+            self._blocked_urls.add(url)
+            self._blocked[(reason, pattern)] += 1
+        return None
+
+    @property
+    def blocked_count(self):
+        return sum(self._blocked.values())
+
+    def report(self):
+        """Patterns that were dropped or throttled, most dropped URLs first"""
+        keys = set(self._blocked) | set(self._throttled)
+        entries = [
+            {
+                'reason': reason,
+                'pattern': pattern,
+                'blocked': self._blocked.get((reason, pattern), 0),
+                'throttled': self._throttled.get((reason, pattern), 0)
+            }
+            for reason, pattern in keys
+        ]
+        return sorted(entries, key=lambda entry: (-entry['blocked'], -entry['throttled'], entry['pattern']))
+
+    def to_state(self):
+        """JSON-serializable form of the detector's counts"""
+        return {
+            'pattern_counts': dict(self._pattern_counts),
+            'param_values': {key: values.to_state() for key, values in self._param_values.items()},
+            'blocked_urls': self._blocked_urls.to_state(),
+            'blocked': [[reason, pattern, count] for (reason, pattern), count in self._blocked.items()],
+            'throttled': [[reason, pattern, count] for (reason, pattern), count in self._throttled.items()]
+        }
+
+    def restore_state(self, state):
+        self._pattern_counts = Counter(state.get('pattern_counts', {}))
+        self._param_values = {key: FingerprintSet.from_state(values)
+                              for key, values in state.get('param_values', {}).items()}
+        if state.get('blocked_urls'):
+            self._blocked_urls = FingerprintSet.from_state(state['blocked_urls'])
+        self._blocked = Counter({(reason, pattern): count for reason, pattern, count in state.get('blocked', [])})
+        self._throttled = Counter({(reason, pattern): count for reason, pattern, count in state.get('throttled', [])})
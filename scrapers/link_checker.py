@@ -0,0 +1,102 @@
+"""
+Link Checker
+Checks that the links found by a crawl resolve, requesting each distinct target once
+"""
+
+from concurrent.futures import ThreadPoolExecutor
+from itertools import zip_longest
+from urllib.parse import urljoin, urlparse
+
+from config import Config
+from scrapers.site_crawler import HostGate
+from utils.http_session import create_session
+from utils.rate_limiter import get_rate_limiter
+
+REDIRECT_STATUSES = (301, 302, 303, 307, 308)
+
+
+class LinkChecker:
+    """
+    Concurrent HEAD checks of link targets, at most per_host_limit at a time per host
+
+    Each target gets a HEAD request. Some servers refuse HEAD or answer it
+    wrongly, so an error status is confirmed with a GET whose body is never
+    read. Redirects are followed a hop at a time, so the whole chain is
+    reported. Requests go through the shared rate limiter like every other
+    scraper's, but never through the HTTP cache, since a cached page says
+    nothing about whether a link works now, nor the circuit breaker: once a
+    host's breaker opened, every other link to it would be reported broken
+    without being requested.
+    """
+
+    def __init__(self, user_agent=None, timeout=None, max_workers=None, per_host_limit=None,
+                 max_redirects=10, rate_limiter=None):
+        self.timeout = timeout or Config.LINK_CHECK_TIMEOUT
+        self.max_workers = max_workers or Config.LINK_CHECK_WORKERS
+        self.per_host_limit = per_host_limit or Config.LINK_CHECK_PER_HOST
+        self.max_redirects = max_redirects
+        self.rate_limiter = rate_limiter or get_rate_limiter()
+        self.session = create_session(user_agent, pool_maxsize=self.max_workers, circuit_breaker=False)
+        self.host_gate = HostGate(self.per_host_limit)
+
+    def check(self, urls):
+        """
+        Check every distinct URL in urls once
+
+        Returns:
+            Dict of url -> {'status', 'redirects', 'error'} (see check_url)
+        """
+        urls = self._interleave_hosts(dict.fromkeys(urls))
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='link-check') as executor:
+            return dict(zip(urls, executor.map(self.check_url, urls)))
+
+    @staticmethod
+    def _interleave_hosts(urls):
+        """
+        Order urls round-robin by host
+
+        Site-wide links mostly point at one host; queued one after another
+        they would leave every worker but per_host_limit waiting on it.
+        """
+        by_host = {}
+        for url in urls:
+            by_host.setdefault(urlparse(url).netloc, []).append(url)
+        return [url for batch in zip_longest(*by_host.values()) for url in batch if url is not None]
+
+    def check_url(self, url):
+        """
+        Request url, following redirects
+
+        Returns:
+            {'status': final HTTP status or None if there was no response,
+             'redirects': [{'status', 'location'}] for each redirect followed,
+             'error': why the check failed, or None}
+        """
+        result = {'status': None, 'redirects': [], 'error': None}
+        current = url
+        try:
+            for _ in range(self.max_redirects + 1):
+                status, location = self._request(current)
+                result['status'] = status
+                if status not in REDIRECT_STATUSES or not location:
+                    return result
+                current = urljoin(current, location)
+                result['redirects'].append({'status': status, 'location': current})
+            result['error'] = f"Too many redirects (more than {self.max_redirects})"
+        except Exception as e:
+            result['error'] = str(e)
+        return result
+
+    def _request(self, url):
+        """(status, Location header) of a HEAD request, or of a GET if HEAD gets an error status"""
+        with self.host_gate.slot(urlparse(url).netloc):
+            self.rate_limiter.wait(url)
+            response = self.session.head(url, timeout=self.timeout, allow_redirects=False)
+            response.close()
+
+            if response.status_code >= 400:
+                self.rate_limiter.wait(url)
+                response = self.session.get(url, timeout=self.timeout, allow_redirects=False, stream=True)
+                response.close()
+
+        return response.status_code, response.headers.get('Location')
@@ -1,43 +1,41 @@
-import requests
-from bs4 import BeautifulSoup
 import re
 import json
 from urllib.parse import urljoin, urlparse
-from urllib.robotparser import RobotFileParser
+from utils.rate_limiter import get_rate_limiter
+from utils.robots_cache import get_robots_cache
+from utils.http_cache import get_http_cache
+from utils.http_session import get_session
+from utils.circuit_breaker import get_circuit_breaker
+from utils.downloads import DownloadStats, read_html
+from utils.parsing import parse_html
 
 class ProductScraper:
-    def __init__(self, user_agent=None, timeout=30, respect_robots=True):
-        self.session = requests.Session()
+    def __init__(self, user_agent=None, timeout=30, respect_robots=True, rate_limiter=None,
+                 robots_cache=None, http_cache=None, max_response_bytes=None, download_stats=None):
         self.timeout = timeout
         self.respect_robots = respect_robots
-        self.session.headers.update({
-            'User-Agent': user_agent or 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        })
+        self.rate_limiter = rate_limiter or get_rate_limiter()
+        self.robots_cache = robots_cache or get_robots_cache()
+        # Pass http_cache=False to always go to the network
+        self.http_cache = http_cache if http_cache is not None else get_http_cache()
+        # Shared with every other scraper using the same settings, so connections are reused
+        self.session = get_session(user_agent, self.http_cache)
+        self.circuit_breaker = get_circuit_breaker()
+        self.max_response_bytes = max_response_bytes
+        self.download_stats = download_stats or DownloadStats()
+
+    def _needs_rate_limit(self, url):
+        """False when the page will be served from the cache or refused by an open circuit breaker"""
+        if self.circuit_breaker and self.circuit_breaker.is_open(url):
+            return False
+        return not (self.http_cache and self.http_cache.is_fresh(url, self.session.headers))
 
     def check_robots_txt(self, url):
         """Check if URL is allowed by robots.txt"""
         if not self.respect_robots:
             return True, "Robots.txt checking disabled"
 
-        try:
-            parsed_url = urlparse(url)
-            robots_url = f"{parsed_url.scheme}://{parsed_url.netloc}/robots.txt"
-
-            rp = RobotFileParser()
-            rp.set_url(robots_url)
-            rp.read()
-
-            user_agent = self.session.headers.get('User-Agent', '*')
-            can_fetch = rp.can_fetch(user_agent, url)
-
-            if can_fetch:
-                return True, "Allowed by robots.txt"
-            else:
-                return False, f"Blocked by robots.txt ({robots_url})"
-
-        except Exception as e:
-            # If we can't read robots.txt, assume it's allowed
-            return True, f"Could not read robots.txt: {str(e)}"
+        return self.robots_cache.check(url, self.session, self.timeout, self.rate_limiter)
     
     def scrape_product(self, url):
         """Scrape product information from a URL"""
@@ -49,12 +47,15 @@ class ProductScraper:
             if not robots_allowed:
                 raise Exception(f"Access denied by robots.txt: {robots_message}")
 
-            response = self.session.get(url, timeout=self.timeout)
+            if self._needs_rate_limit(url):
+                self.rate_limiter.wait(url)
+            response = self.session.get(url, timeout=self.timeout, stream=True)
 
             if response.status_code != 200:
+                response.close()
                 raise Exception(f"HTTP {response.status_code}: {response.reason}")
 
-            soup = BeautifulSoup(response.content, 'html.parser')
+            soup = parse_html(read_html(response, self.max_response_bytes, self.download_stats))
             
             # Try to detect the site and use appropriate selectors
             domain = urlparse(url).netloc.lower()
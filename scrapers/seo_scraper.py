@@ -1,44 +1,57 @@
-import requests
-from bs4 import BeautifulSoup
 import time
 import re
 from urllib.parse import urljoin, urlparse
 from collections import Counter
-from urllib.robotparser import RobotFileParser
+from bs4 import CData, Comment, NavigableString
+from config import Config
+from utils.rate_limiter import get_rate_limiter
+from utils.robots_cache import get_robots_cache
+from utils.http_cache import get_http_cache
+from utils.http_session import get_session
+from utils.circuit_breaker import get_circuit_breaker
+from utils.downloads import DownloadStats, read_html
+from utils.parsing import parse_html
+from utils.near_duplicates import HIDDEN_TAGS, simhash
+from scrapers.seo_stream import extract_seo_fields
+
+# The strings soup.get_text() returns; comments, doctypes and <script>/<style>/<template>
+# contents are NavigableString subclasses it leaves out
+TEXT_STRING_TYPES = (NavigableString, CData)
 
 class SeoScraper:
-    def __init__(self, user_agent=None, timeout=30, respect_robots=True):
-        self.session = requests.Session()
+    def __init__(self, user_agent=None, timeout=30, respect_robots=True, rate_limiter=None,
+                 robots_cache=None, http_cache=None, max_response_bytes=None, download_stats=None,
+                 streaming_threshold=None):
         self.timeout = timeout
         self.respect_robots = respect_robots
-        self.session.headers.update({
-            'User-Agent': user_agent or 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        })
+        self.rate_limiter = rate_limiter or get_rate_limiter()
+        self.robots_cache = robots_cache or get_robots_cache()
+        # Pass http_cache=False to always go to the network
+        self.http_cache = http_cache if http_cache is not None else get_http_cache()
+        # Shared with every other scraper using the same settings, so connections are reused
+        self.session = get_session(user_agent, self.http_cache)
+        self.circuit_breaker = get_circuit_breaker()
+        self.max_response_bytes = max_response_bytes
+        self.download_stats = download_stats or DownloadStats()
+        # Larger pages are analyzed as a stream instead of being parsed into a tree; 0 never streams
+        self.streaming_threshold = (streaming_threshold if streaming_threshold is not None
+                                    else Config.STREAMING_EXTRACTION_BYTES)
+        # Set to a TermCounter factory (see KeywordEngine.counter_factory) to add
+        # each page's term counts to its analysis as 'terms'
+        self.term_counter = None
+
+    def _needs_rate_limit(self, url):
+        """False when the page will be served from the cache or refused by an open circuit breaker"""
+        if self.circuit_breaker and self.circuit_breaker.is_open(url):
+            return False
+        return not (self.http_cache and self.http_cache.is_fresh(url, self.session.headers))
 
     def check_robots_txt(self, url):
         """Check if URL is allowed by robots.txt"""
         if not self.respect_robots:
             return True, "Robots.txt checking disabled"
 
-        try:
-            parsed_url = urlparse(url)
-            robots_url = f"{parsed_url.scheme}://{parsed_url.netloc}/robots.txt"
-
-            rp = RobotFileParser()
-            rp.set_url(robots_url)
-            rp.read()
-
-            user_agent = self.session.headers.get('User-Agent', '*')
-            can_fetch = rp.can_fetch(user_agent, url)
-
-            if can_fetch:
-                return True, "Allowed by robots.txt"
-            else:
-                return False, f"Blocked by robots.txt ({robots_url})"
-
-        except Exception as e:
-            # If we can't read robots.txt, assume it's allowed
-            return True, f"Could not read robots.txt: {str(e)}"
+        return self.robots_cache.check(url, self.session, self.timeout, self.rate_limiter)
     
     def analyze_url(self, url):
         """Perform comprehensive SEO analysis of a URL"""
@@ -60,57 +73,143 @@ class SeoScraper:
             if not robots_allowed:
                 raise Exception(f"Access denied by robots.txt: {robots_message}")
 
+            if self._needs_rate_limit(url):
+                self.rate_limiter.wait(url)
+
             start_time = time.time()
-            response = self.session.get(url, timeout=self.timeout, allow_redirects=True)
-            load_time = time.time() - start_time
+            response = self.session.get(url, timeout=self.timeout, allow_redirects=True, stream=True)
 
             print(f"Response status: {response.status_code}")  # Debug logging
 
             if response.status_code != 200:
+                response.close()
                 raise Exception(f"HTTP {response.status_code}: {response.reason}")
 
-            soup = BeautifulSoup(response.content, 'html.parser')
-            
-            analysis = {
-                'url': url,
-                'title': self._get_title(soup),
-                'meta_description': self._get_meta_description(soup),
-                'h1_tags': self._get_heading_tags(soup, 'h1'),
-                'h2_tags': self._get_heading_tags(soup, 'h2'),
-                'keywords': self._extract_keywords(soup),
-                'word_count': self._get_word_count(soup),
-                'load_time': round(load_time, 2),
-                'mobile_friendly': self._check_mobile_friendly(soup),
-                'images_without_alt': self._check_images_alt(soup),
-                'internal_links': self._count_internal_links(soup, url),
-                'external_links': self._count_external_links(soup, url),
-                'robots_txt_status': robots_message,
-                'respect_robots': self.respect_robots
-            }
-            
-            return analysis
+            body = read_html(response, self.max_response_bytes, self.download_stats)
+            load_time = time.time() - start_time
+            if getattr(response, 'from_cache', False):
+                load_time = response.elapsed.total_seconds()  # time of the original download
+
+            return self.analyze_markup(url, body, load_time, robots_message)
             
         except Exception as e:
             raise Exception(f"Error analyzing {url}: {str(e)}")
     
-    def _get_title(self, soup):
-        title_tag = soup.find('title')
-        return title_tag.get_text().strip() if title_tag else None
-    
-    def _get_meta_description(self, soup):
-        meta_desc = soup.find('meta', attrs={'name': 'description'})
-        return meta_desc.get('content', '').strip() if meta_desc else None
+    def analyze_markup(self, url, body, load_time, robots_status):
+        """
+        Parse a downloaded page (bytes or str) and build its SEO analysis
+        
+        Pages over streaming_threshold bytes are read with a streaming
+        parser (see scrapers.seo_stream) rather than built into a
+        BeautifulSoup tree, which for a multi-megabyte listing takes many
+        times the page's size in memory. Both give the same analysis (see
+        benchmarks/html_parsers.py). With streaming_threshold 0 every page
+        is parsed into a tree.
+        """
+        if self.streaming_threshold and len(body) > self.streaming_threshold:
+            term_counter = self.term_counter() if self.term_counter else None
+            return self.analyze_fields(url, extract_seo_fields(body, url, term_counter), load_time, robots_status)
+        return self.analyze_document(url, parse_html(body), load_time, robots_status)
     
-    def _get_heading_tags(self, soup, tag_name):
-        tags = soup.find_all(tag_name)
-        return [tag.get_text().strip() for tag in tags]
+    def analyze_document(self, url, soup, load_time, robots_status):
+        """
+        Build the SEO analysis for a page that has already been fetched and parsed.
+        
+        Used by the crawl pipeline so a page downloaded for link discovery is
+        not downloaded again for analysis.
+        """
+        domain = urlparse(url).netloc
+        title = None
+        meta_description = None
+        headings = {'h1': [], 'h2': []}
+        mobile_friendly = False
+        images_without_alt = []
+        internal_links = 0
+        external_links = 0
+        text = []
+        visible = []
+
+        # One walk over the document instead of a find_all()/get_text() per field.
+        # Leaves the soup untouched: <script>/<style> text is skipped rather than
+        # decomposed, so callers can keep using the tree.
+        for element in soup.descendants:
+            if isinstance(element, NavigableString):
+                parent = element.parent.name
+                if parent not in HIDDEN_TAGS and not isinstance(element, Comment):
+                    visible.append(element)
+                if type(element) in TEXT_STRING_TYPES and parent not in ('script', 'style'):
+                    text.append(element)
+                continue
+
+            name = element.name
+            if name == 'a':
+                href = element.get('href')
+                if href is not None:
+                    if href.startswith('/') or domain in href:
+                        internal_links += 1
+                    if href.startswith('http') and domain not in href:
+                        external_links += 1
+            elif name == 'img':
+                if not element.get('alt'):
+                    images_without_alt.append(element.get('src', 'No src attribute'))
+            elif name in headings:
+                headings[name].append(element.get_text().strip())
+            elif name == 'meta':
+                meta_name = element.get('name')
+                if meta_name == 'description' and meta_description is None:
+                    meta_description = element.get('content', '').strip()
+                elif meta_name == 'viewport':
+                    mobile_friendly = True
+            elif name == 'title' and title is None:
+                title = element.get_text().strip()
+
+        text = ''.join(text)
+        fields = {
+            'title': title,
+            'meta_description': meta_description,
+            'h1_tags': headings['h1'],
+            'h2_tags': headings['h2'],
+            'simhash': simhash(' '.join(visible)),
+            'keywords': self._extract_keywords(text),
+            'word_count': len(re.findall(r'\b\w+\b', text)),
+            'mobile_friendly': mobile_friendly,
+            'images_without_alt': images_without_alt,
+            'internal_links': internal_links,
+            'external_links': external_links
+        }
+        if self.term_counter:
+            term_counter = self.term_counter()
+            term_counter.feed(re.findall(r'\w+', text.lower()))
+            fields['terms'] = term_counter.counts
+        
+        return self.analyze_fields(url, fields, load_time, robots_status)
     
-    def _extract_keywords(self, soup):
-        # Remove script and style elements
-        for script in soup(["script", "style"]):
-            script.decompose()
+    def analyze_fields(self, url, fields, load_time, robots_status):
+        """The analysis dict, from the page fields extracted by either parser (see scrapers.seo_stream)"""
+        analysis = {
+            'url': url,
+            'title': fields['title'],
+            'meta_description': fields['meta_description'],
+            'h1_tags': fields['h1_tags'],
+            'h2_tags': fields['h2_tags'],
+            # Content fingerprint used to find near-duplicate pages
+            'simhash': fields['simhash'],
+            'keywords': fields['keywords'],
+            'word_count': fields['word_count'],
+            'load_time': round(load_time, 2),
+            'mobile_friendly': fields['mobile_friendly'],
+            'images_without_alt': fields['images_without_alt'],
+            'internal_links': fields['internal_links'],
+            'external_links': fields['external_links'],
+            'robots_txt_status': robots_status,
+            'respect_robots': self.respect_robots
+        }
+        if 'terms' in fields:
+            analysis['terms'] = fields['terms']
         
-        text = soup.get_text()
+        return analysis
+    
+    def _extract_keywords(self, text):
         # Clean and split text
         words = re.findall(r'\b[a-zA-Z]{3,}\b', text.lower())
         
@@ -119,51 +218,3 @@ class SeoScraper:
         
         # Return top 20 keywords
         return dict(word_freq.most_common(20))
-    
-    def _get_word_count(self, soup):
-        # Remove script and style elements
-        for script in soup(["script", "style"]):
-            script.decompose()
-        
-        text = soup.get_text()
-        words = re.findall(r'\b\w+\b', text)
-        return len(words)
-    
-    def _check_mobile_friendly(self, soup):
-        viewport_meta = soup.find('meta', attrs={'name': 'viewport'})
-        return viewport_meta is not None
-    
-    def _check_images_alt(self, soup):
-        images = soup.find_all('img')
-        images_without_alt = []
-        
-        for img in images:
-            if not img.get('alt'):
-                src = img.get('src', 'No src attribute')
-                images_without_alt.append(src)
-        
-        return images_without_alt
-    
-    def _count_internal_links(self, soup, base_url):
-        domain = urlparse(base_url).netloc
-        links = soup.find_all('a', href=True)
-        internal_count = 0
-        
-        for link in links:
-            href = link['href']
-            if href.startswith('/') or domain in href:
-                internal_count += 1
-        
-        return internal_count
-    
-    def _count_external_links(self, soup, base_url):
-        domain = urlparse(base_url).netloc
-        links = soup.find_all('a', href=True)
-        external_count = 0
-        
-        for link in links:
-            href = link['href']
-            if href.startswith('http') and domain not in href:
-                external_count += 1
-        
-        return external_count
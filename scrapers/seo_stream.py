@@ -0,0 +1,293 @@
+"""
+Streaming SEO Extraction
+Fills SeoScraper's analysis fields from a page without building a document tree
+"""
+
+import codecs
+import re
+from collections import Counter
+from html.parser import HTMLParser
+from urllib.parse import urlparse
+
+from bs4.dammit import EncodingDetector, UnicodeDammit
+
+from utils.near_duplicates import HIDDEN_TAGS, SimHasher
+
+CHUNK_SIZE = 64 * 1024
+SNIFF_BYTES = 64 * 1024  # start of the page used to pick its encoding
+
+# BeautifulSoup's html.parser tree builder treats these specially; the
+# extractor follows the same rules so its fields match analyze_document's
+VOID_TAGS = frozenset([
+    'area', 'base', 'br', 'col', 'embed', 'hr', 'img', 'input', 'keygen', 'link', 'menuitem', 'meta',
+    'param', 'source', 'track', 'wbr', 'basefont', 'bgsound', 'command', 'frame', 'image', 'isindex',
+    'nextid', 'spacer'
+])
+STRING_CONTAINER_TAGS = frozenset(['script', 'style', 'template', 'rt', 'rp'])  # text left out of get_text()
+PRESERVE_WHITESPACE_TAGS = frozenset(['pre', 'textarea'])
+ASCII_SPACES = frozenset('\x20\x0a\x09\x0c\x0d')
+
+KEYWORD_PATTERN = re.compile(r'[a-zA-Z]{3,}')
+
+
+def _is_word_char(char):
+    # What \w matches in a str pattern
+    return char.isalnum() or char == '_'
+
+
+class _WordRuns:
+    """Splits text fed in pieces into \\w runs, as if the pieces were one string"""
+
+    def __init__(self):
+        self._tail = ''
+
+    def feed(self, text):
+        text = self._tail + text
+        cut = len(text)
+        while cut and _is_word_char(text[cut - 1]):
+            cut -= 1
+        # The last run may carry on in the next piece
+        self._tail = text[cut:]
+        return re.findall(r'\w+', text[:cut])
+
+    def close(self):
+        tail, self._tail = self._tail, ''
+        return [tail] if tail else []
+
+
+class StreamingSeoExtractor(HTMLParser):
+    """
+    Incremental parser that collects the page fields of SeoScraper.analyze_document
+
+    Feed it the page as text, a chunk at a time, then close() it and read
+    fields(). Only counters, the lists that end up in the analysis and the
+    names of the open elements are kept, so memory does not grow with the
+    size of the page the way a BeautifulSoup tree does. With a term_counter
+    (see utils.keywords.TermCounter) the page's terms are counted too.
+    """
+
+    def __init__(self, base_url, term_counter=None):
+        super().__init__(convert_charrefs=True)
+        self.domain = urlparse(base_url).netloc
+        self.title = None
+        self.meta_description = None
+        self.headings = {'h1': [], 'h2': []}
+        self.mobile_friendly = False
+        self.images_without_alt = []
+        self.internal_links = 0
+        self.external_links = 0
+        self.word_count = 0
+        self.keywords = Counter()
+        self.simhasher = SimHasher()
+        self.term_counter = term_counter
+        self.hrefs = []  # href of every <a>, as written
+        self._words = _WordRuns()
+        self._lowercase_words = _WordRuns()
+        self._stack = []  # names of the open elements
+        self._containers = 0  # open elements from STRING_CONTAINER_TAGS
+        self._preserve_whitespace = 0  # open elements from PRESERVE_WHITESPACE_TAGS
+        self._captures = []  # [stack depth, setter, text pieces] of open headings and the title
+        self._closed_voids = Counter()  # void elements whose redundant end tag is ignored, e.g. </br> after <br>
+        self._data = []
+
+    def fields(self):
+        """The extracted fields, named as in SeoScraper.analyze_document"""
+        fields = {
+            'title': self.title,
+            'meta_description': self.meta_description,
+            'h1_tags': self.headings['h1'],
+            'h2_tags': self.headings['h2'],
+            'simhash': self.simhasher.hexdigest(),
+            'keywords': dict(self.keywords.most_common(20)),
+            'word_count': self.word_count,
+            'mobile_friendly': self.mobile_friendly,
+            'images_without_alt': self.images_without_alt,
+            'internal_links': self.internal_links,
+            'external_links': self.external_links
+        }
+        if self.term_counter:
+            fields['terms'] = self.term_counter.counts
+        return fields
+
+    def close(self):
+        super().close()
+        self._end_data()
+        while self._stack:
+            self._pop()
+        self._count_words(self._words.close(), self._lowercase_words.close())
+
+    def handle_starttag(self, tag, attrs):
+        self._start(tag, attrs)
+        if tag in VOID_TAGS:
+            self._closed_voids[tag] += 1
+
+    def handle_startendtag(self, tag, attrs):
+        self._start(tag, attrs)
+        if tag not in VOID_TAGS:
+            self._pop_to(tag)
+
+    def handle_endtag(self, tag):
+        if self._closed_voids[tag]:
+            # Not even the end of a string, as in BeautifulSoup
+            self._closed_voids[tag] -= 1
+            return
+        self._end_data()
+        self._pop_to(tag)
+
+    def _start(self, tag, attrs):
+        self._end_data()
+        # Valueless attributes are '' and the last of a repeated attribute wins, as in BeautifulSoup
+        attrs = {name: value if value is not None else '' for name, value in attrs}
+
+        if tag == 'a':
+            href = attrs.get('href')
+            if href is not None:
+                self.hrefs.append(href)
+                if href.startswith('/') or self.domain in href:
+                    self.internal_links += 1
+                if href.startswith('http') and self.domain not in href:
+                    self.external_links += 1
+        elif tag == 'img':
+            if not attrs.get('alt'):
+                self.images_without_alt.append(attrs.get('src', 'No src attribute'))
+        elif tag == 'meta':
+            if attrs.get('name') == 'description' and self.meta_description is None:
+                self.meta_description = attrs.get('content', '').strip()
+            elif attrs.get('name') == 'viewport':
+                self.mobile_friendly = True
+
+        if tag in VOID_TAGS:
+            return
+
+        self._stack.append(tag)
+        if tag in STRING_CONTAINER_TAGS:
+            self._containers += 1
+        if tag in PRESERVE_WHITESPACE_TAGS:
+            self._preserve_whitespace += 1
+
+        # Headings are listed in the order they open, though an inner one closes first
+        if tag in self.headings:
+            headings = self.headings[tag]
+            headings.append('')
+            self._capture(lambda text, headings=headings, index=len(headings) - 1:
+                          headings.__setitem__(index, text))
+        elif tag == 'title' and self.title is None:
+            self.title = ''
+            self._capture(lambda text: setattr(self, 'title', text))
+
+    def handle_data(self, data):
+        self._data.append(data)
+
+    def handle_comment(self, data):
+        self._end_data()
+
+    def handle_decl(self, decl):
+        self._end_data()
+        self._string(decl[len('DOCTYPE '):], text=False)
+
+    def unknown_decl(self, data):
+        self._end_data()
+        if data.upper().startswith('CDATA['):
+            self._string(data[len('CDATA['):], text=True)
+        else:
+            self._string(data, text=False)
+
+    def handle_pi(self, data):
+        self._end_data()
+        self._string(data, text=False)
+
+    def _capture(self, setter):
+        self._captures.append([len(self._stack), setter, []])
+
+    def _pop_to(self, tag):
+        if tag in self._stack:
+            while self._pop() != tag:
+                pass
+
+    def _pop(self):
+        depth = len(self._stack)
+        tag = self._stack.pop()
+        if tag in STRING_CONTAINER_TAGS:
+            self._containers -= 1
+        if tag in PRESERVE_WHITESPACE_TAGS:
+            self._preserve_whitespace -= 1
+        if self._captures and self._captures[-1][0] == depth:
+            _, setter, pieces = self._captures.pop()
+            setter(''.join(pieces).strip())
+        return tag
+
+    def _end_data(self):
+        """Turn the text since the last tag into one string, as BeautifulSoup does"""
+        if not self._data:
+            return
+        data = ''.join(self._data)
+        self._data = []
+        if not self._preserve_whitespace and all(char in ASCII_SPACES for char in data):
+            data = '\n' if '\n' in data else ' '
+        self._string(data, text=not self._containers)
+
+    def _string(self, data, text):
+        """
+        Account for one string of the document
+
+        Strings count towards the SimHash unless their element is hidden,
+        and towards headings, keywords and words when text is True (what
+        get_text() would include).
+        """
+        if not self._stack or self._stack[-1] not in HIDDEN_TAGS:
+            self.simhasher.update(data)
+        if text:
+            for _, _, pieces in self._captures:
+                pieces.append(data)
+            self._count_words(self._words.feed(data), self._lowercase_words.feed(data.lower()))
+
+    def _count_words(self, words, lowercase_words):
+        self.word_count += len(words)
+        # Same as matching \b[a-zA-Z]{3,}\b against the lowercased text
+        self.keywords.update(word for word in lowercase_words if KEYWORD_PATTERN.fullmatch(word))
+        if self.term_counter:
+            self.term_counter.feed(lowercase_words)
+
+
+def decode_chunks(body, chunk_size=CHUNK_SIZE):
+    """
+    Decode a page a chunk at a time
+
+    The encoding is the one BeautifulSoup would pick for the first
+    SNIFF_BYTES (byte order mark, declared charset, then UTF-8 and
+    windows-1252); bytes that are invalid in it further on are replaced.
+    """
+    detector = EncodingDetector(body[:SNIFF_BYTES], is_html=True)
+    start = min(len(body), SNIFF_BYTES) - len(detector.markup)  # skips a byte order mark
+
+    for encoding in detector.encodings:
+        encoding = UnicodeDammit.CHARSET_ALIASES.get(encoding, encoding)
+        try:
+            codecs.getincrementaldecoder(encoding)().decode(detector.markup)
+        except (LookupError, UnicodeDecodeError):
+            continue
+        break
+    else:
+        encoding = 'utf-8'
+
+    decoder = codecs.getincrementaldecoder(encoding)(errors='replace')
+    for offset in range(start, len(body), chunk_size):
+        yield decoder.decode(body[offset:offset + chunk_size])
+    yield decoder.decode(b'', final=True)
+
+
+def stream_document(body, base_url, term_counter=None):
+    """Run body (bytes or str) through a StreamingSeoExtractor and return the closed extractor"""
+    extractor = StreamingSeoExtractor(base_url, term_counter)
+    chunks = decode_chunks(body) if isinstance(body, bytes) else (
+        body[offset:offset + CHUNK_SIZE] for offset in range(0, len(body), CHUNK_SIZE)
+    )
+    for chunk in chunks:
+        extractor.feed(chunk)
+    extractor.close()
+    return extractor
+
+
+def extract_seo_fields(body, base_url, term_counter=None):
+    """analyze_document's page fields for body (bytes or str), parsed as a stream"""
+    return stream_document(body, base_url, term_counter).fields()
@@ -1,61 +1,269 @@
-import requests
-from bs4 import BeautifulSoup
+import asyncio
+import hashlib
+import codecs
+import gzip
+import io
 import time
 import re
 from urllib.parse import urljoin, urlparse, urlunparse
-from urllib.robotparser import RobotFileParser
+from xml.sax.saxutils import unescape
 import xml.etree.ElementTree as ET
 from collections import deque
 import threading
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import queue
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from contextlib import contextmanager
+from utils.rate_limiter import get_rate_limiter
+from utils.robots_cache import get_robots_cache
+from utils.http_cache import get_http_cache
+from utils.http_session import get_session
+from utils.circuit_breaker import get_circuit_breaker
+from utils.downloads import DownloadStats, ResponseRejected, read_html
+from config import Config
+from utils.parsing import parse_html
+from scrapers.seo_stream import stream_document
+from scrapers.crawl_frontier import CrawlFrontier
+from scrapers.crawl_traps import TrapDetector
+from utils.near_duplicates import NearDuplicateIndex, simhash, visible_text
+from utils.url_set import SEEN_SET_TYPES, make_url_set, url_set_to_state, url_set_from_state
+
+SITEMAP_CHUNK_SIZE = 64 * 1024
+LOC_OVERLAP = 4096  # trailing bytes of a chunk rescanned with the next one, so a <loc> split between them is found
+GZIP_MAGIC = b'\x1f\x8b'
+LOC_PATTERN = re.compile(r'<loc>(.*?)</loc>', re.IGNORECASE | re.DOTALL)
+
+
+def parse_page(body, page, want_simhash=False, analyzer=None, streaming_threshold=0, term_counter=None):
+    """
+    Parse a downloaded page into the fields fetch_page adds to it
+
+    Module-level so a SiteCrawler's parse_pool can run it in a worker
+    process. The soup stays in the worker; only the picklable results come
+    back: 'links', 'outbound_links', 'simhash' if want_simhash, and 'analysis', the return
+    value of analyzer(soup, page) if an analyzer is given.
+
+    Pages over streaming_threshold bytes are read as a stream without
+    building a tree (see stream_page_fields); 0 never streams.
+    """
+    if streaming_threshold and len(body) > streaming_threshold:
+        return stream_page_fields(body, page, want_simhash, analyzer, term_counter)
+    return page_fields(parse_html(body), page, want_simhash, analyzer)
+
+
+def page_fields(soup, page, want_simhash=False, analyzer=None):
+    """The fields parse_page returns, for a page that is already parsed"""
+    outbound_links = set()
+    fields = {'links': SiteCrawler.extract_links(soup, page['url'], outbound_links), 'outbound_links': outbound_links}
+    if want_simhash:
+        fields['simhash'] = simhash(visible_text(soup))
+    if analyzer:
+        fields['analysis'] = analyzer(soup, page)
+    return fields
+
+
+def stream_page_fields(body, page, want_simhash=False, analyzer=None, term_counter=None):
+    """
+    The fields parse_page returns, read in one streaming pass (see scrapers.seo_stream)
+
+    There is no soup, so the page's SEO fields come back as 'seo_fields'
+    (with its terms if a term_counter factory is given), and analyzer is
+    called as analyzer(None, page, fields=seo_fields).
+    """
+    extractor = stream_document(body, page['url'], term_counter() if term_counter else None)
+    outbound_links = set()
+    seo_fields = extractor.fields()
+    fields = {
+        'links': SiteCrawler.links_from_hrefs(extractor.hrefs, page['url'], outbound_links),
+        'outbound_links': outbound_links,
+        'seo_fields': seo_fields
+    }
+    if want_simhash:
+        fields['simhash'] = seo_fields['simhash']
+    if analyzer:
+        fields['analysis'] = analyzer(None, page, fields=seo_fields)
+    return fields
+
+def _local_name(tag):
+    """Strip the XML namespace from an element tag"""
+    return tag.rsplit('}', 1)[-1]
+
+def _sitemap_entry(fields):
+    """Build the metadata kept for a sitemap <url> entry"""
+    try:
+        priority = float(fields['priority']) if fields.get('priority') else None
+    except ValueError:
+        priority = None
+    
+    return {
+        'lastmod': fields.get('lastmod') or None,
+        'priority': priority,
+        'changefreq': fields.get('changefreq') or None
+    }
+
+def _scan_locs(first_chunk, stream):
+    """Yield <loc> values with a regex, reading the rest of the stream chunk by chunk"""
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='ignore')
+    buffer = decoder.decode(first_chunk)
+    
+    while True:
+        last_end = 0
+        for match in LOC_PATTERN.finditer(buffer):
+            yield unescape(match.group(1).strip())
+            last_end = match.end()
+        
+        chunk = stream.read(SITEMAP_CHUNK_SIZE)
+        if not chunk:
+            break
+        
+        # Keep any partial <loc> element from the end of the previous chunk
+        buffer = buffer[max(last_end, len(buffer) - LOC_OVERLAP):] + decoder.decode(chunk)
+
+class HostGate:
+    """Per-host concurrency gate shared by crawl worker threads"""
+    
+    def __init__(self, max_concurrent=4):
+        self.max_concurrent = max_concurrent
+        self._lock = threading.Lock()
+        self._semaphores = {}
+    
+    def acquire(self, host):
+        """Block until fewer than max_concurrent requests to host are running"""
+        with self._lock:
+            if host not in self._semaphores:
+                self._semaphores[host] = threading.BoundedSemaphore(self.max_concurrent)
+            semaphore = self._semaphores[host]
+        
+        semaphore.acquire()
+    
+    def release(self, host):
+        self._semaphores[host].release()
+    
+    @contextmanager
+    def slot(self, host):
+        self.acquire(host)
+        try:
+            yield
+        finally:
+            self.release(host)
 
 class SiteCrawler:
-    def __init__(self, user_agent=None, timeout=30, respect_robots=True, max_workers=5):
-        self.session = requests.Session()
+    ENGINES = ('async', 'threaded', 'sequential')
+    MAX_SITEMAPS = 500
+    MAX_SITEMAP_URLS = 100000
+
+    def __init__(self, user_agent=None, timeout=30, respect_robots=True, max_workers=5,
+                 engine='async', per_host_limit=4, rate_limiter=None, robots_cache=None,
+                 seen_set='exact', seen_set_error_rate=0.001, http_cache=None, skip_duplicate_links=False,
+                 detect_traps=True, max_response_bytes=None, parse_pool=None, streaming_threshold=None):
+        if engine not in self.ENGINES:
+            raise ValueError(f"Unknown crawl engine '{engine}' - expected one of {', '.join(self.ENGINES)}")
+        if seen_set not in SEEN_SET_TYPES:
+            raise ValueError(f"Unknown seen-set type '{seen_set}' - expected one of {', '.join(SEEN_SET_TYPES)}")
+
         self.timeout = timeout
         self.respect_robots = respect_robots
         self.max_workers = max_workers
-        self.session.headers.update({
-            'User-Agent': user_agent or 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
-        })
-        self.discovered_urls = set()
-        self.crawled_urls = set()
-        self.robots_cache = {}
+        self.engine = engine
+        self.per_host_limit = per_host_limit
+        self.seen_set = seen_set
+        self.seen_set_error_rate = seen_set_error_rate
+        self.skip_duplicate_links = skip_duplicate_links
+        self.detect_traps = detect_traps
+        self.max_response_bytes = max_response_bytes
+        # Executor (see utils.parsing.get_parse_pool) that parses pages in other
+        # processes; each fetch thread waits for its own page, so no more than
+        # max_workers pages are ever queued for it
+        self.parse_pool = parse_pool
+        # Optional picklable analyzer(soup, page) run on every parsed page; its
+        # result is the page's 'analysis'
+        self.page_analyzer = None
+        # Larger pages are read as a stream instead of being parsed into a tree; 0 never streams
+        self.streaming_threshold = (streaming_threshold if streaming_threshold is not None
+                                    else Config.STREAMING_EXTRACTION_BYTES)
+        # Optional picklable TermCounter factory; streamed pages count their terms as they are read
+        self.term_counter = None
+        self.download_stats = DownloadStats()
+        self.rate_limiter = rate_limiter or get_rate_limiter()
+        self.robots_cache = robots_cache or get_robots_cache()
+        # Pass http_cache=False to always go to the network
+        self.http_cache = http_cache if http_cache is not None else get_http_cache()
+        
+        # A pooled connection per worker, kept alive across crawls with the same settings
+        self.session = get_session(user_agent, self.http_cache, pool_maxsize=max_workers)
+        self.circuit_breaker = get_circuit_breaker()
+        
+        # discovered_urls/crawled_urls answer "seen before?" and may be compact
+        # sets that cannot be listed, so the URLs a crawl returns are also kept
+        # in order: every crawled URL, and discovered ones up to max_urls
+        self.discovered_urls = self._new_url_set()
+        self.crawled_urls = self._new_url_set()
+        self.crawled_order = []
+        self.discovered_order = []
+        self._max_urls = 0
+        self.sitemap_entries = {}
+        self.frontier = CrawlFrontier()
+        self._in_flight = {}  # url -> (depth, inlinks) of claimed pages not yet recorded
+        self._scores = {}  # url -> frontier score of every crawled page
+        self.previous_pages = {}  # url -> result row from the previous crawl (incremental mode)
+        self.duplicate_index = NearDuplicateIndex()
+        self.duplicate_pages = 0
+        self.trap_detector = TrapDetector() if detect_traps else None
+        self._penalties = {}  # url -> frontier penalty of throttled URLs admitted but not scheduled yet
         self.progress_callback = None
+        self.page_callback = None
+        
+        # Guards discovered_urls/crawled_urls/frontier across worker threads
+        self._lock = threading.Lock()
+        self._checkpoint = None
+        self._pages_since_checkpoint = 0
+        self._page_queue = None  # set while iter_crawl is running
+        self._stop_requested = threading.Event()
+    
+    def _new_url_set(self):
+        return make_url_set(self.seen_set, self.seen_set_error_rate)
+    
+    def _admit(self, url):
+        """Run a link past trap detection; False drops it (caller holds self._lock)"""
+        if url in self.discovered_urls:
+            return True
+        
+        penalty = self.trap_detector.check(url)
+        if penalty is None:
+            return False
+        if penalty:
+            self._penalties[url] = penalty
+        return True
+    
+    def _add_discovered(self, urls):
+        """Record discovered URLs (caller holds self._lock or is single-threaded)"""
+        for url in urls:
+            if url not in self.discovered_urls:
+                self.discovered_urls.add(url)
+                if len(self.discovered_order) < self._max_urls:
+                    self.discovered_order.append(url)
     
     def set_progress_callback(self, callback):
         """Set a callback function to track crawling progress"""
         self.progress_callback = callback
     
+    def set_page_callback(self, callback):
+        """
+        Set a callback that receives every fetched page (see fetch_page).
+        
+        The callback always runs on the thread that called crawl_site, so it
+        may safely write to the database.
+        """
+        self.page_callback = callback
+    
     def check_robots_txt(self, url):
         """Check if URL is allowed by robots.txt (cached)"""
         if not self.respect_robots:
             return True, "Robots.txt checking disabled"
         
-        try:
-            parsed_url = urlparse(url)
-            domain = f"{parsed_url.scheme}://{parsed_url.netloc}"
-            
-            if domain not in self.robots_cache:
-                robots_url = f"{domain}/robots.txt"
-                rp = RobotFileParser()
-                rp.set_url(robots_url)
-                rp.read()
-                self.robots_cache[domain] = rp
-            
-            rp = self.robots_cache[domain]
-            user_agent = self.session.headers.get('User-Agent', '*')
-            can_fetch = rp.can_fetch(user_agent, url)
-            
-            if can_fetch:
-                return True, "Allowed by robots.txt"
-            else:
-                return False, f"Blocked by robots.txt"
-                
-        except Exception as e:
-            return True, f"Could not read robots.txt: {str(e)}"
+        return self.robots_cache.check(url, self.session, self.timeout, self.rate_limiter)
     
-    def normalize_url(self, url, base_url):
+    @staticmethod
+    def normalize_url(url, base_url):
         """Normalize URL and make it absolute"""
         if not url:
             return None
@@ -84,113 +292,401 @@ class SiteCrawler:
         
         return cleaned
     
-    def is_same_domain(self, url, base_url):
+    @staticmethod
+    def is_same_domain(url, base_url):
         """Check if URL belongs to the same domain"""
         return urlparse(url).netloc == urlparse(base_url).netloc
     
+    def _needs_rate_limit(self, url):
+        """
+        False when the page will be served without a request (HTTP cache or
+        unchanged sitemap entry) or refused by an open circuit breaker
+        """
+        if self.sitemap_unchanged(url):
+            return False
+        if self.circuit_breaker and self.circuit_breaker.is_open(url):
+            return False
+        return not (self.http_cache and self.http_cache.is_fresh(url, self.session.headers))
+    
+    def sitemap_unchanged(self, url):
+        """
+        Whether the sitemap lastmod of url is the one recorded by the
+        previous crawl, so the page can be carried forward without a request
+        """
+        previous = self.previous_pages.get(url)
+        if not previous or previous.get('links') is None:
+            return False
+        
+        lastmod = (self.sitemap_entries.get(url) or {}).get('lastmod')
+        return bool(lastmod) and lastmod == previous.get('sitemap_lastmod')
+    
+    def _get(self, url):
+        """GET a URL once the rate limiter allows another request to its host"""
+        if self._needs_rate_limit(url):
+            self.rate_limiter.wait(url)
+        return self.session.get(url, timeout=self.timeout)
+    
     def discover_urls_from_sitemap(self, base_url):
-        """Discover URLs from sitemap.xml"""
-        discovered = set()
+        """
+        Discover URLs from sitemap.xml
+        
+        Checks /sitemap.xml, /sitemap_index.xml and any Sitemap: lines in
+        robots.txt. Child sitemaps of an index are fetched concurrently as
+        they are found. lastmod/priority/changefreq of every URL are kept in
+        self.sitemap_entries, for at most MAX_SITEMAP_URLS URLs; once it is
+        full, further URLs and child sitemaps are ignored.
+        """
+        self.sitemap_entries = {}
         
         try:
             parsed_base = urlparse(base_url)
+            domain = f"{parsed_base.scheme}://{parsed_base.netloc}"
             sitemap_urls = [
-                f"{parsed_base.scheme}://{parsed_base.netloc}/sitemap.xml",
-                f"{parsed_base.scheme}://{parsed_base.netloc}/sitemap_index.xml",
-                f"{parsed_base.scheme}://{parsed_base.netloc}/robots.txt"  # Check for sitemap in robots.txt
+                f"{domain}/sitemap.xml",
+                f"{domain}/sitemap_index.xml"
             ]
             
-            for sitemap_url in sitemap_urls:
-                try:
-                    response = self.session.get(sitemap_url, timeout=self.timeout)
-                    if response.status_code == 200:
-                        if 'sitemap.xml' in sitemap_url:
-                            urls = self._parse_sitemap(response.content)
-                            discovered.update(urls)
-                        elif 'robots.txt' in sitemap_url:
-                            # Look for sitemap declarations in robots.txt
-                            for line in response.text.split('\n'):
-                                if line.lower().startswith('sitemap:'):
-                                    sitemap_ref = line.split(':', 1)[1].strip()
-                                    try:
-                                        sitemap_response = self.session.get(sitemap_ref, timeout=self.timeout)
-                                        if sitemap_response.status_code == 200:
-                                            urls = self._parse_sitemap(sitemap_response.content)
-                                            discovered.update(urls)
-                                    except:
-                                        continue
-                except:
-                    continue
+            # Look for sitemap declarations in robots.txt
+            robots = self.robots_cache.get_entry(base_url, self.session, self.timeout)
+            for line in robots['content'].split('\n'):
+                if line.lower().startswith('sitemap:'):
+                    sitemap_urls.append(line.split(':', 1)[1].strip())
+            
+            seen = set()
+            pending = {}
+            
+            with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+                def submit(sitemap_url):
+                    if len(self.sitemap_entries) >= self.MAX_SITEMAP_URLS:
+                        return
+                    if sitemap_url and sitemap_url not in seen and len(seen) < self.MAX_SITEMAPS:
+                        seen.add(sitemap_url)
+                        pending[executor.submit(self._fetch_sitemap, sitemap_url)] = sitemap_url
+                
+                for sitemap_url in sitemap_urls:
+                    submit(sitemap_url)
+                
+                while pending:
+                    done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                    for future in done:
+                        sitemap_url = pending.pop(future)
+                        try:
+                            entries, child_sitemaps = future.result()
+                        except Exception as e:
+                            print(f"Error reading sitemap {sitemap_url}: {e}")
+                            continue
+                        
+                        for url, entry in entries.items():
+                            if len(self.sitemap_entries) >= self.MAX_SITEMAP_URLS:
+                                break
+                            self.sitemap_entries.setdefault(url, entry)
+                        for child_url in child_sitemaps:
+                            submit(child_url)
                     
         except Exception as e:
             print(f"Error discovering URLs from sitemap: {e}")
         
-        return discovered
+        if len(self.sitemap_entries) >= self.MAX_SITEMAP_URLS:
+            print(f"Stopped reading sitemaps at {self.MAX_SITEMAP_URLS} URLs")
+        
+        return set(self.sitemap_entries)
     
-    def _parse_sitemap(self, xml_content):
-        """Parse sitemap XML and extract URLs"""
-        urls = set()
+    def _fetch_sitemap(self, sitemap_url):
+        """Fetch one sitemap (plain or gzipped) and parse it as it streams in"""
+        self.rate_limiter.wait(sitemap_url)
         
-        try:
-            root = ET.fromstring(xml_content)
+        with self.session.get(sitemap_url, timeout=self.timeout, stream=True) as response:
+            if response.status_code != 200:
+                return {}, []
             
-            # Handle sitemap index
-            for sitemap in root.findall('.//{http://www.sitemaps.org/schemas/sitemap/0.9}sitemap'):
-                loc = sitemap.find('{http://www.sitemaps.org/schemas/sitemap/0.9}loc')
-                if loc is not None:
-                    # Recursively fetch sitemap
-                    try:
-                        response = self.session.get(loc.text, timeout=self.timeout)
-                        if response.status_code == 200:
-                            urls.update(self._parse_sitemap(response.content))
-                    except:
-                        continue
+            # Undo any Content-Encoding, then detect .xml.gz bodies by their magic bytes
+            response.raw.decode_content = True
+            response.raw.auto_close = False
+            stream = io.BufferedReader(response.raw, SITEMAP_CHUNK_SIZE)
+            if stream.peek(2)[:2] == GZIP_MAGIC:
+                stream = gzip.GzipFile(fileobj=stream)
             
-            # Handle URL entries
-            for url in root.findall('.//{http://www.sitemaps.org/schemas/sitemap/0.9}url'):
-                loc = url.find('{http://www.sitemaps.org/schemas/sitemap/0.9}loc')
-                if loc is not None:
-                    urls.add(loc.text)
+            return self._parse_sitemap(stream)
+    
+    def _parse_sitemap(self, stream):
+        """
+        Incrementally parse a sitemap or sitemap index from a file-like object
+        
+        Returns:
+            (entries, child_sitemaps) where entries maps each URL to its
+            lastmod/priority/changefreq
+        """
+        entries = {}
+        child_sitemaps = []
+        parser = ET.XMLPullParser(events=('start', 'end'))
+        root = None
+        chunk = b''
+        overlap = b''
+        
+        try:
+            while True:
+                overlap = chunk[-LOC_OVERLAP:]
+                chunk = stream.read(SITEMAP_CHUNK_SIZE)
+                if not chunk:
+                    break
+                
+                parser.feed(chunk)
+                for event, elem in parser.read_events():
+                    if event == 'start':
+                        if root is None:
+                            root = elem
+                        continue
+                    
+                    tag = _local_name(elem.tag)
+                    if tag not in ('url', 'sitemap'):
+                        continue
+                    
+                    fields = {_local_name(child.tag): (child.text or '').strip() for child in elem}
+                    loc = fields.get('loc')
+                    if loc:
+                        if tag == 'sitemap':
+                            child_sitemaps.append(loc)
+                        else:
+                            entries[loc] = _sitemap_entry(fields)
                     
+                    # Drop finished elements so memory stays flat on 50k-URL sitemaps
+                    root.clear()
+            
+            parser.close()
+            
         except ET.ParseError:
-            # Try to extract URLs with regex if XML parsing fails
-            url_pattern = r'<loc>(.*?)</loc>'
-            matches = re.findall(url_pattern, xml_content.decode('utf-8', errors='ignore'))
-            urls.update(matches)
+            # Try to extract URLs with regex if XML parsing fails, carrying on
+            # from the chunk that broke the parser. The end of the chunk before
+            # it is rescanned too: a <url> the parser had not finished may have
+            # started there. Entries already parsed in full are kept as they are,
+            # and a child sitemap found twice is only fetched once.
+            is_index = root is not None and _local_name(root.tag) == 'sitemapindex'
+            for loc in _scan_locs(overlap + chunk, stream):
+                if is_index:
+                    child_sitemaps.append(loc)
+                else:
+                    entries.setdefault(loc, _sitemap_entry({}))
         except Exception as e:
             print(f"Error parsing sitemap: {e}")
         
-        return urls
+        return entries, child_sitemaps
     
-    def discover_urls_from_page(self, url):
-        """Discover URLs by crawling a page and extracting links"""
-        discovered = set()
+    def fetch_page(self, url, wait=True):
+        """
+        Fetch and parse a page once for both link discovery and analysis
+        
+        Returns a dict with the parsed soup, same-domain links, links to
+        other sites, load time and robots.txt status. When the page cannot be used, 'error' explains why
+        and 'links' is empty. Pass wait=False when the caller has already
+        waited on the rate limiter for this request.
+        
+        In incremental mode (previous_pages set), a page whose sitemap
+        lastmod, ETag/Last-Modified or content hash matches the previous
+        crawl comes back with 'unchanged' set.
+
+        Once the page has been requested (not served from the HTTP cache), 'fetched' holds the outcome in
+        LinkChecker.check_url's form: {'status', 'redirects'}, with the final
+        status and every redirect followed to it. It has no soup, and its links
+        are the ones recorded last time if it was not downloaded.
+        
+        With a parse_pool the page is parsed in a worker process and comes
+        back without a soup; page_analyzer's result is in 'analysis'. Pages
+        over streaming_threshold bytes never get a soup either: their SEO
+        fields are in 'seo_fields' (see stream_page_fields).
+        """
+        page = {
+            'url': url,
+            'status_code': None,
+            'fetched': None,
+            'soup': None,
+            'links': set(),
+            'outbound_links': set(),
+            'load_time': None,
+            'robots_status': None,
+            'error': None,
+            'unchanged': False,
+            'etag': None,
+            'last_modified': None,
+            'content_hash': None,
+            'sitemap_lastmod': (self.sitemap_entries.get(url) or {}).get('lastmod')
+        }
+        previous = self.previous_pages.get(url)
         
         try:
-            robots_allowed, _ = self.check_robots_txt(url)
+            robots_allowed, robots_message = self.check_robots_txt(url)
+            page['robots_status'] = robots_message
             if not robots_allowed:
-                return discovered
+                page['error'] = f"Access denied by robots.txt: {robots_message}"
+                return page
+            
+            if self.sitemap_unchanged(url):
+                return self._unchanged_page(page, previous)
+            
+            if wait and self._needs_rate_limit(url):
+                self.rate_limiter.wait(url)
             
-            response = self.session.get(url, timeout=self.timeout)
+            # Revalidate pages from the previous crawl whose links we still have
+            headers = {}
+            if previous and previous.get('links') is not None:
+                if previous.get('etag'):
+                    headers['If-None-Match'] = previous['etag']
+                if previous.get('last_modified'):
+                    headers['If-Modified-Since'] = previous['last_modified']
+            
+            start_time = time.time()
+            response = self.session.get(url, timeout=self.timeout, headers=headers, stream=True)
+            page['load_time'] = time.time() - start_time
+            page['status_code'] = response.status_code
+            if not getattr(response, 'from_cache', False):
+                hops = response.history + [response]
+                page['fetched'] = {
+                    'status': response.status_code,
+                    'redirects': [{'status': hop.status_code, 'location': next_hop.url}
+                                  for hop, next_hop in zip(hops, hops[1:])]
+                }
+            page['etag'] = response.headers.get('ETag')
+            page['last_modified'] = response.headers.get('Last-Modified')
+            
+            # Only a 200 body is read; closing the others returns the connection to the pool
             if response.status_code != 200:
-                return discovered
+                response.close()
             
-            soup = BeautifulSoup(response.content, 'html.parser')
+            if response.status_code == 304 and headers:
+                page['etag'] = page['etag'] or previous.get('etag')
+                page['last_modified'] = page['last_modified'] or previous.get('last_modified')
+                return self._unchanged_page(page, previous)
             
-            # Extract all links
-            for link in soup.find_all('a', href=True):
-                href = link['href']
-                normalized_url = self.normalize_url(href, url)
-                
-                if normalized_url and self.is_same_domain(normalized_url, url):
-                    discovered.add(normalized_url)
+            if response.status_code != 200:
+                page['error'] = f"HTTP {response.status_code}: {response.reason}"
+                return page
+            
+            try:
+                body = read_html(response, self.max_response_bytes, self.download_stats)
+            except ResponseRejected as e:
+                print(f"Skipping {url}: {e}")
+                page['error'] = f"Skipped: {e}"
+                return page
+            page['load_time'] = time.time() - start_time
+            if getattr(response, 'from_cache', False):
+                page['load_time'] = response.elapsed.total_seconds()  # time of the original download
+            
+            page['content_hash'] = hashlib.sha256(body).hexdigest()
+            if previous and page['content_hash'] == previous.get('content_hash'):
+                page['unchanged'] = True
+            
+            if self.parse_pool:
+                # Waiting releases the GIL, so the other fetch threads keep downloading
+                page.update(self.parse_pool.submit(parse_page, body, dict(page), self.skip_duplicate_links,
+                                                   self.page_analyzer, self.streaming_threshold,
+                                                   self.term_counter).result())
+            elif self.streaming_threshold and len(body) > self.streaming_threshold:
+                page.update(stream_page_fields(body, page, self.skip_duplicate_links, self.page_analyzer,
+                                               self.term_counter))
+            else:
+                page['soup'] = parse_html(body)
+                page.update(page_fields(page['soup'], page, self.skip_duplicate_links, self.page_analyzer))
             
         except Exception as e:
             print(f"Error discovering URLs from {url}: {e}")
+            page['error'] = str(e)
+        
+        return page
+    
+    @staticmethod
+    def extract_links(soup, url, outbound_links=None):
+        """
+        Normalized same-domain URLs linked from a parsed page
+        
+        http(s) links to other sites are added to outbound_links, if given.
+        """
+        return SiteCrawler.links_from_hrefs((link['href'] for link in soup.find_all('a', href=True)),
+                                            url, outbound_links)
+    
+    @staticmethod
+    def links_from_hrefs(hrefs, url, outbound_links=None):
+        """extract_links for the href values of a page's <a> elements"""
+        links = set()
+        for href in hrefs:
+            normalized_url = SiteCrawler.normalize_url(href, url)
+            if not normalized_url:
+                continue
+            
+            if SiteCrawler.is_same_domain(normalized_url, url):
+                links.add(normalized_url)
+            elif outbound_links is not None and normalized_url.startswith(('http://', 'https://')):
+                outbound_links.add(normalized_url)
+        return links
+    
+    def _unchanged_page(self, page, previous):
+        """Fill in a page carried forward from the previous crawl without downloading it"""
+        page['unchanged'] = True
+        page['status_code'] = page['status_code'] or 200
+        page['links'] = set(previous['links'])
+        page['outbound_links'] = set(previous.get('outbound_links') or [])
+        page['load_time'] = previous.get('load_time')
+        page['etag'] = page['etag'] or previous.get('etag')
+        page['last_modified'] = page['last_modified'] or previous.get('last_modified')
+        page['content_hash'] = previous.get('content_hash')
+        page['simhash'] = previous.get('simhash')
+        return page
+    
+    def discover_urls_from_page(self, url):
+        """Discover URLs by crawling a page and extracting links"""
+        return self.fetch_page(url)['links']
+    
+    def _process_page(self, page):
+        """
+        Record a fetched page, hand it to the page callback and return its links
+        
+        With skip_duplicate_links, a page whose content is a near-duplicate
+        of a page crawled earlier gets 'duplicate_of' set and its links are
+        not followed.
+        """
+        url = page['url']
+        new_urls = page['links']
+        
+        if self.skip_duplicate_links and page.get('simhash'):
+            with self._lock:
+                duplicates = self.duplicate_index.add(url, page['simhash'])
+                if duplicates:
+                    self.duplicate_pages += 1
+            if duplicates:
+                page['duplicate_of'] = duplicates[0]
+                new_urls = set()
         
-        return discovered
+        if self.page_callback:
+            try:
+                self.page_callback(page)
+            except Exception as e:
+                print(f"Error processing page {url}: {e}")
+        
+        if self._page_queue is not None:
+            # Blocks while the consumer is behind, which holds the crawl back
+            self._page_queue.put(('page', page))
+        
+        with self._lock:
+            if self.trap_detector:
+                new_urls = {new_url for new_url in new_urls if self._admit(new_url)}
+            self._add_discovered(new_urls)
+            self.crawled_urls.add(url)
+            self.crawled_order.append(url)
+            self._in_flight.pop(url, None)
+            self.frontier.remove(url)
+            crawled, discovered = len(self.crawled_order), len(self.discovered_urls)
+        
+        # Progress callback
+        if self.progress_callback:
+            self.progress_callback(crawled, discovered)
+        
+        if self._checkpoint:
+            self._pages_since_checkpoint += 1
+            if self._pages_since_checkpoint >= self._checkpoint.interval:
+                self._checkpoint.save(self.get_state())
+                self._pages_since_checkpoint = 0
+        
+        return new_urls
     
-    def crawl_site(self, base_url, max_urls=100, max_depth=3):
+    def crawl_site(self, base_url, max_urls=100, max_depth=3, checkpoint=None, previous_pages=None):
         """
         Crawl an entire site and return discovered URLs
         
@@ -198,64 +694,364 @@ class SiteCrawler:
             base_url: Starting URL
             max_urls: Maximum number of URLs to crawl
             max_depth: Maximum crawl depth
+            checkpoint: Optional CrawlCheckpoint. Crawl state is saved to it
+                as pages are fetched, and if it already holds state the crawl
+                resumes from there instead of starting over.
+            previous_pages: Optional url -> result row of the previous crawl
+                of this site, for an incremental crawl (see fetch_page)
         
         Returns:
             List of discovered URLs
         """
         print(f"Starting site crawl for: {base_url}")
         
+        self.previous_pages = previous_pages or {}
+        self.duplicate_index = NearDuplicateIndex()
+        self.duplicate_pages = 0
+        self.trap_detector = TrapDetector() if self.detect_traps else None
+        self._penalties = {}
+        self.download_stats.reset()
+        
         # Normalize base URL
         base_url = self.normalize_url(base_url, base_url)
         
-        # Initialize
-        self.discovered_urls = set()
-        self.crawled_urls = set()
+        self._max_urls = max_urls
         
-        # Discover URLs from sitemap first
-        print("Discovering URLs from sitemap...")
-        sitemap_urls = self.discover_urls_from_sitemap(base_url)
-        self.discovered_urls.update(sitemap_urls)
-        print(f"Found {len(sitemap_urls)} URLs in sitemap")
+        state = checkpoint.load() if checkpoint else None
+        if state:
+            self.restore_state(state)
+            print(f"Resuming crawl: {len(self.crawled_order)} pages already crawled, "
+                  f"{len(self.frontier)} URLs left in the frontier")
+        else:
+            # Initialize
+            self.discovered_urls = self._new_url_set()
+            self.crawled_urls = self._new_url_set()
+            self.crawled_order = []
+            self.discovered_order = []
+            self._in_flight = {}
+            self._scores = {}
+            
+            # Discover URLs from sitemap first
+            print("Discovering URLs from sitemap...")
+            sitemap_urls = self.discover_urls_from_sitemap(base_url)
+            print(f"Found {len(sitemap_urls)} URLs in sitemap")
+            
+            # Start from the base URL; same-site sitemap URLs count as one
+            # click away and are crawled in order of their sitemap priority
+            self._add_discovered([base_url])
+            self._add_discovered(sorted(sitemap_urls))
+            # Only same-site entries are ever queued, fetched or reported as orphans
+            self.sitemap_entries = {url: entry for url, entry in self.sitemap_entries.items()
+                                    if self.is_same_domain(url, base_url)}
+            self.frontier = CrawlFrontier(self.sitemap_entries)
+            self.frontier.push(base_url, 0)
+            if max_depth > 1:
+                for url in sitemap_urls:
+                    if url != base_url and self.is_same_domain(url, base_url):
+                        self.frontier.push(url, 1)
+        
+        self._checkpoint = checkpoint
+        self._pages_since_checkpoint = 0
+        
+        try:
+            if self.engine == 'async':
+                asyncio.run(self._crawl_async(max_urls, max_depth))
+            elif self.engine == 'threaded':
+                self._crawl_threaded(max_urls, max_depth)
+            else:
+                self._crawl_sequential(max_urls, max_depth)
+        finally:
+            if checkpoint:
+                checkpoint.save(self.get_state())
+            self._checkpoint = None
+            self._stop_requested.clear()
+        
+        final_urls = self._ranked_urls(max_urls)
+        print(f"Crawl completed. Discovered {len(self.discovered_urls)} URLs, returning {len(final_urls)}")
+        if self.duplicate_pages:
+            print(f"Did not follow links from {self.duplicate_pages} near-duplicate pages")
+        if self.trap_detector and self.trap_detector.blocked_count:
+            print(f"Dropped {self.trap_detector.blocked_count} URLs from crawler traps")
+        downloads = self.download_stats
+        print(f"Downloaded {downloads.bytes_downloaded} bytes, skipped {downloads.responses_skipped} "
+              f"non-HTML or oversized responses ({downloads.bytes_skipped} bytes)")
+        
+        return final_urls
+    
+    def iter_crawl(self, base_url, max_urls=100, max_depth=3, checkpoint=None, previous_pages=None,
+                   buffer_size=None):
+        """
+        Crawl like crawl_site, yielding each page (see fetch_page) as soon as it is fetched
         
-        # Add base URL to start crawling
-        self.discovered_urls.add(base_url)
+        The crawl runs in a background thread while the caller consumes
+        pages, so analysis and storage overlap with fetching. At most
+        buffer_size pages (default 2 * max_workers) wait to be consumed;
+        beyond that the crawl pauses. Closing the generator early stops the
+        crawl from starting new fetches. Exceptions raised by the crawl are
+        re-raised here.
         
-        # Crawl URLs level by level
-        current_level = {base_url}
+        Returns:
+            (as the generator's return value) the URLs crawl_site would return
+        """
+        pages = queue.Queue(maxsize=buffer_size or 2 * self.max_workers)
+        result = {}
+        
+        def run():
+            try:
+                result['urls'] = self.crawl_site(base_url, max_urls, max_depth, checkpoint=checkpoint,
+                                                 previous_pages=previous_pages)
+                pages.put(('done', None))
+            except BaseException as e:
+                pages.put(('error', e))
+        
+        self._page_queue = pages
+        thread = threading.Thread(target=run, name='iter-crawl', daemon=True)
+        thread.start()
+        finished = False
+        try:
+            while True:
+                kind, value = pages.get()
+                if kind == 'page':
+                    yield value
+                    continue
+                finished = True
+                if kind == 'error':
+                    raise value
+                return result['urls']
+        finally:
+            if not finished:
+                # Stop claiming URLs and let the fetches in flight drain out of the queue
+                self.stop()
+                while pages.get()[0] == 'page':
+                    pass
+            thread.join()
+            self._page_queue = None
+    
+    def stop(self):
+        """Ask a running crawl to finish the fetches in flight and start no new ones"""
+        self._stop_requested.set()
+    
+    def _ranked_urls(self, max_urls):
+        """
+        The URLs a crawl returns: fetched pages first, then the best of the
+        URLs still waiting, then other discovered URLs in discovery order.
+        Pages are ranked by frontier score with ties broken by URL, so the
+        slice does not depend on the order concurrent fetches finished in.
+        """
+        with self._lock:
+            ranked = sorted(self.crawled_order, key=lambda url: (-self._scores.get(url, 0), url))
+            ranked.extend(self.frontier.ranked(max_urls))
+            ranked.extend(self.discovered_order)
         
-        for depth in range(max_depth):
-            if len(self.crawled_urls) >= max_urls:
+        final_urls = []
+        seen = set()
+        for url in ranked:
+            if len(final_urls) >= max_urls:
+                break
+            if url not in seen:
+                seen.add(url)
+                final_urls.append(url)
+        
+        return final_urls
+    
+    def get_state(self):
+        """Return the crawl's frontier and visited sets as JSON-serializable data"""
+        with self._lock:
+            return {
+                # Pages that were being fetched go back into the frontier
+                'frontier': ([[url, depth, inlinks, penalty] for url, depth, inlinks, penalty in self.frontier.items()]
+                             + [[url, depth, inlinks, 0] for url, (depth, inlinks) in self._in_flight.items()]),
+                'crawled_urls': list(self.crawled_order),
+                'crawled_scores': dict(self._scores),
+                'discovered_urls': url_set_to_state(self.discovered_urls),
+                'discovered_order': list(self.discovered_order),
+                'sitemap_entries': dict(self.sitemap_entries),
+                'traps': self.trap_detector.to_state() if self.trap_detector else None,
+                'downloads': self.download_stats.to_dict()
+            }
+    
+    def restore_state(self, state):
+        """Restore crawl state saved by get_state"""
+        with self._lock:
+            self.sitemap_entries = dict(state.get('sitemap_entries', {}))
+            self.frontier = CrawlFrontier(self.sitemap_entries)
+            # Older checkpoints store [url, depth] or [url, depth, inlinks]
+            for url, depth, *extra in state.get('frontier', []):
+                self.frontier.push(url, depth, *extra)
+            if self.trap_detector and state.get('traps'):
+                self.trap_detector.restore_state(state['traps'])
+            self.download_stats.restore(state.get('downloads', {}))
+            self._in_flight = {}
+            self._scores = dict(state.get('crawled_scores', {}))
+            self.crawled_order = list(state.get('crawled_urls', []))
+            self.crawled_urls = self._new_url_set()
+            self.crawled_urls.update(self.crawled_order)
+            discovered = state.get('discovered_urls', [])
+            self.discovered_urls = url_set_from_state(discovered)
+            # Checkpoints written before discovered_order existed stored a plain list
+            self.discovered_order = list(state.get('discovered_order', discovered if isinstance(discovered, list) else []))
+    
+    def _schedule(self, urls, depth, max_depth):
+        """
+        Queue the links found on a page crawled at depth - 1
+
+        Links to URLs already in the frontier raise their in-link count and
+        can move them to a shallower depth. New URLs are only queued while
+        depth < max_depth.
+
+        Returns:
+            The URLs that were newly queued
+        """
+        scheduled = []
+        
+        with self._lock:
+            for url in urls:
+                # Taken whether or not the URL is queued, so penalties of URLs past max_depth do not pile up
+                penalty = self._penalties.pop(url, 0)
+                if url in self.crawled_urls or url in self._in_flight:
+                    continue
+                if url in self.frontier:
+                    self.frontier.add_inlink(url)
+                    if depth < max_depth:
+                        self.frontier.push(url, depth)
+                elif depth < max_depth:
+                    self.frontier.push(url, depth, inlinks=1, penalty=penalty)
+                    scheduled.append(url)
+        
+        return scheduled
+    
+    def _claim(self):
+        """
+        Take the highest-scoring URL off the frontier for fetching
+
+        Returns:
+            (url, depth), or None once the frontier is empty or stop() was called
+        """
+        if self._stop_requested.is_set():
+            return None
+        
+        with self._lock:
+            while True:
+                item = self.frontier.pop()
+                if item is None:
+                    return None
+                
+                url, depth, inlinks, score = item
+                if url not in self.crawled_urls:
+                    self._in_flight[url] = (depth, inlinks)
+                    self._scores[url] = score
+                    return url, depth
+    
+    def _crawl_sequential(self, max_urls, max_depth):
+        """Crawl one URL at a time, always fetching the highest-scoring URL next"""
+        while len(self.crawled_order) < max_urls:
+            item = self._claim()
+            if item is None:
                 break
             
-            print(f"Crawling depth {depth + 1}, {len(current_level)} URLs to process")
-            next_level = set()
-            
-            # Process current level URLs
-            for url in current_level:
-                if len(self.crawled_urls) >= max_urls:
+            url, depth = item
+            new_urls = self._process_page(self.fetch_page(url))
+            self._schedule(new_urls, depth + 1, max_depth)
+    
+    def _crawl_threaded(self, max_urls, max_depth):
+        """
+        Crawl with up to max_workers fetches running in worker threads.
+        
+        Whenever the oldest fetch finishes, the best-scoring URL left in the
+        frontier takes its place. Every fetch passes through a HostGate, so at
+        most per_host_limit requests run against one host, and then waits for
+        the host's rate limit in its own worker thread.
+        
+        Pages are processed in the order they were claimed, not the order
+        their fetches finished in, so the frontier every claim sees, and so
+        the pages crawled, do not depend on response timing.
+        """
+        print(f"Crawling with threaded engine ({self.max_workers} workers, {self.per_host_limit} per host)")
+        
+        gate = HostGate(self.per_host_limit)
+        claimed = len(self.crawled_order)
+        pending = deque()  # (future, (url, depth)) in claim order
+        
+        def fetch(url):
+            with gate.slot(urlparse(url).netloc):
+                return self.fetch_page(url)
+        
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while True:
+                # Claim a slot in the budget before fetching so in-flight
+                # requests never push the crawl past max_urls
+                while len(pending) < self.max_workers and claimed < max_urls:
+                    item = self._claim()
+                    if item is None:
+                        break
+                    claimed += 1
+                    pending.append((executor.submit(fetch, item[0]), item))
+                
+                if not pending:
                     break
                 
-                if url in self.crawled_urls:
+                # Later fetches that finish first wait here until their turn
+                future, (url, depth) = pending.popleft()
+                try:
+                    new_urls = self._process_page(future.result())
+                except Exception as e:
+                    print(f"Error crawling {url}: {e}")
                     continue
                 
-                # Discover new URLs from this page
-                new_urls = self.discover_urls_from_page(url)
-                self.discovered_urls.update(new_urls)
-                next_level.update(new_urls - self.crawled_urls)
+                self._schedule(new_urls, depth + 1, max_depth)
+    
+    async def _crawl_async(self, max_urls, max_depth):
+        """
+        Crawl with many requests in flight at once.
+        
+        Blocking fetches run on a pool of max_workers threads driven from
+        the event loop; as soon as the oldest one finishes, the best-scoring
+        URL left in the frontier is started. A semaphore per host caps how many
+        requests hit one origin at a time, and rate-limit waits are awaited
+        on the event loop so a throttled host does not hold up the others.
+        URLs are never crawled deeper than max_depth. As in _crawl_threaded,
+        pages are processed in claim order so the crawl does not depend on
+        response timing.
+        """
+        print(f"Crawling with async engine ({self.max_workers} workers, {self.per_host_limit} per host)")
+        
+        loop = asyncio.get_running_loop()
+        host_limits = {}
+        claimed = len(self.crawled_order)
+        pending = deque()  # (task, (url, depth)) in claim order
+        
+        async def fetch(url):
+            host = urlparse(url).netloc
+            if host not in host_limits:
+                host_limits[host] = asyncio.Semaphore(self.per_host_limit)
+            
+            async with host_limits[host]:
+                if self._needs_rate_limit(url):
+                    await self.rate_limiter.wait_async(url)
+                return await loop.run_in_executor(executor, self.fetch_page, url, False)
+        
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while True:
+                # Claim a slot in the budget before fetching so in-flight
+                # requests never push the crawl past max_urls
+                while len(pending) < self.max_workers and claimed < max_urls:
+                    item = self._claim()
+                    if item is None:
+                        break
+                    claimed += 1
+                    pending.append((asyncio.create_task(fetch(item[0])), item))
                 
-                self.crawled_urls.add(url)
+                if not pending:
+                    break
                 
-                # Progress callback
-                if self.progress_callback:
-                    self.progress_callback(len(self.crawled_urls), len(self.discovered_urls))
+                # Later fetches that finish first wait here until their turn
+                task, (url, depth) = pending.popleft()
+                try:
+                    # Off the event loop: handing the page to a slow iter_crawl consumer
+                    # and writing checkpoints block, and the other fetches must go on
+                    new_urls = await loop.run_in_executor(None, self._process_page, await task)
+                except Exception as e:
+                    print(f"Error crawling {url}: {e}")
+                    continue
                 
-                # Be respectful - add delay
-                time.sleep(0.5)
-            
-            current_level = next_level
-        
-        # Return final list of discovered URLs (limited by max_urls)
-        final_urls = list(self.discovered_urls)[:max_urls]
-        print(f"Crawl completed. Discovered {len(self.discovered_urls)} URLs, returning {len(final_urls)}")
-        
-        return final_urls
+                self._schedule(new_urls, depth + 1, max_depth)
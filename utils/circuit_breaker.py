@@ -0,0 +1,173 @@
+"""
+Circuit Breaker
+Per-host circuit breaker that stops sending requests to origins that keep failing
+"""
+
+import threading
+import time
+from urllib.parse import urlparse
+
+from requests.adapters import HTTPAdapter
+from requests.exceptions import ConnectionError
+
+from config import Config
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half-open'
+
+
+class HostUnavailable(ConnectionError):
+    """Raised instead of sending a request to a host whose circuit is open"""
+
+
+class HostCircuitBreaker:
+    """
+    Circuit per host: closed, open or half-open
+
+    A host's circuit opens after `failure_threshold` consecutive failures
+    (connection errors, timeouts or 5xx responses). While it is open,
+    requests to the host fail at once with HostUnavailable. After
+    `cooldown` seconds the circuit half-opens and lets a single probe
+    request through: success closes it, failure opens it for another
+    cool-down.
+    """
+
+    def __init__(self, failure_threshold=None, cooldown=None):
+        self.failure_threshold = failure_threshold or Config.CIRCUIT_BREAKER_FAILURES
+        self.cooldown = cooldown if cooldown is not None else Config.CIRCUIT_BREAKER_COOLDOWN
+        self._lock = threading.Lock()
+        self._hosts = {}  # host -> {state, failures, opened_at, probing, short_circuited}
+
+    @staticmethod
+    def _host(url_or_host):
+        if '://' in url_or_host:
+            return urlparse(url_or_host).netloc
+        return url_or_host
+
+    def _circuit(self, host):
+        circuit = self._hosts.get(host)
+        if circuit is None:
+            circuit = self._hosts[host] = {
+                'state': CLOSED, 'failures': 0, 'opened_at': None, 'probing': False, 'short_circuited': 0
+            }
+        return circuit
+
+    def is_open(self, url_or_host):
+        """Whether requests to the host would be refused right now (does not start a probe)"""
+        with self._lock:
+            circuit = self._hosts.get(self._host(url_or_host))
+            if circuit is None or circuit['state'] == CLOSED:
+                return False
+            if circuit['state'] == HALF_OPEN:
+                return circuit['probing']
+            return time.monotonic() - circuit['opened_at'] < self.cooldown
+
+    def before_request(self, url_or_host):
+        """
+        Claim permission to send a request to the host
+
+        Raises:
+            HostUnavailable: The host's circuit is open, or half-open with a
+                probe already in flight
+        """
+        host = self._host(url_or_host)
+        with self._lock:
+            circuit = self._circuit(host)
+            if circuit['state'] == OPEN and time.monotonic() - circuit['opened_at'] >= self.cooldown:
+                circuit['state'] = HALF_OPEN
+                circuit['probing'] = False
+
+            if circuit['state'] == CLOSED:
+                return
+            if circuit['state'] == HALF_OPEN and not circuit['probing']:
+                circuit['probing'] = True
+                return
+
+            circuit['short_circuited'] += 1
+            if circuit['state'] == HALF_OPEN:
+                status = "circuit half-open, probe request in flight"
+            else:
+                status = f"circuit open, next attempt in {self.cooldown - (time.monotonic() - circuit['opened_at']):.0f}s"
+            message = f"{host} is unavailable after {circuit['failures']} consecutive failures ({status})"
+        raise HostUnavailable(message)
+
+    def record_success(self, url_or_host):
+        with self._lock:
+            circuit = self._circuit(self._host(url_or_host))
+            if circuit['state'] != CLOSED:
+                print(f"Circuit for {self._host(url_or_host)} closed")
+            circuit.update(state=CLOSED, failures=0, opened_at=None, probing=False)
+
+    def record_failure(self, url_or_host):
+        host = self._host(url_or_host)
+        with self._lock:
+            circuit = self._circuit(host)
+            circuit['failures'] += 1
+            if circuit['state'] == HALF_OPEN or circuit['failures'] >= self.failure_threshold:
+                if circuit['state'] == CLOSED:
+                    print(f"Circuit for {host} opened after {circuit['failures']} consecutive failures")
+                circuit.update(state=OPEN, opened_at=time.monotonic(), probing=False)
+
+    def stats(self):
+        """State of every host that has failed at least once"""
+        with self._lock:
+            return {
+                host: {
+                    'state': circuit['state'],
+                    'consecutive_failures': circuit['failures'],
+                    'short_circuited': circuit['short_circuited']
+                }
+                for host, circuit in self._hosts.items()
+                if circuit['failures'] or circuit['short_circuited']
+            }
+
+    def reset(self):
+        with self._lock:
+            self._hosts.clear()
+
+
+class CircuitBreakerAdapter(HTTPAdapter):
+    """
+    Transport adapter that sends requests through a HostCircuitBreaker
+
+    Retries happen inside send(), so a request that fails after all its
+    retries counts as one failure.
+    """
+
+    def __init__(self, breaker=None, **kwargs):
+        self.breaker = breaker
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        if not self.breaker:
+            return super().send(request, **kwargs)
+
+        self.breaker.before_request(request.url)
+        try:
+            response = super().send(request, **kwargs)
+        except Exception:
+            # Also releases a half-open probe that failed in an unexpected way
+            self.breaker.record_failure(request.url)
+            raise
+
+        if response.status_code >= 500:
+            self.breaker.record_failure(request.url)
+        else:
+            self.breaker.record_success(request.url)
+        return response
+
+
+_shared_breaker = None
+_shared_lock = threading.Lock()
+
+
+def get_circuit_breaker():
+    """Return the process-wide circuit breaker, or None if CIRCUIT_BREAKER_ENABLED is off"""
+    global _shared_breaker
+    if not Config.CIRCUIT_BREAKER_ENABLED:
+        return None
+    with _shared_lock:
+        if _shared_breaker is None:
+            _shared_breaker = HostCircuitBreaker()
+        return _shared_breaker
@@ -0,0 +1,196 @@
+"""
+DNS Cache
+In-process cache of host name lookups for the scrapers' HTTP connections
+"""
+
+import ipaddress
+import socket
+import threading
+import time
+
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+
+try:
+    from urllib3.exceptions import NameResolutionError
+except ImportError:  # urllib3 < 2
+    NameResolutionError = None
+
+from config import Config
+
+# getaddrinfo errors that mean the name does not exist, rather than that the lookup failed
+NEGATIVE_ERRORS = tuple(getattr(socket, name) for name in ('EAI_NONAME', 'EAI_NODATA') if hasattr(socket, name))
+
+
+def system_resolver(host, port):
+    """
+    Resolve host with the system resolver (getaddrinfo)
+
+    Returns:
+        (addresses, ttl) - getaddrinfo does not report record TTLs, so ttl is None
+    """
+    addresses = []
+    for _, _, _, _, sockaddr in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM):
+        if sockaddr[0] not in addresses:
+            addresses.append(sockaddr[0])
+    return addresses, None
+
+
+def _is_ip(host):
+    try:
+        ipaddress.ip_address(host.strip('[]'))
+        return True
+    except ValueError:
+        return False
+
+
+class DnsCache:
+    """
+    Host name -> addresses cache with per-entry expiry
+
+    Lookups go through `resolver(host, port)`, which returns
+    (addresses, ttl) and raises socket.gaierror on failure. An entry lives
+    for the TTL the resolver reports (capped at `ttl`), or `ttl` seconds if
+    it reports none. Names that do not exist are cached for `negative_ttl`
+    seconds; other lookup errors (e.g. a timed out resolver) are not cached.
+    """
+
+    def __init__(self, resolver=None, ttl=None, negative_ttl=None, max_entries=10000):
+        self.resolver = resolver or system_resolver
+        self.ttl = ttl if ttl is not None else Config.DNS_CACHE_TTL
+        self.negative_ttl = negative_ttl if negative_ttl is not None else Config.DNS_CACHE_NEGATIVE_TTL
+        self.max_entries = max_entries
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._entries = {}  # (host, port) -> (expires_at, addresses or gaierror)
+        self._pool_classes = None
+
+    def resolve(self, host, port=80):
+        """
+        Addresses for host, from the cache while its entry is fresh
+
+        Raises:
+            socket.gaierror: The lookup failed (or failed recently, for names
+                that do not exist)
+        """
+        if _is_ip(host):
+            return [host.strip('[]')]
+
+        key = (host.lower(), port)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry and entry[0] > now:
+                if isinstance(entry[1], socket.gaierror):
+                    self.negative_hits += 1
+                    raise entry[1]
+                self.hits += 1
+                return list(entry[1])
+            self.misses += 1
+
+        try:
+            addresses, ttl = self.resolver(host, port)
+        except socket.gaierror as e:
+            if e.args and e.args[0] in NEGATIVE_ERRORS:
+                self._store(key, now + self.negative_ttl, e)
+            raise
+
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        self._store(key, now + ttl, list(addresses))
+        return list(addresses)
+
+    def _store(self, key, expires_at, value):
+        with self._lock:
+            if key not in self._entries and len(self._entries) >= self.max_entries:
+                now = time.monotonic()
+                for stale in [k for k, (expiry, _) in self._entries.items() if expiry <= now]:
+                    del self._entries[stale]
+                if len(self._entries) >= self.max_entries:
+                    # Oldest insertion first
+                    del self._entries[next(iter(self._entries))]
+            self._entries[key] = (expires_at, value)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        lookups = self.hits + self.negative_hits + self.misses
+        return {
+            'hits': self.hits,
+            'negative_hits': self.negative_hits,
+            'misses': self.misses,
+            'hit_ratio': round((self.hits + self.negative_hits) / lookups, 3) if lookups else 0.0,
+            'entries': len(self._entries)
+        }
+
+    def pool_classes(self):
+        """urllib3 connection pool classes whose connections resolve hosts through this cache"""
+        if self._pool_classes is None:
+            http_connection = type('CachedDnsHTTPConnection', (_CachedDnsConnection, HTTPConnection),
+                                   {'dns_cache': self})
+            https_connection = type('CachedDnsHTTPSConnection', (_CachedDnsConnection, HTTPSConnection),
+                                    {'dns_cache': self})
+            self._pool_classes = {
+                'http': type('CachedDnsHTTPConnectionPool', (HTTPConnectionPool,),
+                             {'ConnectionCls': http_connection}),
+                'https': type('CachedDnsHTTPSConnectionPool', (HTTPSConnectionPool,),
+                              {'ConnectionCls': https_connection})
+            }
+        return self._pool_classes
+
+
+class _CachedDnsConnection:
+    """
+    Connection mixin that connects to the cached addresses of its host
+
+    Only the socket's address changes: the Host header, TLS SNI and
+    certificate checks still use the host name.
+    """
+
+    dns_cache = None
+
+    def _new_conn(self):
+        host = self._dns_host
+        try:
+            addresses = self.dns_cache.resolve(host, self.port)
+        except socket.gaierror as e:
+            if NameResolutionError:
+                raise NameResolutionError(self.host, self, e) from e
+            raise NewConnectionError(self, f"Failed to resolve '{self.host}' ({e})") from e
+
+        error = None
+        for address in addresses:
+            self._dns_host = address
+            try:
+                return super()._new_conn()
+            except ConnectTimeoutError as e:  # NewConnectionError included
+                error = e
+            finally:
+                self._dns_host = host
+        raise error or NewConnectionError(self, f"No addresses found for '{self.host}'")
+
+
+def mount_dns_cache(adapter, dns_cache):
+    """Make a requests HTTPAdapter's connections resolve hosts through dns_cache"""
+    if dns_cache:
+        adapter.poolmanager.pool_classes_by_scheme = dns_cache.pool_classes()
+    return adapter
+
+
+_shared_cache = None
+_shared_lock = threading.Lock()
+
+
+def get_dns_cache():
+    """Return the process-wide DNS cache, or None if DNS_CACHE_ENABLED is off"""
+    global _shared_cache
+    if not Config.DNS_CACHE_ENABLED:
+        return None
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = DnsCache()
+        return _shared_cache
@@ -0,0 +1,121 @@
+"""
+Downloads
+Streams response bodies with content-type gating and a size cap, and counts the bytes
+"""
+
+import threading
+
+from config import Config
+
+HTML_CONTENT_TYPES = ('text/html', 'application/xhtml+xml')
+CHUNK_SIZE = 64 * 1024
+
+
+class ResponseRejected(Exception):
+    """A response body was not downloaded (or not finished) because of its type or size"""
+
+
+def is_html(content_type):
+    """Whether a Content-Type header describes an HTML document (a missing header is given the benefit of the doubt)"""
+    mime_type = (content_type or '').split(';', 1)[0].strip().lower()
+    return not mime_type or mime_type in HTML_CONTENT_TYPES
+
+
+def _content_length(response):
+    try:
+        return int(response.headers['Content-Length'])
+    except (KeyError, ValueError):
+        return None
+
+
+class DownloadStats:
+    """Thread-safe tally of body bytes downloaded and skipped"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.bytes_downloaded = 0
+        self.bytes_skipped = 0
+        self.responses_skipped = 0
+
+    def record_download(self, size):
+        with self._lock:
+            self.bytes_downloaded += size
+
+    def record_skip(self, read, declared):
+        """Count a rejected body: `read` bytes were downloaded before giving up on `declared` (None if unknown)"""
+        with self._lock:
+            self.bytes_downloaded += read
+            self.bytes_skipped += max(declared - read, 0) if declared is not None else 0
+            self.responses_skipped += 1
+
+    def to_dict(self):
+        return {
+            'bytes_downloaded': self.bytes_downloaded,
+            'bytes_skipped': self.bytes_skipped,
+            'responses_skipped': self.responses_skipped
+        }
+
+    def restore(self, state):
+        with self._lock:
+            self.bytes_downloaded = state.get('bytes_downloaded', 0)
+            self.bytes_skipped = state.get('bytes_skipped', 0)
+            self.responses_skipped = state.get('responses_skipped', 0)
+
+
+def read_html(response, max_bytes=None, stats=None):
+    """
+    Read the body of a response requested with stream=True
+
+    The Content-Type and Content-Length headers are checked before any of
+    the body is read, and the download is abandoned as soon as it passes
+    max_bytes, so PDFs, videos and oversized pages are never held in memory.
+    A body that is read completely is also set as response.content and, if
+    the response came through the HTTP cache, stored there.
+
+    Args:
+        max_bytes: Largest body accepted (defaults to Config.MAX_RESPONSE_BYTES;
+            0 means no limit)
+        stats: DownloadStats to count the bytes in; responses served from the
+            HTTP cache are not counted as downloads
+
+    Raises:
+        ResponseRejected: The body is not HTML or is larger than max_bytes
+    """
+    max_bytes = Config.MAX_RESPONSE_BYTES if max_bytes is None else max_bytes
+    if getattr(response, 'from_cache', False):
+        stats = None
+
+    declared = _content_length(response)
+    chunks = []
+    size = 0
+    try:
+        content_type = response.headers.get('Content-Type')
+        if not is_html(content_type):
+            raise ResponseRejected(f"content type {content_type.split(';', 1)[0].strip()} is not HTML")
+        if max_bytes and declared is not None and declared > max_bytes:
+            raise ResponseRejected(f"body of {declared} bytes exceeds the {max_bytes} byte limit")
+
+        for chunk in response.iter_content(CHUNK_SIZE):
+            size += len(chunk)
+            if max_bytes and size > max_bytes:
+                raise ResponseRejected(f"body exceeds the {max_bytes} byte limit")
+            chunks.append(chunk)
+    except ResponseRejected:
+        response.close()
+        if stats:
+            stats.record_skip(size, declared)
+        raise
+
+    body = b''.join(chunks)
+    response._content = body
+    response._content_consumed = True
+    if stats:
+        stats.record_download(size)
+
+    store = getattr(response, 'store_in_cache', None)
+    if store:
+        store(body)
+    return body
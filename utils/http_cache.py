@@ -0,0 +1,380 @@
+"""
+HTTP Cache
+Disk-backed HTTP response cache mounted under the scrapers' requests.Session
+"""
+
+import hashlib
+import io
+import json
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from email.utils import parsedate_tz, mktime_tz
+
+from requests import Response
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+from urllib3 import HTTPResponse
+
+from config import Config
+from utils.circuit_breaker import CircuitBreakerAdapter
+
+# Statuses that may be stored without explicit freshness (RFC 9111 4.2.2)
+CACHEABLE_STATUSES = (200, 203, 300, 301, 308, 404, 410)
+
+# Bodies are stored decoded, so these no longer describe them
+DROPPED_HEADERS = ('content-encoding', 'content-length', 'transfer-encoding', 'connection', 'keep-alive')
+
+# Responses with only Last-Modified stay fresh for 10% of their age, up to a day
+HEURISTIC_FRACTION = 0.1
+HEURISTIC_MAX_AGE = 24 * 60 * 60
+
+
+def _cache_control(value):
+    """Parse a Cache-Control header into {directive: argument}"""
+    directives = {}
+    for part in (value or '').split(','):
+        name, _, argument = part.strip().partition('=')
+        if name:
+            directives[name.lower()] = argument.strip().strip('"')
+    return directives
+
+
+def _http_date(value):
+    """Parse an HTTP date into a Unix timestamp, or None"""
+    parsed = parsedate_tz(value) if value else None
+    return mktime_tz(parsed) if parsed else None
+
+
+def freshness_lifetime(headers, now=None):
+    """Seconds a response with these headers stays fresh (0 = revalidate before use)"""
+    now = now or time.time()
+    directives = _cache_control(headers.get('Cache-Control'))
+    if 'no-cache' in directives:
+        return 0
+
+    date = _http_date(headers.get('Date')) or now
+    if 'max-age' in directives:
+        try:
+            lifetime = int(directives['max-age'])
+        except ValueError:
+            lifetime = 0
+    elif 'Expires' in headers:
+        expires = _http_date(headers['Expires'])
+        lifetime = expires - date if expires else 0
+    elif 'Last-Modified' in headers:
+        last_modified = _http_date(headers['Last-Modified'])
+        lifetime = min((date - last_modified) * HEURISTIC_FRACTION, HEURISTIC_MAX_AGE) if last_modified else 0
+    else:
+        lifetime = 0
+
+    try:
+        age = int(headers.get('Age', 0))
+    except ValueError:
+        age = 0
+
+    return max(lifetime - age, 0)
+
+
+class HttpCache:
+    """
+    GET responses stored as files under `directory`, one per URL
+
+    Each file holds a JSON metadata line (status, headers, expiry, Vary'd
+    request headers) followed by the decoded body. Entries are evicted in
+    least-recently-used order once the files exceed `max_bytes`; file mtimes
+    record use, so the order survives restarts.
+    """
+
+    def __init__(self, directory=None, max_bytes=None):
+        self.directory = directory or Config.HTTP_CACHE_DIR
+        self.max_bytes = max_bytes if max_bytes is not None else Config.HTTP_CACHE_MAX_BYTES
+        self.hits = 0
+        self.revalidations = 0
+        self.misses = 0
+        self.stores = 0
+        self.evictions = 0
+        self._lock = threading.Lock()
+        self._index = OrderedDict()  # key -> file size, least recently used first
+        self._size = 0
+        self._load_index()
+
+    def _load_index(self):
+        os.makedirs(self.directory, exist_ok=True)
+        files = []
+        for name in os.listdir(self.directory):
+            if name.endswith('.cache'):
+                stat = os.stat(os.path.join(self.directory, name))
+                files.append((stat.st_mtime, name[:-len('.cache')], stat.st_size))
+
+        for _, key, size in sorted(files):
+            self._index[key] = size
+            self._size += size
+
+    @staticmethod
+    def _key(url):
+        return hashlib.sha256(url.encode('utf-8')).hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, f'{key}.cache')
+
+    def _read(self, key, with_body=True):
+        try:
+            with open(self._path(key), 'rb') as f:
+                entry = json.loads(f.readline())
+                if with_body:
+                    entry['body'] = f.read()
+            return entry
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def _matches(entry, request_headers):
+        """Whether the request sends the same values for every header the response Varies on"""
+        return all(request_headers.get(name) == value for name, value in entry['vary'].items())
+
+    def get(self, url, request_headers=None):
+        """Return the stored entry for url (with its 'body'), or None"""
+        key = self._key(url)
+        with self._lock:
+            if key not in self._index:
+                return None
+
+        entry = self._read(key)
+        if entry is None or not self._matches(entry, request_headers or {}):
+            return None
+
+        with self._lock:
+            if key in self._index:
+                self._index.move_to_end(key)
+        try:
+            os.utime(self._path(key))
+        except OSError:
+            pass
+        return entry
+
+    def is_fresh(self, url, request_headers=None):
+        """Whether a GET of url would be answered from the cache without a request"""
+        key = self._key(url)
+        with self._lock:
+            if key not in self._index:
+                return False
+
+        entry = self._read(key, with_body=False)
+        return bool(entry and entry['expires_at'] > time.time() and self._matches(entry, request_headers or {}))
+
+    def store(self, url, request_headers, response, body, elapsed):
+        """
+        Store a response if HTTP caching rules allow it
+
+        Returns:
+            The stored entry, or None if the response is not cacheable
+        """
+        request_directives = _cache_control(request_headers.get('Cache-Control'))
+        directives = _cache_control(response.headers.get('Cache-Control'))
+        vary = response.headers.get('Vary', '')
+        if ('no-store' in directives or 'no-store' in request_directives
+                or response.status_code not in CACHEABLE_STATUSES or vary.strip() == '*'):
+            return None
+
+        now = time.time()
+        lifetime = freshness_lifetime(response.headers, now)
+        has_validators = 'ETag' in response.headers or 'Last-Modified' in response.headers
+        if lifetime <= 0 and not has_validators:
+            return None
+
+        entry = {
+            'url': url,
+            'status': response.status_code,
+            'reason': response.reason,
+            'headers': {name: value for name, value in response.headers.items()
+                        if name.lower() not in DROPPED_HEADERS},
+            'vary': {name.strip(): request_headers.get(name.strip())
+                     for name in vary.split(',') if name.strip()},
+            'stored_at': now,
+            'expires_at': now + lifetime,
+            'elapsed': elapsed
+        }
+        self._write(self._key(url), entry, body)
+        self.stores += 1
+        entry['body'] = body
+        return entry
+
+    def refresh(self, url, entry, headers):
+        """Update a stored entry from a 304 Not Modified response's headers"""
+        entry = dict(entry)
+        entry['headers'] = dict(entry['headers'])
+        for name, value in headers.items():
+            if name.lower() not in DROPPED_HEADERS:
+                entry['headers'][name] = value
+
+        now = time.time()
+        entry['stored_at'] = now
+        entry['expires_at'] = now + freshness_lifetime(CaseInsensitiveDict(entry['headers']), now)
+
+        body = entry.pop('body')
+        self._write(self._key(url), entry, body)
+        entry['body'] = body
+        return entry
+
+    def _write(self, key, entry, body):
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(json.dumps(entry).encode('utf-8') + b'\n')
+                f.write(body)
+            os.replace(temp_path, self._path(key))
+        except OSError:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+        size = os.path.getsize(self._path(key))
+        with self._lock:
+            self._size += size - self._index.pop(key, 0)
+            self._index[key] = size
+            self._evict()
+
+    def _evict(self):
+        """Drop least recently used entries until the cache fits in max_bytes (holds self._lock)"""
+        while self._size > self.max_bytes and self._index:
+            key, size = self._index.popitem(last=False)
+            self._size -= size
+            self.evictions += 1
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def remove(self, url):
+        key = self._key(url)
+        with self._lock:
+            if key not in self._index:
+                return
+            self._size -= self._index.pop(key)
+        try:
+            os.remove(self._path(key))
+        except OSError:
+            pass
+
+    def clear(self):
+        with self._lock:
+            keys = list(self._index)
+            self._index.clear()
+            self._size = 0
+        for key in keys:
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
+
+    def stats(self):
+        """Hit ratios and size of the cache"""
+        lookups = self.hits + self.revalidations + self.misses
+        return {
+            'hits': self.hits,
+            'revalidations': self.revalidations,
+            'misses': self.misses,
+            'stores': self.stores,
+            'evictions': self.evictions,
+            'hit_ratio': round(self.hits / lookups, 3) if lookups else 0.0,
+            'served_ratio': round((self.hits + self.revalidations) / lookups, 3) if lookups else 0.0,
+            'entries': len(self._index),
+            'size_bytes': self._size,
+            'max_bytes': self.max_bytes
+        }
+
+
+class CachingAdapter(CircuitBreakerAdapter):
+    """
+    Transport adapter that answers GETs from an HttpCache
+
+    Fresh entries are returned without a request. Stale entries with an
+    ETag or Last-Modified are revalidated with If-None-Match /
+    If-Modified-Since, and a 304 is answered with the stored body.
+    Responses served from the cache have `from_cache = True` and the
+    elapsed time of the original download. Streamed responses get a
+    `store_in_cache(body)` method for the caller to hand back the body once
+    it has read all of it. Cache hits are served even while the host's
+    circuit breaker is open.
+    """
+
+    def __init__(self, cache, **kwargs):
+        self.cache = cache
+        super().__init__(**kwargs)
+
+    def send(self, request, stream=False, **kwargs):
+        if request.method != 'GET' or 'no-store' in _cache_control(request.headers.get('Cache-Control')):
+            return super().send(request, stream=stream, **kwargs)
+
+        entry = self.cache.get(request.url, request.headers)
+        if entry is not None:
+            if (entry['expires_at'] > time.time()
+                    and 'no-cache' not in _cache_control(request.headers.get('Cache-Control'))):
+                self.cache.hits += 1
+                return self._cached_response(request, entry)
+
+            headers = CaseInsensitiveDict(entry['headers'])
+            request = request.copy()
+            if 'ETag' in headers:
+                request.headers['If-None-Match'] = headers['ETag']
+            if 'Last-Modified' in headers:
+                request.headers['If-Modified-Since'] = headers['Last-Modified']
+
+        start_time = time.time()
+        response = super().send(request, stream=stream, **kwargs)
+
+        if entry is not None and response.status_code == 304:
+            response.close()
+            self.cache.revalidations += 1
+            return self._cached_response(request, self.cache.refresh(request.url, entry, response.headers))
+
+        self.cache.misses += 1
+        if stream:
+            # Streamed bodies are read by the caller, who may abandon them part way
+            response.store_in_cache = lambda body: self.cache.store(
+                request.url, request.headers, response, body, time.time() - start_time)
+        else:
+            self.cache.store(request.url, request.headers, response, response.content, time.time() - start_time)
+        return response
+
+    def _cached_response(self, request, entry):
+        response = Response()
+        response.status_code = entry['status']
+        response.reason = entry['reason']
+        response.headers = CaseInsensitiveDict(entry['headers'])
+        response.encoding = get_encoding_from_headers(response.headers)
+        response.url = request.url
+        response.request = request
+        response.connection = self
+        response.elapsed = timedelta(seconds=entry['elapsed'])
+        response.raw = HTTPResponse(body=io.BytesIO(entry['body']), headers=entry['headers'],
+                                    status=entry['status'], preload_content=False, decode_content=False)
+        response.from_cache = True
+        return response
+
+
+def mount_http_cache(session, cache, **adapter_kwargs):
+    """Mount a CachingAdapter on session, or a CircuitBreakerAdapter if cache is falsy"""
+    adapter = CachingAdapter(cache, **adapter_kwargs) if cache else CircuitBreakerAdapter(**adapter_kwargs)
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    return adapter
+
+
+_shared_cache = None
+_shared_lock = threading.Lock()
+
+
+def get_http_cache():
+    """Return the process-wide HTTP cache, or None if HTTP_CACHE_ENABLED is off"""
+    global _shared_cache
+    if not Config.HTTP_CACHE_ENABLED:
+        return None
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = HttpCache()
+        return _shared_cache
@@ -0,0 +1,98 @@
+"""
+HTTP Sessions
+Pooled requests.Session factory with retries, shared by every scraper in the process
+"""
+
+import random
+import threading
+import time
+
+import requests
+from urllib3.util.retry import Retry
+
+from config import Config
+from utils.circuit_breaker import get_circuit_breaker
+from utils.dns_cache import get_dns_cache, mount_dns_cache
+from utils.http_cache import mount_http_cache
+
+DEFAULT_USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36'
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class BackoffRetry(Retry):
+    """
+    Retry policy with jittered exponential backoff and a bounded Retry-After
+
+    Each backoff is drawn from [backoff / 2, backoff], so workers that were
+    throttled together do not all come back at the same instant. A
+    Retry-After header (429/503) is honored up to MAX_RETRY_AFTER seconds.
+    """
+
+    MAX_RETRY_AFTER = Config.RETRY_AFTER_MAX
+
+    def get_backoff_time(self):
+        backoff = super().get_backoff_time()
+        return random.uniform(backoff / 2, backoff) if backoff else 0
+
+    def sleep_for_retry(self, response=None):
+        retry_after = self.get_retry_after(response) if response else None
+        if retry_after:
+            time.sleep(min(retry_after, self.MAX_RETRY_AFTER))
+            return True
+        return False
+
+
+def retry_policy(max_retries=None, backoff_factor=None):
+    """Retry GET/HEAD on connection errors, 429 and 5xx responses, returning the last response when retries run out"""
+    return BackoffRetry(
+        total=Config.MAX_RETRIES if max_retries is None else max_retries,
+        backoff_factor=Config.RETRY_BACKOFF_FACTOR if backoff_factor is None else backoff_factor,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=frozenset(['GET', 'HEAD']),
+        raise_on_status=False
+    )
+
+
+def create_session(user_agent=None, http_cache=None, pool_maxsize=None, max_retries=None, circuit_breaker=True):
+    """
+    Build a Session with a pooled, retrying (and optionally caching) adapter
+
+    Requests go through the process-wide circuit breaker, so a host that
+    keeps failing is short-circuited instead of waited on, and host names
+    are resolved through the process-wide DNS cache if it is enabled.
+
+    Args:
+        pool_maxsize: Connections kept per host; raised to
+            Config.HTTP_POOL_MAXSIZE if lower, so pass the worker count
+        http_cache: HttpCache to mount, or None/False for none
+        circuit_breaker: False to send every request, whatever the
+            breaker thinks of its host
+    """
+    session = requests.Session()
+    session.headers.update({'User-Agent': user_agent or DEFAULT_USER_AGENT})
+    adapter = mount_http_cache(session, http_cache,
+                               pool_connections=Config.HTTP_POOL_CONNECTIONS,
+                               pool_maxsize=max(pool_maxsize or 0, Config.HTTP_POOL_MAXSIZE),
+                               max_retries=retry_policy(max_retries),
+                               breaker=get_circuit_breaker() if circuit_breaker else None)
+    mount_dns_cache(adapter, get_dns_cache())
+    return session
+
+
+_shared_sessions = {}
+_shared_lock = threading.Lock()
+
+
+def get_session(user_agent=None, http_cache=None, pool_maxsize=None):
+    """
+    Return the process-wide Session for these settings, creating it once
+
+    Scrapers built per API request get the same Session back, so
+    keep-alive connections and TLS sessions outlive the request.
+    """
+    key = (user_agent or DEFAULT_USER_AGENT, http_cache or None, max(pool_maxsize or 0, Config.HTTP_POOL_MAXSIZE))
+    with _shared_lock:
+        session = _shared_sessions.get(key)
+        if session is None:
+            session = _shared_sessions[key] = create_session(user_agent, http_cache, pool_maxsize)
+        return session
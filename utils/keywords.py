@@ -0,0 +1,191 @@
+"""
+Keyword Engine
+TF-IDF keywords and phrases for the pages of a crawl session, scored against the whole site
+"""
+
+import math
+from array import array
+from collections import Counter, deque
+from functools import partial
+
+try:
+    import numpy as np
+except ImportError:  # optional: the same scores are computed in pure Python
+    np = None
+
+from config import Config
+
+# Words that never make a keyword, and that end a phrase
+STOPWORDS = frozenset("""
+a about above after again against all also am an and any are as at be because been before being below
+between both but by can could did do does doing down during each either else etc even ever every few for
+from further get gets got had has have having he her here hers herself him himself his how however i if in
+into is it its itself just let like may me might more most must my myself neither no nor not now of off
+often on once one only or other our ours ourselves out over own per please same shall she should since so
+some such than that the their theirs them themselves then there these they this those though through thus
+to too under until up upon us use used using very via was we well were what when where whether which while
+who whom whose why will with within without would yet you your yours yourself yourselves
+""".split())
+
+SCORE_SCALE = 10 ** 4  # scores are rounded to 4 places before ranking, so both backends rank ties the same way
+
+
+class TermCounter:
+    """
+    Counts the terms of one page: words, and phrases of up to max_ngram words
+
+    Feed it the page's lowercased words in order. Words shorter than
+    min_length, numbers and stopwords are not terms, and phrases never
+    span them: "price of the shoes" gives "price" and "shoes" only.
+    """
+
+    def __init__(self, max_ngram=2, stopwords=STOPWORDS, min_length=2):
+        self.max_ngram = max_ngram
+        self.stopwords = stopwords
+        self.min_length = min_length
+        self.counts = Counter()
+        self._phrase = deque(maxlen=max(max_ngram - 1, 1))  # words before the current one
+
+    def feed(self, words):
+        counts = self.counts
+        phrase = self._phrase
+        for word in words:
+            if len(word) < self.min_length or not word.isalpha() or word in self.stopwords:
+                phrase.clear()
+                continue
+
+            counts[word] += 1
+            if self.max_ngram > 1:
+                previous = list(phrase)
+                for n in range(1, len(previous) + 1):
+                    counts[' '.join(previous[-n:]) + ' ' + word] += 1
+                phrase.append(word)
+
+
+class KeywordEngine:
+    """
+    TF-IDF over the pages of a crawl session
+
+    Each page's term counts (see TermCounter) become a row of a sparse
+    term-document matrix. compute() then scores every page at once:
+    tf-idf with smoothed idf, log((1 + pages) / (1 + pages with the term)) + 1,
+    and rows scaled to unit length. A page's top terms are the ones that
+    are frequent on it but rare across the site, so boilerplate shared by
+    every page sinks. NumPy does the scoring when it is installed.
+    """
+
+    def __init__(self, max_ngram=None, stopwords=None, top_n=None):
+        self.max_ngram = max_ngram or Config.KEYWORD_MAX_NGRAM
+        self.stopwords = frozenset(stopwords) if stopwords is not None else STOPWORDS | Config.KEYWORD_STOPWORDS
+        self.top_n = top_n or Config.KEYWORD_TOP_TERMS
+        self.vocabulary = {}  # term -> column
+        self.urls = []
+        self._rows = {}  # url -> row
+        # The matrix in CSR form: row i is columns/counts[indptr[i]:indptr[i + 1]]
+        self._columns = array('l')
+        self._counts = array('l')
+        self._indptr = array('l', [0])
+
+    def counter_factory(self):
+        """Picklable callable returning a new TermCounter with this engine's settings"""
+        return partial(TermCounter, self.max_ngram, self.stopwords)
+
+    def __contains__(self, url):
+        return url in self._rows
+
+    def add_document(self, url, term_counts):
+        """Add a page's {term: count}; a page added twice keeps its first counts"""
+        if url in self._rows:
+            return
+        vocabulary = self.vocabulary
+        for term, count in term_counts.items():
+            column = vocabulary.get(term)
+            if column is None:
+                column = vocabulary[term] = len(vocabulary)
+            self._columns.append(column)
+            self._counts.append(count)
+        self._indptr.append(len(self._columns))
+        self._rows[url] = len(self.urls)
+        self.urls.append(url)
+
+    def compute(self, top_n=None, site_top_n=50):
+        """
+        Score every page
+
+        Returns:
+            {'pages': {url: {term: score}} with each page's top_n terms, best
+             first, and 'site': {'pages', 'terms', 'top_terms'}, where
+             top_terms lists the site_top_n terms found on the most pages as
+             {'term', 'pages', 'count'}}
+        """
+        top_n = top_n or self.top_n
+        if np is not None:
+            pages, site_terms = self._compute_numpy(top_n, site_top_n)
+        else:
+            pages, site_terms = self._compute_python(top_n, site_top_n)
+
+        terms = list(self.vocabulary)
+        return {
+            'pages': {
+                url: {terms[column]: score for column, score in ranked}
+                for url, ranked in zip(self.urls, pages)
+            },
+            'site': {
+                'pages': len(self.urls),
+                'terms': len(terms),
+                'top_terms': [{'term': terms[column], 'pages': df, 'count': total}
+                              for column, df, total in site_terms]
+            }
+        }
+
+    def _compute_numpy(self, top_n, site_top_n):
+        columns = np.asarray(self._columns, dtype=np.int64)
+        counts = np.asarray(self._counts, dtype=np.float64)
+        indptr = np.asarray(self._indptr, dtype=np.int64)
+        n_pages, n_terms = len(self.urls), len(self.vocabulary)
+        rows = np.repeat(np.arange(n_pages), np.diff(indptr))
+
+        df = np.bincount(columns, minlength=n_terms)
+        totals = np.bincount(columns, weights=counts, minlength=n_terms)
+        idf = np.log((1 + n_pages) / (1 + df)) + 1
+
+        scores = counts * idf[columns]
+        norms = np.sqrt(np.bincount(rows, weights=scores ** 2, minlength=n_pages))
+        scores = np.rint(scores / np.where(norms, norms, 1)[rows] * SCORE_SCALE) / SCORE_SCALE
+
+        # Best first within each row, earliest term first on ties; rows keep their place
+        order = np.lexsort((columns, -scores, rows))
+        pages = []
+        for start, end in zip(indptr[:-1], indptr[1:]):
+            best = order[start:min(end, start + top_n)]
+            pages.append(list(zip(columns[best].tolist(), scores[best].tolist())))
+
+        site_order = np.lexsort((np.arange(n_terms), -totals, -df))[:site_top_n]
+        site_terms = list(zip(site_order.tolist(), df[site_order].tolist(), totals[site_order].astype(int).tolist()))
+        return pages, site_terms
+
+    def _compute_python(self, top_n, site_top_n):
+        n_pages, n_terms = len(self.urls), len(self.vocabulary)
+        df = [0] * n_terms
+        totals = [0] * n_terms
+        for column, count in zip(self._columns, self._counts):
+            df[column] += 1
+            totals[column] += count
+        idf = [math.log((1 + n_pages) / (1 + d)) + 1 for d in df]
+
+        pages = []
+        for start, end in zip(self._indptr[:-1], self._indptr[1:]):
+            row = [(column, count * idf[column]) for column, count in
+                   zip(self._columns[start:end], self._counts[start:end])]
+            # Summed in order like np.bincount (sum() compensates on newer Pythons)
+            squares = 0.0
+            for _, score in row:
+                squares += score * score
+            norm = math.sqrt(squares) or 1
+            row = [(column, round(score / norm * SCORE_SCALE) / SCORE_SCALE) for column, score in row]
+            row.sort(key=lambda item: (-item[1], item[0]))
+            pages.append(row[:top_n])
+
+        site_order = sorted(range(n_terms), key=lambda column: (-df[column], -totals[column], column))[:site_top_n]
+        site_terms = [(column, df[column], totals[column]) for column in site_order]
+        return pages, site_terms
@@ -0,0 +1,278 @@
+"""
+Link Graph
+Internal links between the pages of a crawl session, with in-links, PageRank, click depth and orphan pages
+"""
+
+import gzip
+import json
+import os
+import tempfile
+from array import array
+from collections import deque
+
+try:
+    import numpy as np
+except ImportError:  # optional: the same metrics are computed in pure Python
+    np = None
+
+from config import Config
+
+DAMPING = 0.85
+TOLERANCE = 1e-6  # PageRank has converged once an iteration moves it less than this (L1)
+MAX_ITERATIONS = 100
+RANK_PLACES = 4  # PageRank is reported scaled so the average page scores 1.0, rounded to 4 places
+
+
+class LinkGraph:
+    """
+    Same-site links between the pages of a crawl session
+
+    URLs get integer ids in the order they are first seen, and every
+    crawled page's links are kept once, as a run of target ids in a flat
+    array (CSR form: page i links to targets[indptr[i]:indptr[i + 1]]). A
+    session with hundreds of thousands of links is a few arrays of machine
+    integers rather than a set of URLs per page. NumPy computes the metrics
+    when it is installed.
+    """
+
+    def __init__(self):
+        self.urls = []
+        self._ids = {}  # url -> id
+        self._pages = array('l')  # ids of the pages whose links were recorded, in order
+        self._indptr = array('l', [0])
+        self._targets = array('l')
+        self._linked = set()  # ids in _pages
+
+    @property
+    def link_count(self):
+        return len(self._targets)
+
+    def __contains__(self, url):
+        return url in self._ids
+
+    def add_url(self, url):
+        """Id of url, adding it to the graph if it is new"""
+        url_id = self._ids.get(url)
+        if url_id is None:
+            url_id = self._ids[url] = len(self.urls)
+            self.urls.append(url)
+        return url_id
+
+    def add_page(self, url, links):
+        """
+        Record the same-site links of a crawled page
+
+        Links from a page to itself are left out, and a page added twice
+        keeps its first links.
+        """
+        source = self.add_url(url)
+        if source in self._linked:
+            return
+        self._linked.add(source)
+        self._targets.extend(self.add_url(link) for link in sorted(links) if link != url)
+        self._pages.append(source)
+        self._indptr.append(len(self._targets))
+
+    def links_from(self, url):
+        """URLs a crawled page links to, or None if its links were not recorded"""
+        source = self._ids.get(url)
+        if source not in self._linked:
+            return None
+        index = self._pages.index(source)
+        return [self.urls[target] for target in self._targets[self._indptr[index]:self._indptr[index + 1]]]
+
+    def links_to(self, url):
+        """Crawled pages that link to url"""
+        target = self._ids.get(url)
+        if target is None:
+            return []
+        return [self.urls[page] for page, start, end in zip(self._pages, self._indptr[:-1], self._indptr[1:])
+                if target in self._targets[start:end]]
+
+    # Storage
+
+    def to_dict(self):
+        return {
+            'urls': self.urls,
+            'pages': self._pages.tolist(),
+            'indptr': self._indptr.tolist(),
+            'targets': self._targets.tolist()
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        graph = cls()
+        graph.urls = list(data['urls'])
+        graph._ids = {url: url_id for url_id, url in enumerate(graph.urls)}
+        graph._pages = array('l', data['pages'])
+        graph._indptr = array('l', data['indptr'])
+        graph._targets = array('l', data['targets'])
+        graph._linked = set(graph._pages)
+        return graph
+
+    @staticmethod
+    def session_path(session_id):
+        """File a crawl session's graph is stored in, under LINK_GRAPH_DIR"""
+        return os.path.join(Config.LINK_GRAPH_DIR, f'{session_id}.json.gz')
+
+    def save(self, path):
+        """Write the graph as gzipped JSON, replacing the file atomically"""
+        directory = os.path.dirname(path) or '.'
+        os.makedirs(directory, exist_ok=True)
+
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as raw, gzip.open(raw, 'wt', encoding='utf-8') as f:
+                json.dump(self.to_dict(), f, separators=(',', ':'))
+            os.replace(tmp_path, path)
+        except Exception:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+
+    @classmethod
+    def load(cls, path):
+        """Read a graph written by save(), or None if there is no usable file"""
+        try:
+            with gzip.open(path, 'rt', encoding='utf-8') as f:
+                return cls.from_dict(json.load(f))
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, KeyError) as e:
+            print(f"Error reading link graph {path}: {e}")
+            return None
+
+    # Metrics
+
+    def compute(self, start_url=None, sitemap_urls=(), top_n=20, orphans_listed=100):
+        """
+        In-links, PageRank and click depth of every URL, and the site's orphan pages
+
+        start_url and sitemap_urls are added to the graph if they are not in
+        it yet. A page's in-links count the crawled pages linking to it;
+        click depth is the fewest links to follow from start_url (None if no
+        path was crawled); orphans are sitemap URLs that no crawled page
+        links to, other than start_url.
+
+        Returns:
+            {'pages': {url: {'inlinks', 'outlinks', 'pagerank', 'click_depth'}},
+             'site': {'pages', 'crawled_pages', 'links', 'unreachable',
+             'orphans', 'orphan_pages' (the first orphans_listed, by URL),
+             'top_pages' (top_n by PageRank as {'url', 'pagerank', 'inlinks'})}}
+        """
+        start = self.add_url(start_url) if start_url is not None else None
+        sitemap_ids = {self.add_url(url) for url in sitemap_urls}
+
+        if not self.urls:
+            inlinks, outlinks, ranks, depths = [], [], [], []
+        elif np is not None:
+            inlinks, outlinks, ranks, depths = self._compute_numpy(start)
+        else:
+            inlinks, outlinks, ranks, depths = self._compute_python(start)
+
+        scale = len(self.urls)
+        ranks = [round(rank * scale, RANK_PLACES) for rank in ranks]
+        orphans = sorted(self.urls[url_id] for url_id in sitemap_ids if not inlinks[url_id] and url_id != start)
+        top = sorted(range(len(self.urls)), key=lambda url_id: (-ranks[url_id], url_id))[:top_n]
+
+        return {
+            'pages': {
+                url: {'inlinks': inlinks[url_id], 'outlinks': outlinks[url_id],
+                      'pagerank': ranks[url_id], 'click_depth': depths[url_id]}
+                for url_id, url in enumerate(self.urls)
+            },
+            'site': {
+                'pages': len(self.urls),
+                'crawled_pages': len(self._pages),
+                'links': self.link_count,
+                'unreachable': sum(depth is None for depth in depths) if start is not None else None,
+                'orphans': len(orphans),
+                'orphan_pages': orphans[:orphans_listed],
+                'top_pages': [{'url': self.urls[url_id], 'pagerank': ranks[url_id], 'inlinks': inlinks[url_id]}
+                              for url_id in top]
+            }
+        }
+
+    def _compute_numpy(self, start):
+        n = len(self.urls)
+        targets = np.asarray(self._targets, dtype=np.int64)
+        sources = np.repeat(np.asarray(self._pages, dtype=np.int64), np.diff(np.asarray(self._indptr)))
+
+        inlinks = np.bincount(targets, minlength=n)
+        outlinks = np.bincount(sources, minlength=n)
+
+        # Power iteration: each page passes its rank on evenly over its links, and
+        # pages without links (including ones never crawled) spread theirs over all
+        weights = 1.0 / outlinks[sources]
+        dangling = outlinks == 0
+        ranks = np.full(n, 1.0 / n)
+        for _ in range(MAX_ITERATIONS):
+            spread = np.bincount(targets, weights=ranks[sources] * weights, minlength=n)
+            updated = DAMPING * (spread + ranks[dangling].sum() / n) + (1 - DAMPING) / n
+            delta = np.abs(updated - ranks).sum()
+            ranks = updated
+            if delta < TOLERANCE:
+                break
+
+        # Breadth-first search a level at a time over the links sorted by source
+        depths = np.full(n, -1, dtype=np.int64)
+        if start is not None:
+            order = np.argsort(sources, kind='stable')
+            by_source = targets[order]
+            offsets = np.concatenate(([0], np.cumsum(outlinks)))
+            depths[start] = 0
+            frontier = np.array([start])
+            level = 0
+            while frontier.size:
+                starts = offsets[frontier]
+                lengths = offsets[frontier + 1] - starts
+                # Positions of every link out of the frontier, concatenated
+                positions = np.repeat(starts - np.cumsum(lengths) + lengths, lengths) + np.arange(lengths.sum())
+                frontier = np.unique(by_source[positions])
+                frontier = frontier[depths[frontier] < 0]
+                level += 1
+                depths[frontier] = level
+
+        return (inlinks.tolist(), outlinks.tolist(), ranks.tolist(),
+                [depth if depth >= 0 else None for depth in depths.tolist()])
+
+    def _compute_python(self, start):
+        n = len(self.urls)
+        ranges = list(zip(self._pages, self._indptr[:-1], self._indptr[1:]))
+        inlinks = [0] * n
+        outlinks = [0] * n
+        for target in self._targets:
+            inlinks[target] += 1
+        for page, begin, end in ranges:
+            outlinks[page] = end - begin
+
+        dangling = [url_id for url_id in range(n) if not outlinks[url_id]]
+        ranks = [1.0 / n] * n
+        for _ in range(MAX_ITERATIONS):
+            spread = [0.0] * n
+            for page, begin, end in ranges:
+                if begin == end:
+                    continue
+                share = ranks[page] * (1.0 / (end - begin))
+                for target in self._targets[begin:end]:
+                    spread[target] += share
+            dangling_rank = sum(ranks[url_id] for url_id in dangling) / n
+            updated = [DAMPING * (value + dangling_rank) + (1 - DAMPING) / n for value in spread]
+            delta = sum(abs(new - old) for new, old in zip(updated, ranks))
+            ranks = updated
+            if delta < TOLERANCE:
+                break
+
+        depths = [None] * n
+        if start is not None:
+            links = {page: self._targets[begin:end] for page, begin, end in ranges}
+            depths[start] = 0
+            queue = deque([start])
+            while queue:
+                url_id = queue.popleft()
+                for target in links.get(url_id, ()):
+                    if depths[target] is None:
+                        depths[target] = depths[url_id] + 1
+                        queue.append(target)
+
+        return inlinks, outlinks, ranks, depths
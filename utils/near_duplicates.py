@@ -0,0 +1,170 @@
+"""
+Near-Duplicate Detection
+SimHash page fingerprints and a banded index for finding near-duplicate pages
+"""
+
+import hashlib
+import re
+from collections import deque
+from bs4 import Comment
+
+SIMHASH_BITS = 64
+SHINGLE_SIZE = 3
+HIDDEN_TAGS = ('script', 'style', 'noscript', 'template')
+
+
+def visible_text(soup):
+    """Text a visitor would see, without modifying the document"""
+    return ' '.join(
+        text for text in soup.find_all(string=True)
+        if text.parent.name not in HIDDEN_TAGS and not isinstance(text, Comment)
+    )
+
+
+def simhash(text, shingle_size=SHINGLE_SIZE):
+    """
+    64-bit SimHash of text, built from overlapping word shingles
+
+    Pages with mostly the same text get fingerprints that differ in only a
+    few bits. Returned as a 16-digit hex string so it survives JSON.
+    """
+    hasher = SimHasher(shingle_size)
+    hasher.update(text)
+    return hasher.hexdigest()
+
+
+class SimHasher:
+    """
+    simhash() over text that arrives in pieces
+
+    update(a); update(b) gives the fingerprint of simhash(a + ' ' + b),
+    while only the last shingle_size words are kept in memory.
+    """
+
+    def __init__(self, shingle_size=SHINGLE_SIZE):
+        self.shingle_size = shingle_size
+        self.word_count = 0
+        self._weights = [0] * SIMHASH_BITS
+        self._window = deque(maxlen=shingle_size)
+
+    def update(self, text):
+        for word in re.findall(r'\w+', text.lower()):
+            self._window.append(word)
+            self.word_count += 1
+            if self.word_count >= self.shingle_size:
+                self._add_shingle(self._weights, ' '.join(self._window))
+
+    @staticmethod
+    def _add_shingle(weights, shingle):
+        value = int.from_bytes(hashlib.blake2b(shingle.encode('utf-8'), digest_size=8).digest(), 'little')
+        for bit in range(SIMHASH_BITS):
+            if value >> bit & 1:
+                weights[bit] += 1
+            else:
+                weights[bit] -= 1
+
+    def hexdigest(self):
+        """16-digit hex fingerprint, or None if no words were seen"""
+        if not self.word_count:
+            return None
+
+        weights = self._weights
+        if self.word_count < self.shingle_size:
+            # Too short for a full shingle: the whole text is the only one
+            weights = list(weights)
+            self._add_shingle(weights, ' '.join(self._window))
+
+        fingerprint = 0
+        for bit, weight in enumerate(weights):
+            if weight > 0:
+                fingerprint |= 1 << bit
+        return f'{fingerprint:016x}'
+
+
+def hamming_distance(a, b):
+    """Number of differing bits between two hex SimHashes"""
+    return bin(int(a, 16) ^ int(b, 16)).count('1')
+
+
+class NearDuplicateIndex:
+    """
+    Finds SimHashes within max_distance bits of each other
+
+    The 64 bits are split into max_distance + 1 bands. Two fingerprints
+    within max_distance bits must agree exactly on at least one band, so
+    only pages sharing a band bucket are compared, which keeps lookups
+    close to constant time instead of comparing every pair of pages.
+    """
+
+    def __init__(self, max_distance=3):
+        self.max_distance = max_distance
+        self.bands = max_distance + 1
+        self._band_width = -(-SIMHASH_BITS // self.bands)
+        self._buckets = [{} for _ in range(self.bands)]
+        self._fingerprints = {}  # key -> int fingerprint
+        self._parent = {}  # union-find over keys that matched
+
+    def __len__(self):
+        return len(self._fingerprints)
+
+    def _band_values(self, fingerprint):
+        mask = (1 << self._band_width) - 1
+        return [(fingerprint >> (band * self._band_width)) & mask for band in range(self.bands)]
+
+    def query(self, fingerprint):
+        """Keys of indexed pages within max_distance bits of a hex SimHash"""
+        value = int(fingerprint, 16)
+        candidates = set()
+        for band, band_value in enumerate(self._band_values(value)):
+            candidates.update(self._buckets[band].get(band_value, ()))
+
+        return sorted(
+            key for key in candidates
+            if bin(self._fingerprints[key] ^ value).count('1') <= self.max_distance
+        )
+
+    def add(self, key, fingerprint):
+        """
+        Index a page's hex SimHash
+
+        Returns:
+            Keys of previously indexed near-duplicates of the page
+        """
+        if not fingerprint:
+            return []
+
+        matches = [match for match in self.query(fingerprint) if match != key]
+        value = int(fingerprint, 16)
+        self._fingerprints[key] = value
+        self._parent.setdefault(key, key)
+        for band, band_value in enumerate(self._band_values(value)):
+            self._buckets[band].setdefault(band_value, []).append(key)
+
+        for match in matches:
+            self._union(key, match)
+        return matches
+
+    def _find(self, key):
+        while self._parent[key] != key:
+            self._parent[key] = self._parent[self._parent[key]]
+            key = self._parent[key]
+        return key
+
+    def _union(self, a, b):
+        root_a, root_b = self._find(a), self._find(b)
+        if root_a != root_b:
+            # The smallest key is the root, so the same pages always form the same cluster
+            if str(root_a) > str(root_b):
+                root_a, root_b = root_b, root_a
+            self._parent[root_b] = root_a
+
+    def clusters(self):
+        """Groups of two or more near-duplicate keys, each sorted, largest group first"""
+        groups = {}
+        for key in self._fingerprints:
+            groups.setdefault(self._find(key), []).append(key)
+
+        return sorted(
+            (sorted(group, key=str) for group in groups.values() if len(group) > 1),
+            key=lambda group: (-len(group), str(group[0]))
+        )
@@ -0,0 +1,73 @@
+"""
+HTML Parsing
+Parses pages with the fastest BeautifulSoup tree builder that is installed,
+optionally in a pool of worker processes
+"""
+
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+
+from bs4 import BeautifulSoup
+from bs4.builder import builder_registry
+
+from config import Config
+
+# Fastest first; html.parser ships with Python and is always available
+PARSER_BACKENDS = ('lxml', 'html.parser')
+
+_parser_name = None
+
+
+def available_parsers():
+    """Backends from PARSER_BACKENDS whose library is installed, fastest first"""
+    return [name for name in PARSER_BACKENDS if builder_registry.lookup(name)]
+
+
+def parser_name():
+    """
+    Backend used by parse_html
+
+    Config.HTML_PARSER names one ('lxml' or 'html.parser'); 'auto' picks
+    the fastest installed. A configured backend that is not installed falls
+    back to html.parser.
+    """
+    global _parser_name
+    if _parser_name is None:
+        configured = Config.HTML_PARSER
+        if configured == 'auto':
+            _parser_name = available_parsers()[0]
+        elif builder_registry.lookup(configured):
+            _parser_name = configured
+        else:
+            print(f"HTML parser '{configured}' is not installed, using html.parser")
+            _parser_name = 'html.parser'
+    return _parser_name
+
+
+def parse_html(markup, parser=None):
+    """Parse an HTML document (bytes or str) into a BeautifulSoup tree"""
+    return BeautifulSoup(markup, parser or parser_name())
+
+
+_parse_pool = None
+_parse_pool_lock = threading.Lock()
+
+
+def get_parse_pool():
+    """
+    Return the process-wide pool of PARSE_WORKERS parser processes, or None if it is 0
+
+    Parsing and analysis are CPU-bound, so on threads they are serialized
+    by the GIL; the pool spreads them over several cores. Workers are
+    spawned rather than forked, so they do not inherit locks held by other
+    threads of the web process.
+    """
+    global _parse_pool
+    if Config.PARSE_WORKERS < 1:
+        return None
+    with _parse_pool_lock:
+        if _parse_pool is None:
+            _parse_pool = ProcessPoolExecutor(max_workers=Config.PARSE_WORKERS,
+                                              mp_context=multiprocessing.get_context('spawn'))
+        return _parse_pool
@@ -0,0 +1,136 @@
+"""
+Rate Limiter
+Per-host token buckets shared by every scraper in the process
+"""
+
+import asyncio
+import threading
+import time
+from urllib.parse import urlparse
+
+from config import Config
+
+
+class TokenBucket:
+    """Token bucket that hands out reservations instead of blocking"""
+
+    def __init__(self, rate, burst=1):
+        self.rate = float(rate)
+        self.capacity = max(float(burst), 1.0)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def reserve(self, now=None):
+        """
+        Take one token and return how many seconds the caller must wait
+        before using it. Tokens may go negative, which queues callers up
+        behind each other without anyone holding a lock while they wait.
+        """
+        now = time.monotonic() if now is None else now
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1
+
+        if self.tokens >= 0:
+            return 0.0
+        return -self.tokens / self.rate
+
+
+class HostRateLimiter:
+    """
+    Per-host request rate limiter
+
+    Every host gets its own token bucket at the default rate unless a rate
+    was set for it explicitly or its robots.txt asks for a slower one.
+    Waiting on one host never delays requests to another.
+    """
+
+    def __init__(self, rate=None, burst=None):
+        self.default_rate = float(rate if rate is not None else Config.REQUESTS_PER_SECOND)
+        self.default_burst = burst if burst is not None else Config.RATE_LIMIT_BURST
+        self._lock = threading.Lock()
+        self._buckets = {}
+        self._rates = {}
+
+    @staticmethod
+    def _host(url_or_host):
+        if '://' in url_or_host:
+            return urlparse(url_or_host).netloc
+        return url_or_host
+
+    def get_rate(self, url_or_host):
+        """Return the (requests per second, burst) limit for a host"""
+        host = self._host(url_or_host)
+        return self._rates.get(host, (self.default_rate, self.default_burst))
+
+    def set_rate(self, url_or_host, rate, burst=None):
+        """Set the request rate for a host"""
+        host = self._host(url_or_host)
+        burst = burst if burst is not None else self.default_burst
+        with self._lock:
+            self._rates[host] = (float(rate), burst)
+            self._buckets[host] = TokenBucket(rate, burst)
+
+    def apply_robots(self, url_or_host, robot_parser, user_agent):
+        """
+        Slow a host down to its robots.txt Crawl-delay / Request-rate.
+
+        Robots.txt can only lower the configured rate, never raise it.
+        """
+        robots_rates = []
+
+        try:
+            crawl_delay = robot_parser.crawl_delay(user_agent)
+            if crawl_delay:
+                robots_rates.append(1.0 / float(crawl_delay))
+
+            request_rate = robot_parser.request_rate(user_agent)
+            if request_rate and request_rate.requests and request_rate.seconds:
+                robots_rates.append(request_rate.requests / float(request_rate.seconds))
+        except (TypeError, ValueError, ZeroDivisionError):
+            return
+
+        if not robots_rates:
+            return
+
+        rate, _ = self.get_rate(url_or_host)
+        robots_rate = min(robots_rates)
+        if robots_rate < rate:
+            self.set_rate(url_or_host, robots_rate, burst=1)
+
+    def reserve(self, url_or_host):
+        """Reserve the next request slot for a host and return the delay in seconds"""
+        host = self._host(url_or_host)
+        with self._lock:
+            bucket = self._buckets.get(host)
+            if bucket is None:
+                rate, burst = self.get_rate(host)
+                bucket = self._buckets[host] = TokenBucket(rate, burst)
+            return bucket.reserve()
+
+    def wait(self, url_or_host):
+        """Block the calling thread until a request to the host may start"""
+        delay = self.reserve(url_or_host)
+        if delay > 0:
+            time.sleep(delay)
+        return delay
+
+    async def wait_async(self, url_or_host):
+        """Wait for a request slot without blocking the event loop"""
+        delay = self.reserve(url_or_host)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        return delay
+
+
+_shared_limiter = None
+_shared_lock = threading.Lock()
+
+
+def get_rate_limiter():
+    """Return the process-wide rate limiter shared by all scrapers"""
+    global _shared_limiter
+    with _shared_lock:
+        if _shared_limiter is None:
+            _shared_limiter = HostRateLimiter()
+        return _shared_limiter
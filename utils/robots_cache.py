@@ -0,0 +1,205 @@
+"""
+Robots.txt Cache
+Process-wide, TTL-based robots.txt cache shared by all scrapers
+"""
+
+import threading
+import time
+from urllib.parse import urlparse
+from urllib.robotparser import RobotFileParser
+
+from config import Config
+
+
+class RobotsCache:
+    """
+    Caches parsed robots.txt files per scheme+host
+
+    Successful fetches and 4xx responses are kept for `ttl` seconds. 5xx
+    responses and network errors are cached too, but only for `error_ttl`
+    seconds so a temporarily broken host is retried soon. Fetches go
+    through the caller's requests.Session so they reuse its connections.
+
+    An optional store (any object with get_robots_entry(domain) and
+    save_robots_entry(entry), such as DatabaseManager) persists entries
+    across restarts.
+    """
+
+    def __init__(self, ttl=None, error_ttl=None, store=None):
+        self.ttl = ttl if ttl is not None else Config.ROBOTS_CACHE_TTL
+        self.error_ttl = error_ttl if error_ttl is not None else Config.ROBOTS_CACHE_ERROR_TTL
+        self.store = store
+        self.hits = 0
+        self.misses = 0
+        self._entries = {}
+        self._parsers = {}
+        self._lock = threading.Lock()
+        self._fetch_locks = {}
+
+    def attach_store(self, store):
+        """Persist entries to store and load them from it on cache misses"""
+        self.store = store
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._parsers.clear()
+
+    @staticmethod
+    def _domain(url):
+        parsed = urlparse(url)
+        return f"{parsed.scheme}://{parsed.netloc}"
+
+    def get_entry(self, url, session, timeout=30):
+        """Return the cached robots.txt entry for url's host, fetching it if needed"""
+        domain = self._domain(url)
+
+        entry = self._fresh_entry(domain)
+        if entry is not None:
+            self.hits += 1
+            return entry
+
+        # Only one thread fetches a given robots.txt; the rest wait for it
+        with self._lock:
+            fetch_lock = self._fetch_locks.setdefault(domain, threading.Lock())
+
+        with fetch_lock:
+            entry = self._fresh_entry(domain)
+            if entry is not None:
+                self.hits += 1
+                return entry
+
+            self.misses += 1
+            entry = self._load_stored(domain)
+            if entry is None:
+                entry = self._fetch(domain, session, timeout)
+                self._save_stored(entry)
+
+            with self._lock:
+                self._entries[domain] = entry
+                self._parsers[domain] = self._build_parser(entry)
+
+        return entry
+
+    def get_parser(self, url, session, timeout=30):
+        """Return a RobotFileParser for url's host, or None if robots.txt could not be read"""
+        entry = self.get_entry(url, session, timeout)
+        with self._lock:
+            return self._parsers.get(entry['domain'])
+
+    def check(self, url, session, timeout=30, rate_limiter=None):
+        """
+        Check if URL is allowed by robots.txt
+
+        Returns:
+            (allowed, message) tuple
+        """
+        try:
+            entry = self.get_entry(url, session, timeout)
+            if entry['error']:
+                return True, f"Could not read robots.txt: {entry['error']}"
+
+            rp = self.get_parser(url, session, timeout)
+            user_agent = session.headers.get('User-Agent', '*')
+            if rate_limiter is not None:
+                rate_limiter.apply_robots(entry['domain'], rp, user_agent)
+
+            if rp.can_fetch(user_agent, url):
+                return True, "Allowed by robots.txt"
+            else:
+                return False, f"Blocked by robots.txt ({entry['domain']}/robots.txt)"
+
+        except Exception as e:
+            # If we can't read robots.txt, assume it's allowed
+            return True, f"Could not read robots.txt: {str(e)}"
+
+    def _fresh_entry(self, domain):
+        with self._lock:
+            entry = self._entries.get(domain)
+        if entry is not None and entry['expires_at'] > time.time():
+            return entry
+        return None
+
+    def _fetch(self, domain, session, timeout):
+        robots_url = f"{domain}/robots.txt"
+        now = time.time()
+        entry = {
+            'domain': domain,
+            'status_code': None,
+            'content': '',
+            'error': None,
+            'fetched_at': now,
+            'expires_at': now + self.ttl
+        }
+
+        try:
+            response = session.get(robots_url, timeout=timeout)
+            entry['status_code'] = response.status_code
+            if response.status_code == 200:
+                entry['content'] = response.text
+            elif response.status_code >= 500:
+                entry['expires_at'] = now + self.error_ttl
+        except Exception as e:
+            entry['error'] = str(e)
+            entry['expires_at'] = now + self.error_ttl
+
+        return entry
+
+    @staticmethod
+    def _build_parser(entry):
+        """Rebuild a RobotFileParser from a cache entry, mirroring RobotFileParser.read()"""
+        if entry['error']:
+            return None
+
+        rp = RobotFileParser()
+        rp.set_url(f"{entry['domain']}/robots.txt")
+
+        status_code = entry['status_code']
+        if status_code in (401, 403):
+            rp.disallow_all = True
+        elif 400 <= status_code < 500:
+            rp.allow_all = True
+        elif status_code >= 300:
+            # Server errors (and unfollowed redirects) leave the parser unread,
+            # which RobotFileParser treats as "fetch nothing"
+            rp.disallow_all = True
+        else:
+            rp.parse(entry['content'].splitlines())
+
+        return rp
+
+    def _load_stored(self, domain):
+        if self.store is None:
+            return None
+
+        try:
+            entry = self.store.get_robots_entry(domain)
+        except Exception as e:
+            print(f"Error loading cached robots.txt for {domain}: {e}")
+            return None
+
+        if entry and entry.get('expires_at', 0) > time.time():
+            return dict(entry)
+        return None
+
+    def _save_stored(self, entry):
+        if self.store is None:
+            return
+
+        try:
+            self.store.save_robots_entry(entry)
+        except Exception as e:
+            print(f"Error saving robots.txt cache for {entry['domain']}: {e}")
+
+
+_shared_cache = None
+_shared_lock = threading.Lock()
+
+
+def get_robots_cache():
+    """Return the process-wide robots.txt cache shared by all scrapers"""
+    global _shared_cache
+    with _shared_lock:
+        if _shared_cache is None:
+            _shared_cache = RobotsCache()
+        return _shared_cache
@@ -5,10 +5,16 @@ Identifies common SEO problems in crawled pages
 
 import re
 from collections import Counter
+from utils.near_duplicates import NearDuplicateIndex
 
 class SeoIssueAnalyzer:
     """Analyzes SEO data and identifies issues"""
     
+    # Issues added by analyze_duplicates, which depend on the other pages of a crawl
+    DUPLICATE_ISSUE_PREFIXES = ('Duplicate title', 'Duplicate meta description', 'Near-duplicate content')
+    # Issues added by analyze_links, from the session's link checks
+    LINK_ISSUE_PREFIXES = ('Broken links', 'Redirected links')
+    
     @staticmethod
     def analyze_issues(seo_data):
         """
@@ -96,12 +102,8 @@ class SeoIssueAnalyzer:
                 issues.append(f"Meta description too short ({desc_length} chars) - should be 120-160 characters")
             elif desc_length > 160:
                 issues.append(f"Meta description too long ({desc_length} chars) - should be 120-160 characters")
-            
-            # Check for duplicate content
-            if meta_description.lower().strip() == meta_description.lower().strip():
-                # This is a placeholder for duplicate detection across pages
-                pass
         
+        # Duplicates across pages are found by analyze_duplicates
         return issues
     
     @staticmethod
@@ -185,6 +187,94 @@ class SeoIssueAnalyzer:
         
         return issues
     
+    @staticmethod
+    def analyze_duplicates(results, max_distance=3):
+        """
+        Find issues that only show up across the pages of a crawl
+        
+        Pages sharing a title or meta description, and pages whose SimHash
+        content fingerprints are within max_distance bits of each other,
+        are reported.
+        
+        Args:
+            results: Crawl results with url, title, meta_description and simhash
+            max_distance: Largest SimHash bit difference treated as near-duplicate
+            
+        Returns:
+            Dict of url -> {'issues': [...], 'near_duplicates': [urls]} for
+            every page with a duplicate issue
+        """
+        findings = {}
+        
+        def finding(url):
+            return findings.setdefault(url, {'issues': [], 'near_duplicates': []})
+        
+        pages = {result['url']: result for result in results if not result.get('error')}
+        
+        for field, label in (('title', 'title'), ('meta_description', 'meta description')):
+            groups = {}
+            for url, result in pages.items():
+                value = (result.get(field) or '').strip().lower()
+                if value:
+                    groups.setdefault(value, []).append(url)
+            
+            for urls in groups.values():
+                if len(urls) > 1:
+                    others = len(urls) - 1
+                    for url in urls:
+                        finding(url)['issues'].append(
+                            f"Duplicate {label} - shared with {others} other page{'s' if others > 1 else ''}"
+                        )
+        
+        index = NearDuplicateIndex(max_distance)
+        for url, result in pages.items():
+            index.add(url, result.get('simhash'))
+        
+        for cluster in index.clusters():
+            others = len(cluster) - 1
+            for url in cluster:
+                finding(url)['issues'].append(
+                    f"Near-duplicate content - {others} other page{'s' if others > 1 else ''} with nearly identical text"
+                )
+                finding(url)['near_duplicates'] = [other for other in cluster if other != url]
+        
+        return findings
+    
+    @staticmethod
+    def analyze_links(targets, checks):
+        """
+        Turn link check results into a page's broken and redirected links
+        
+        Args:
+            targets: URLs the page links to
+            checks: Dict of url -> LinkChecker.check_url result
+            
+        Returns:
+            {'issues': [...], 'broken_links': [...], 'redirected_links': [...]},
+            listing each link as {'url', 'status', 'redirects', 'error'}
+        """
+        broken_links = []
+        redirected_links = []
+        for url in targets:
+            check = checks.get(url)
+            if check is None:
+                continue
+            link = {'url': url, **check}
+            if check['error'] or check['status'] >= 400:
+                broken_links.append(link)
+            elif check['redirects']:
+                redirected_links.append(link)
+        
+        issues = []
+        if broken_links:
+            issues.append(f"Broken links: {len(broken_links)} linked URL{'s' if len(broken_links) > 1 else ''} "
+                          f"returning an error or not responding")
+        if redirected_links:
+            issues.append(f"Redirected links: {len(redirected_links)} linked URL{'s' if len(redirected_links) > 1 else ''} "
+                          f"redirecting - link to the final URL instead")
+        
+        return {'issues': issues, 'broken_links': broken_links, 'redirected_links': redirected_links}
+    
     @staticmethod
     def categorize_issue(issue_text):
         """Categorize an issue by type"""
@@ -204,6 +294,8 @@ class SeoIssueAnalyzer:
             return 'content'
         elif 'image' in issue_lower or 'alt' in issue_lower:
             return 'images'
+        elif 'link' in issue_lower:
+            return 'links'
         else:
             return 'other'
     
@@ -217,11 +309,12 @@ class SeoIssueAnalyzer:
             return 'critical'
         
         # High priority issues
-        elif any(keyword in issue_lower for keyword in ['missing meta description', 'not mobile-friendly', 'slow page load']):
+        elif any(keyword in issue_lower for keyword in ['missing meta description', 'not mobile-friendly', 'slow page load',
+                                                         'broken links']):
             return 'high'
         
         # Medium priority issues
-        elif any(keyword in issue_lower for keyword in ['too short', 'too long', 'multiple h1']):
+        elif any(keyword in issue_lower for keyword in ['too short', 'too long', 'multiple h1', 'duplicate']):
             return 'medium'
         
         # Low priority issues
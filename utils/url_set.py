@@ -0,0 +1,248 @@
+"""
+Compact URL Sets
+Memory-efficient "have we seen this URL" sets for large crawls
+"""
+
+import base64
+import hashlib
+import math
+from array import array
+
+
+def url_fingerprint(url):
+    """64-bit fingerprint of a URL (never 0, which marks an empty slot)"""
+    digest = hashlib.blake2b(url.encode('utf-8'), digest_size=8).digest()
+    return int.from_bytes(digest, 'little') or 1
+
+
+class FingerprintSet:
+    """
+    Set of URLs stored as 64-bit fingerprints in an open-addressing table
+
+    Each URL costs 16-32 bytes instead of the 100+ bytes of a Python str
+    in a set. Two different URLs collide with probability ~n^2 / 2^65
+    (about 1 in 37 million at a million URLs). Members cannot be listed.
+    """
+
+    MAX_LOAD = 0.5
+
+    def __init__(self, capacity=1024):
+        size = 1
+        while size < capacity / self.MAX_LOAD:
+            size *= 2
+        self._table = array('Q', bytes(8 * size))
+        self._mask = size - 1
+        self._count = 0
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, url):
+        return self._find(url_fingerprint(url))[1]
+
+    def _find(self, fingerprint):
+        """Return (slot, found) for a fingerprint using linear probing"""
+        table = self._table
+        mask = self._mask
+        slot = fingerprint & mask
+        while True:
+            value = table[slot]
+            if value == fingerprint:
+                return slot, True
+            if value == 0:
+                return slot, False
+            slot = (slot + 1) & mask
+
+    def add(self, url):
+        self._add_fingerprint(url_fingerprint(url))
+
+    def update(self, urls):
+        for url in urls:
+            self._add_fingerprint(url_fingerprint(url))
+
+    def _add_fingerprint(self, fingerprint):
+        slot, found = self._find(fingerprint)
+        if found:
+            return
+        self._table[slot] = fingerprint
+        self._count += 1
+        if self._count > len(self._table) * self.MAX_LOAD:
+            self._grow()
+
+    def _grow(self):
+        old_table = self._table
+        self._table = array('Q', bytes(16 * len(old_table)))
+        self._mask = len(self._table) - 1
+        for fingerprint in old_table:
+            if fingerprint:
+                self._table[self._find(fingerprint)[0]] = fingerprint
+
+    def nbytes(self):
+        """Size of the fingerprint table in bytes"""
+        return self._table.itemsize * len(self._table)
+
+    def to_state(self):
+        """JSON-serializable form of the set"""
+        return {
+            'type': 'fingerprint',
+            'count': self._count,
+            'table': base64.b64encode(self._table.tobytes()).decode('ascii')
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        url_set = cls(capacity=1)
+        url_set._table = array('Q')
+        url_set._table.frombytes(base64.b64decode(state['table']))
+        url_set._mask = len(url_set._table) - 1
+        url_set._count = state['count']
+        return url_set
+
+
+class BloomFilter:
+    """
+    Scalable Bloom filter of URLs with a configurable false-positive rate
+
+    A false positive makes the crawler treat an unseen URL as seen and skip
+    it, so error_rate bounds the share of URLs a crawl may miss. When a
+    filter fills up, a twice-as-large filter with a tighter error rate is
+    added, which keeps the overall rate below error_rate however many URLs
+    are added. Members cannot be listed.
+    """
+
+    GROWTH = 2
+    TIGHTENING = 0.5
+
+    def __init__(self, capacity=100000, error_rate=0.001):
+        if not 0 < error_rate < 1:
+            raise ValueError("error_rate must be between 0 and 1")
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self._filters = []
+        self._count = 0
+        self._add_filter()
+
+    def _add_filter(self):
+        index = len(self._filters)
+        capacity = self.capacity * (self.GROWTH ** index)
+        # Successive filters share the error budget as a geometric series
+        error_rate = self.error_rate * (1 - self.TIGHTENING) * (self.TIGHTENING ** index)
+        bits = max(8, int(math.ceil(-capacity * math.log(error_rate) / (math.log(2) ** 2))))
+        hashes = max(1, int(round(bits / capacity * math.log(2))))
+        self._filters.append({
+            'bits': bytearray((bits + 7) // 8),
+            'size': bits,
+            'hashes': hashes,
+            'capacity': capacity,
+            'count': 0
+        })
+
+    @staticmethod
+    def _hashes(url):
+        """Two independent 64-bit hashes, combined into k positions per filter"""
+        digest = hashlib.blake2b(url.encode('utf-8'), digest_size=16).digest()
+        return int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+
+    @staticmethod
+    def _positions(bloom, h1, h2):
+        size = bloom['size']
+        return [(h1 + i * h2) % size for i in range(bloom['hashes'])]
+
+    @staticmethod
+    def _filter_contains(bloom, h1, h2):
+        bits = bloom['bits']
+        for position in BloomFilter._positions(bloom, h1, h2):
+            if not bits[position >> 3] & (1 << (position & 7)):
+                return False
+        return True
+
+    def _contains_hashes(self, h1, h2):
+        for bloom in self._filters:
+            if self._filter_contains(bloom, h1, h2):
+                return True
+        return False
+
+    def __len__(self):
+        return self._count
+
+    def __contains__(self, url):
+        return self._contains_hashes(*self._hashes(url))
+
+    def add(self, url):
+        h1, h2 = self._hashes(url)
+        if self._contains_hashes(h1, h2):
+            return
+
+        bloom = self._filters[-1]
+        if bloom['count'] >= bloom['capacity']:
+            self._add_filter()
+            bloom = self._filters[-1]
+
+        bits = bloom['bits']
+        for position in self._positions(bloom, h1, h2):
+            bits[position >> 3] |= 1 << (position & 7)
+        bloom['count'] += 1
+        self._count += 1
+
+    def update(self, urls):
+        for url in urls:
+            self.add(url)
+
+    def nbytes(self):
+        """Size of the bit arrays in bytes"""
+        return sum(len(bloom['bits']) for bloom in self._filters)
+
+    def to_state(self):
+        """JSON-serializable form of the filter"""
+        return {
+            'type': 'bloom',
+            'capacity': self.capacity,
+            'error_rate': self.error_rate,
+            'count': self._count,
+            'filters': [
+                dict(bloom, bits=base64.b64encode(bytes(bloom['bits'])).decode('ascii'))
+                for bloom in self._filters
+            ]
+        }
+
+    @classmethod
+    def from_state(cls, state):
+        bloom_filter = cls(capacity=state['capacity'], error_rate=state['error_rate'])
+        bloom_filter._count = state['count']
+        bloom_filter._filters = [
+            dict(bloom, bits=bytearray(base64.b64decode(bloom['bits'])))
+            for bloom in state['filters']
+        ]
+        return bloom_filter
+
+
+SEEN_SET_TYPES = ('exact', 'fingerprint', 'bloom')
+
+
+def make_url_set(kind='exact', error_rate=0.001):
+    """Create an empty URL set: 'exact' (Python set), 'fingerprint' or 'bloom'"""
+    if kind == 'exact':
+        return set()
+    if kind == 'fingerprint':
+        return FingerprintSet()
+    if kind == 'bloom':
+        return BloomFilter(error_rate=error_rate)
+    raise ValueError(f"Unknown seen-set type '{kind}' - expected one of {', '.join(SEEN_SET_TYPES)}")
+
+
+def url_set_to_state(url_set):
+    """JSON-serializable form of any URL set made by make_url_set"""
+    if isinstance(url_set, (FingerprintSet, BloomFilter)):
+        return url_set.to_state()
+    return {'type': 'exact', 'urls': list(url_set)}
+
+
+def url_set_from_state(state):
+    """Rebuild a URL set saved with url_set_to_state"""
+    if isinstance(state, list):
+        return set(state)
+    if state['type'] == 'fingerprint':
+        return FingerprintSet.from_state(state)
+    if state['type'] == 'bloom':
+        return BloomFilter.from_state(state)
+    return set(state['urls'])